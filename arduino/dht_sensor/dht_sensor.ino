@@ -1,6 +1,6 @@
 /*
  * DHT 溫濕度感測器 + MQ135 空氣品質 + RGB LED + 蜂鳴器
- * 生物機電工程概論 期末專題 v0.3.0
+ * 生物機電工程概論 期末專題 v0.4.0
  * 
  * 功能：
  *   - 讀取 DHT11/22 感測器數據
@@ -9,6 +9,15 @@
  *   - 蜂鳴器在空氣品質差時警報
  *   - 透過 Serial 傳送數據到電腦
  *   - 支援 Discord 遠端控制 LED 顏色與蜂鳴器
+ *   - 可切換為含 CRC16 的二進位框架與較高的通訊速率（PROTOCOL:BINARY、BAUD:<速率>）
+ *   - 每個指令都有回應（含固定的鍵，例如 pong、led、buzzer、silent），電腦端據此確認指令已執行
+ * 
+ * 二進位框架（預設為 JSON，收到 PROTOCOL:BINARY 後改用）：
+ *   [0xA5][LEN][TYPE][PAYLOAD（LEN bytes）][CRC16 低位元組][CRC16 高位元組]
+ *   CRC16 為 CRC-16/CCITT-FALSE（多項式 0x1021，初始值 0xFFFF），涵蓋 LEN、TYPE 與 PAYLOAD
+ *   TYPE 0x01 讀數：int16 溫度×10、uint16 濕度×10、int16 體感溫度×10、uint16 PPM、uint8 品質、uint32 次數
+ *   TYPE 0x02 讀取失敗：uint32 次數
+ *   TYPE 0x03 文字：JSON（指令回應與狀態）
  * 
  * 接線說明：
  *   DHT VCC  → Arduino 5V
@@ -50,7 +59,14 @@
 
 // ========== 時間設定 ==========
 #define READ_INTERVAL 10000 // 讀取間隔（毫秒）- 改為 10 秒
-#define BAUD_RATE 9600      // Serial 通訊速率
+#define SENSOR_WARMUP 2000  // 開機後第一次讀取前等待感測器穩定的時間（毫秒）
+#define BAUD_RATE 9600      // Serial 通訊速率（開機時；可由 BAUD:<速率> 指令提高）
+
+// ========== 二進位框架設定 ==========
+#define FRAME_SYNC 0xA5
+#define FRAME_READING 0x01
+#define FRAME_ERROR 0x02
+#define FRAME_TEXT 0x03
 
 // ========== 空氣品質閾值 ==========
 // 舒適範圍：溫度 20-28°C，濕度 40-70%
@@ -89,6 +105,10 @@ void buzz(int times);
 void setRGB(int r, int g, int b);
 void updateLED(AirQuality quality);
 void blinkRGB(int r, int g, int b, int times);
+void sendMessage(const String &json);
+void sendFrame(uint8_t type, const uint8_t *payload, uint8_t length);
+void putUint16(uint8_t *buffer, int offset, uint16_t value);
+void putUint32(uint8_t *buffer, int offset, uint32_t value);
 
 // 變數
 unsigned long lastReadTime = 0;
@@ -97,6 +117,8 @@ AirQuality currentQuality = QUALITY_NORMAL;
 
 bool manualColorMode = false;  // 是否由 Discord 控制 LED 顏色
 bool silentMode = false;       // 是否開啟靜音模式 (Discord 控制)
+bool binaryMode = false;       // 是否以二進位框架輸出（PROTOCOL:BINARY）
+long currentBaud = BAUD_RATE;  // 目前的通訊速率
 
 void setup() {
   // 初始化 Serial 通訊
@@ -114,22 +136,19 @@ void setup() {
   pinMode(BUZZER_PIN, OUTPUT);
   digitalWrite(BUZZER_PIN, LOW);
   
-  // 開機燈光測試
-  testLED();
+  // 啟動訊息：Serial 已可接收指令，電腦端收到後即完成連線（不必等燈光測試與感測器穩定）
+  sendMessage("{\"status\": \"ready\", \"version\": \"0.4.0\", \"sensor\": \"" + 
+              String(DHTTYPE == DHT11 ? "DHT11" : "DHT22") + 
+              "\", \"features\": [\"rgb_led\", \"buzzer\", \"mq135\", \"discord_ctrl\", \"binary_frames\"]}");
   
-  // 等待感測器穩定
-  delay(2000);
+  // 開機燈光測試（期間收到的指令留在接收緩衝區，之後處理）
+  testLED();
   
   // 設為藍色（待機）
   setRGB(0, 0, 255);
   
-  // 啟動訊息
-  Serial.println("{\"status\": \"ready\", \"version\": \"0.3.0\", \"sensor\": \"" + 
-                 String(DHTTYPE == DHT11 ? "DHT11" : "DHT22") + 
-                 "\", \"features\": [\"rgb_led\", \"buzzer\", \"mq135\", \"discord_ctrl\"]}");
-  
-  // 立即讀取一次
-  readAndSendData();
+  // 感測器穩定後（開機 SENSOR_WARMUP 毫秒）立即讀取一次，不以 delay() 阻塞指令處理
+  lastReadTime = millis() + SENSOR_WARMUP - READ_INTERVAL;
 }
 
 void loop() {
@@ -151,15 +170,17 @@ void loop() {
     } else if (command == "STATUS") {
       sendStatus();
     } else if (command == "PING") {
-      Serial.println("{\"pong\": true}");
+      sendMessage("{\"pong\": true}");
     } else if (command == "TEST_LED") {
+      sendMessage("{\"led\": \"test\"}");
       testLED();
     } else if (command == "BUZZ") {
-      // 遠端觸發蜂鳴器（由 Discord 指令觸發）
+      // 遠端觸發蜂鳴器（由 Discord 指令觸發）；先回應再響，確認不必等待響完
+      sendMessage("{\"buzzer\": \"triggered\", \"count\": 3}");
       buzz(3);
-      Serial.println("{\"buzzer\": \"triggered\", \"count\": 3}");
     } else if (command == "BUZZER_OFF") {
       digitalWrite(BUZZER_PIN, LOW);
+      sendMessage("{\"buzzer\": \"off\"}");
     } else if (command.startsWith("SET_COLOR:")) {
       // 從 Discord 控制 LED 顏色，格式: SET_COLOR:R,G,B
       String colorData = command.substring(10);
@@ -170,24 +191,40 @@ void loop() {
       b = constrain(b, 0, 255);
       setRGB(r, g, b);
       manualColorMode = true;
-      Serial.println("{\"led\": \"set\", \"r\": " + String(r) + ", \"g\": " + String(g) + ", \"b\": " + String(b) + "}");
+      sendMessage("{\"led\": \"set\", \"r\": " + String(r) + ", \"g\": " + String(g) + ", \"b\": " + String(b) + "}");
     } else if (command == "AUTO_COLOR") {
       // 切回自動模式
       manualColorMode = false;
       updateLED(currentQuality);
-      Serial.println("{\"led\": \"auto\"}");
+      sendMessage("{\"led\": \"auto\"}");
     } else if (command.startsWith("SET_BUZZER:")) {
       // 從 Discord 控制蜂鳴器次數，格式: SET_BUZZER:N
       int times = command.substring(11).toInt();
       times = constrain(times, 1, 10);
+      sendMessage("{\"buzzer\": \"triggered\", \"count\": " + String(times) + "}");
       buzz(times);
-      Serial.println("{\"buzzer\": \"triggered\", \"count\": " + String(times) + "}");
     } else if (command == "SILENT_ON") {
       silentMode = true;
-      Serial.println("{\"silent\": true}");
+      sendMessage("{\"silent\": true}");
     } else if (command == "SILENT_OFF") {
       silentMode = false;
-      Serial.println("{\"silent\": false}");
+      sendMessage("{\"silent\": false}");
+    } else if (command == "PROTOCOL:BINARY" || command == "PROTOCOL:JSON") {
+      // 切換輸出格式，確認訊息以新的格式送出
+      binaryMode = (command == "PROTOCOL:BINARY");
+      sendMessage(binaryMode ? "{\"protocol\": \"binary\"}" : "{\"protocol\": \"json\"}");
+    } else if (command.startsWith("BAUD:")) {
+      // 切換通訊速率：先以原本的速率送出確認，傳送完畢後再切換
+      long baud = command.substring(5).toInt();
+      if (baud == 9600 || baud == 19200 || baud == 38400 || baud == 57600 || baud == 115200) {
+        sendMessage("{\"baud\": " + String(baud) + "}");
+        Serial.flush();
+        Serial.end();
+        Serial.begin(baud);
+        currentBaud = baud;
+      } else {
+        sendMessage("{\"error\": \"unsupported baud\", \"baud\": null}");
+      }
     }
   }
 }
@@ -200,7 +237,13 @@ void readAndSendData() {
   
   // 檢查讀取結果
   if (isnan(humidity) || isnan(temperature)) {
-    Serial.println("{\"error\": \"Failed to read from DHT sensor\", \"count\": " + String(readCount) + "}");
+    if (binaryMode) {
+      uint8_t payload[4];
+      putUint32(payload, 0, readCount);
+      sendFrame(FRAME_ERROR, payload, sizeof(payload));
+    } else {
+      Serial.println("{\"error\": \"Failed to read from DHT sensor\", \"count\": " + String(readCount) + "}");
+    }
     // 讀取失敗閃爍紅燈
     blinkRGB(255, 0, 0, 3);
     return;
@@ -229,6 +272,19 @@ void readAndSendData() {
     buzz(3);  // 警報 3 次
   }
   
+  // 二進位框架：13 bytes 的固定格式，不需組合字串
+  if (binaryMode) {
+    uint8_t payload[13];
+    putUint16(payload, 0, (uint16_t)(int16_t)round(temperature * 10));
+    putUint16(payload, 2, (uint16_t)round(humidity * 10));
+    putUint16(payload, 4, (uint16_t)(int16_t)round(heatIndex * 10));
+    putUint16(payload, 6, (uint16_t)round(airQualityPPM));
+    payload[8] = (uint8_t)quality;
+    putUint32(payload, 9, readCount);
+    sendFrame(FRAME_READING, payload, sizeof(payload));
+    return;
+  }
+  
   // 輸出 JSON（加入 air_quality）
   String qualityStr = (quality == QUALITY_GOOD) ? "good" : 
                       (quality == QUALITY_NORMAL) ? "normal" : "bad";
@@ -328,7 +384,9 @@ void sendStatus() {
   
   String statusJson = "{";
   statusJson += "\"status\": \"running\", ";
-  statusJson += "\"version\": \"0.2.0\", ";
+  statusJson += "\"version\": \"0.4.0\", ";
+  statusJson += "\"protocol\": \"" + String(binaryMode ? "binary" : "json") + "\", ";
+  statusJson += "\"baud\": " + String(currentBaud) + ", ";
   statusJson += "\"sensor\": \"" + String(DHTTYPE == DHT11 ? "DHT11" : "DHT22") + "\", ";
   statusJson += "\"pin\": \"A5\", ";
   statusJson += "\"interval_ms\": " + String(READ_INTERVAL) + ", ";
@@ -337,5 +395,52 @@ void sendStatus() {
   statusJson += "\"uptime_ms\": " + String(millis());
   statusJson += "}";
   
-  Serial.println(statusJson);
+  sendMessage(statusJson);
+}
+
+// ========== 輸出格式 ==========
+
+void putUint16(uint8_t *buffer, int offset, uint16_t value) {
+  buffer[offset] = value & 0xFF;
+  buffer[offset + 1] = value >> 8;
+}
+
+void putUint32(uint8_t *buffer, int offset, uint32_t value) {
+  for (int i = 0; i < 4; i++) {
+    buffer[offset + i] = (value >> (8 * i)) & 0xFF;
+  }
+}
+
+uint16_t crc16Update(uint16_t crc, uint8_t data) {
+  // CRC-16/CCITT-FALSE（多項式 0x1021）
+  crc ^= (uint16_t)data << 8;
+  for (int i = 0; i < 8; i++) {
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+void sendFrame(uint8_t type, const uint8_t *payload, uint8_t length) {
+  uint16_t crc = 0xFFFF;
+  crc = crc16Update(crc, length);
+  crc = crc16Update(crc, type);
+  for (int i = 0; i < length; i++) {
+    crc = crc16Update(crc, payload[i]);
+  }
+  
+  Serial.write(FRAME_SYNC);
+  Serial.write(length);
+  Serial.write(type);
+  Serial.write(payload, length);
+  Serial.write(crc & 0xFF);
+  Serial.write(crc >> 8);
+}
+
+void sendMessage(const String &json) {
+  // JSON 模式直接輸出一行，二進位模式包成文字框架
+  if (binaryMode) {
+    sendFrame(FRAME_TEXT, (const uint8_t *)json.c_str(), min(json.length(), (unsigned int)255));
+  } else {
+    Serial.println(json);
+  }
 }
@@ -31,7 +31,10 @@ TEMP_WARNING_LOW = float(os.environ.get('TEMP_WARNING_LOW', 10.0))
 HUMIDITY_WARNING_HIGH = float(os.environ.get('HUMIDITY_WARNING_HIGH', 80.0))
 HUMIDITY_WARNING_LOW = float(os.environ.get('HUMIDITY_WARNING_LOW', 20.0))
 
-# 儲存最新數據（記憶體快取）
+# 沒有帶 device_id 的推送（舊版本機程式）所屬的裝置
+DEFAULT_DEVICE = 'default'
+
+# 儲存最新數據（記憶體快取，所有裝置中最新的一筆）
 current_reading = {
     'temperature': None,
     'humidity': None,
@@ -39,6 +42,9 @@ current_reading = {
     'timestamp': None
 }
 
+# 各裝置最新數據（記憶體快取）
+current_readings = {}
+
 
 # ========== 資料庫函數 ==========
 def get_db_connection():
@@ -57,31 +63,44 @@ def init_database():
             temperature REAL NOT NULL,
             humidity REAL NOT NULL,
             heat_index REAL,
-            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            device_id TEXT NOT NULL DEFAULT 'default'
         )
     ''')
     
+    # 舊版表格沒有 device_id 欄位時加入（既有數據屬於預設裝置）
+    cur.execute('''
+        ALTER TABLE sensor_readings
+        ADD COLUMN IF NOT EXISTS device_id TEXT NOT NULL DEFAULT 'default'
+    ''')
+    
     cur.execute('''
         CREATE INDEX IF NOT EXISTS idx_recorded_at 
         ON sensor_readings(recorded_at)
     ''')
     
+    # 單一裝置的範圍查詢與最新讀數只掃描該裝置的索引
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_device_recorded_at
+        ON sensor_readings(device_id, recorded_at)
+    ''')
+    
     conn.commit()
     cur.close()
     conn.close()
     print("✅ 資料庫初始化完成")
 
 
-def insert_reading(temperature, humidity, heat_index=None):
+def insert_reading(temperature, humidity, heat_index=None, device_id=DEFAULT_DEVICE):
     """新增讀數"""
     conn = get_db_connection()
     cur = conn.cursor()
     
     cur.execute('''
-        INSERT INTO sensor_readings (temperature, humidity, heat_index, recorded_at)
-        VALUES (%s, %s, %s, %s)
+        INSERT INTO sensor_readings (temperature, humidity, heat_index, recorded_at, device_id)
+        VALUES (%s, %s, %s, %s, %s)
         RETURNING id
-    ''', (temperature, humidity, heat_index, datetime.now(TAIPEI_TZ)))
+    ''', (temperature, humidity, heat_index, datetime.now(TAIPEI_TZ), device_id))
     
     record_id = cur.fetchone()['id']
     conn.commit()
@@ -91,16 +110,25 @@ def insert_reading(temperature, humidity, heat_index=None):
     return record_id
 
 
-def get_latest_reading():
-    """取得最新讀數"""
+def _device_filter(device_id, prefix='WHERE'):
+    """裝置條件的 SQL 片段與參數（device_id 為 None 時不限裝置）"""
+    if device_id is None:
+        return '', ()
+    return f'{prefix} device_id = %s', (device_id,)
+
+
+def get_latest_reading(device_id=None):
+    """取得最新讀數（指定 device_id 時為該裝置的最新讀數）"""
     conn = get_db_connection()
     cur = conn.cursor()
     
-    cur.execute('''
+    condition, params = _device_filter(device_id)
+    cur.execute(f'''
         SELECT * FROM sensor_readings 
+        {condition}
         ORDER BY recorded_at DESC 
         LIMIT 1
-    ''')
+    ''', params)
     
     row = cur.fetchone()
     cur.close()
@@ -109,18 +137,19 @@ def get_latest_reading():
     return dict(row) if row else None
 
 
-def get_readings_by_hours(hours=24):
-    """取得過去 N 小時的讀數"""
+def get_readings_by_hours(hours=24, device_id=None):
+    """取得過去 N 小時的讀數（可只取單一裝置）"""
     conn = get_db_connection()
     cur = conn.cursor()
     
     since = datetime.now(TAIPEI_TZ) - timedelta(hours=hours)
     
-    cur.execute('''
+    condition, params = _device_filter(device_id, 'AND')
+    cur.execute(f'''
         SELECT * FROM sensor_readings 
-        WHERE recorded_at >= %s
+        WHERE recorded_at >= %s {condition}
         ORDER BY recorded_at ASC
-    ''', (since,))
+    ''', (since, *params))
     
     rows = cur.fetchall()
     cur.close()
@@ -129,14 +158,15 @@ def get_readings_by_hours(hours=24):
     return [dict(row) for row in rows]
 
 
-def get_statistics(hours=24):
-    """取得統計數據"""
+def get_statistics(hours=24, device_id=None):
+    """取得統計數據（可只統計單一裝置）"""
     conn = get_db_connection()
     cur = conn.cursor()
     
     since = datetime.now(TAIPEI_TZ) - timedelta(hours=hours)
     
-    cur.execute('''
+    condition, params = _device_filter(device_id, 'AND')
+    cur.execute(f'''
         SELECT 
             COUNT(*) as count,
             AVG(temperature) as avg_temp,
@@ -146,8 +176,8 @@ def get_statistics(hours=24):
             MIN(humidity) as min_humidity,
             MAX(humidity) as max_humidity
         FROM sensor_readings 
-        WHERE recorded_at >= %s
-    ''', (since,))
+        WHERE recorded_at >= %s {condition}
+    ''', (since, *params))
     
     row = cur.fetchone()
     cur.close()
@@ -172,12 +202,13 @@ def get_statistics(hours=24):
     return {'count': 0, 'hours': hours}
 
 
-def get_reading_count():
-    """取得總讀數"""
+def get_reading_count(device_id=None):
+    """取得總讀數（指定 device_id 時為該裝置的筆數）"""
     conn = get_db_connection()
     cur = conn.cursor()
     
-    cur.execute('SELECT COUNT(*) as count FROM sensor_readings')
+    condition, params = _device_filter(device_id)
+    cur.execute(f'SELECT COUNT(*) as count FROM sensor_readings {condition}', params)
     count = cur.fetchone()['count']
     
     cur.close()
@@ -186,6 +217,38 @@ def get_reading_count():
     return count
 
 
+def get_devices():
+    """取得各裝置的筆數與最新讀數（DISTINCT ON 使用 (device_id, recorded_at) 索引）"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute('''
+        SELECT latest.*, counts.count
+        FROM (
+            SELECT DISTINCT ON (device_id) *
+            FROM sensor_readings
+            ORDER BY device_id, recorded_at DESC
+        ) AS latest
+        JOIN (
+            SELECT device_id, COUNT(*) AS count
+            FROM sensor_readings
+            GROUP BY device_id
+        ) AS counts USING (device_id)
+        ORDER BY device_id
+    ''')
+    
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    
+    devices = []
+    for row in rows:
+        row = dict(row)
+        count = row.pop('count')
+        devices.append({'device_id': row['device_id'], 'count': count, 'latest': row})
+    return devices
+
+
 # ========== Discord 函數 ==========
 def send_discord_notification(temperature, humidity, heat_index=None):
     """發送 Discord 通知"""
@@ -258,21 +321,27 @@ def api_push():
     temperature = data.get('temperature')
     humidity = data.get('humidity')
     heat_index = data.get('heat_index')
+    device_id = str(data.get('device_id') or DEFAULT_DEVICE)
     
     if temperature is None or humidity is None:
         return jsonify({'success': False, 'error': 'Missing temperature or humidity'}), 400
     
     # 儲存到資料庫
-    record_id = insert_reading(temperature, humidity, heat_index)
+    record_id = insert_reading(temperature, humidity, heat_index, device_id)
     
-    # 更新記憶體快取
-    global current_reading
+    # 更新記憶體快取（新增裝置時以新的字典取代，讀取端不需加鎖）
+    global current_reading, current_readings
     current_reading = {
         'temperature': temperature,
         'humidity': humidity,
         'heat_index': heat_index,
+        'device_id': device_id,
         'timestamp': datetime.now(TAIPEI_TZ).isoformat()
     }
+    if device_id in current_readings:
+        current_readings[device_id] = current_reading
+    else:
+        current_readings = {**current_readings, device_id: current_reading}
     
     # 發送 Discord 通知（如果有設定）
     send_to_discord = data.get('send_discord', True)
@@ -288,11 +357,13 @@ def api_push():
 
 @app.route('/api/current')
 def api_current():
-    """取得目前數據"""
-    if current_reading['timestamp']:
-        return jsonify({'success': True, 'data': current_reading})
+    """取得目前數據（?device= 指定裝置）"""
+    device = request.args.get('device')
+    live = current_readings.get(device) if device else current_reading
+    if live and live['timestamp']:
+        return jsonify({'success': True, 'data': live})
     
-    latest = get_latest_reading()
+    latest = get_latest_reading(device)
     if latest:
         return jsonify({
             'success': True,
@@ -300,6 +371,7 @@ def api_current():
                 'temperature': latest['temperature'],
                 'humidity': latest['humidity'],
                 'heat_index': latest.get('heat_index'),
+                'device_id': latest.get('device_id'),
                 'timestamp': str(latest['recorded_at'])
             }
         })
@@ -309,22 +381,25 @@ def api_current():
 
 @app.route('/api/history')
 def api_history():
-    """取得歷史數據"""
+    """取得歷史數據（?device= 只取單一裝置）"""
     hours = request.args.get('hours', 24, type=int)
     hours = max(1, min(168, hours))
+    device = request.args.get('device')
     
-    readings = get_readings_by_hours(hours)
+    readings = get_readings_by_hours(hours, device)
     
     data = [{
         'temperature': r['temperature'],
         'humidity': r['humidity'],
         'heat_index': r.get('heat_index'),
+        'device_id': r.get('device_id'),
         'timestamp': str(r['recorded_at'])
     } for r in readings]
     
     return jsonify({
         'success': True,
         'hours': hours,
+        'device': device,
         'count': len(data),
         'data': data
     })
@@ -332,19 +407,34 @@ def api_history():
 
 @app.route('/api/stats')
 def api_stats():
-    """取得統計數據"""
+    """取得統計數據（?device= 只統計單一裝置）"""
     hours = request.args.get('hours', 24, type=int)
     hours = max(1, min(168, hours))
+    device = request.args.get('device')
     
-    stats = get_statistics(hours)
+    stats = get_statistics(hours, device)
     
     return jsonify({
         'success': True,
         'hours': hours,
+        'device': device,
         'stats': stats
     })
 
 
+@app.route('/api/devices')
+def api_devices():
+    """取得所有裝置的筆數與最新讀數"""
+    devices = get_devices()
+    for device in devices:
+        device['latest']['recorded_at'] = str(device['latest']['recorded_at'])
+        live = current_readings.get(device['device_id'])
+        if live:
+            device['current'] = live
+    
+    return jsonify({'success': True, 'count': len(devices), 'devices': devices})
+
+
 @app.route('/api/status')
 def api_status():
     """取得系統狀態"""
@@ -0,0 +1,297 @@
+"""
+聚合索引模組 - 任意時間範圍的 O(log n) 統計
+生物機電工程概論 期末專題
+
+與 database.py 的時間索引平行（第 i 筆紀錄對應第 i 個位置），新增紀錄時同步更新：
+- 前綴和：每個指標的筆數、總和、平方和，範圍內的平均與標準差只需兩次相減（O(1)）
+- 線段樹：每個指標的最小值與最大值，範圍查詢為 O(log n)
+
+數值以整數儲存（溫濕度與體感溫度為 0.1 的倍數，乘以 10；空氣品質本身為整數），
+前綴和不會累積浮點誤差，線段樹也只需 int16。
+
+snapshot() 提供並行讀取用的唯讀快照：附加只寫在快照範圍之後，
+刪除前綴與線段樹擴充都建立新的陣列或樹（copy-on-write）。
+"""
+
+import math
+from array import array
+from typing import Dict, Any, Optional, Tuple
+
+
+# 統計的指標與其整數縮放倍率
+METRICS = ('temperature', 'humidity', 'heat_index', 'air_quality')
+SCALES = {'temperature': 10, 'humidity': 10, 'heat_index': 10, 'air_quality': 1}
+
+# int16 範圍，同時作為線段樹中「沒有數值」的哨兵
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+class MinMaxTree:
+    """可在尾端附加、從頭端刪除的最小值/最大值線段樹"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空"""
+        self.capacity = 1
+        self.base = 0       # 第 0 筆紀錄在葉節點中的實際位置（刪除前綴時只移動此值）
+        self.size = 0
+        self.mins = array('h', [INT16_MAX] * 2)
+        self.maxs = array('h', [INT16_MIN] * 2)
+
+    def copy(self) -> 'MinMaxTree':
+        """共用節點陣列的淺複製（用來在不影響快照的情況下移動起點）"""
+        tree = MinMaxTree.__new__(MinMaxTree)
+        tree.capacity, tree.base, tree.size = self.capacity, self.base, self.size
+        tree.mins, tree.maxs = self.mins, self.maxs
+        return tree
+
+    def is_full(self) -> bool:
+        """葉節點是否已用完（需要以 grown() 擴充後才能附加）"""
+        return self.base + self.size == self.capacity
+
+    def grown(self) -> 'MinMaxTree':
+        """
+        建立容量加倍的新樹，並把有效葉節點搬到最前面
+
+        原本的樹不會被修改，仍在使用它的快照可以繼續查詢。
+        """
+        capacity = 1
+        while capacity < 2 * (self.size + 1):
+            capacity *= 2
+
+        mins = array('h', [INT16_MAX]) * (2 * capacity)
+        maxs = array('h', [INT16_MIN]) * (2 * capacity)
+
+        start = self.capacity + self.base
+        mins[capacity:capacity + self.size] = self.mins[start:start + self.size]
+        maxs[capacity:capacity + self.size] = self.maxs[start:start + self.size]
+
+        for node in range(capacity - 1, 0, -1):
+            left, right = 2 * node, 2 * node + 1
+            mins[node] = mins[left] if mins[left] < mins[right] else mins[right]
+            maxs[node] = maxs[left] if maxs[left] > maxs[right] else maxs[right]
+
+        tree = MinMaxTree.__new__(MinMaxTree)
+        tree.capacity, tree.base, tree.size = capacity, 0, self.size
+        tree.mins, tree.maxs = mins, maxs
+        return tree
+
+    def append(self, value: Optional[int]):
+        """附加一個數值（None 表示該筆紀錄沒有此指標；已滿時先以 grown() 擴充）"""
+        node = self.capacity + self.base + self.size
+        self.size += 1
+        if value is None:
+            return
+
+        self.mins[node] = value
+        self.maxs[node] = value
+        node //= 2
+        while node:
+            changed = False
+            if value < self.mins[node]:
+                self.mins[node] = value
+                changed = True
+            if value > self.maxs[node]:
+                self.maxs[node] = value
+                changed = True
+            if not changed:
+                break
+            node //= 2
+
+    def drop_prefix(self, count: int):
+        """刪除最前面 count 筆（只移動起點，查詢不會再涵蓋到它們）"""
+        count = min(count, self.size)
+        self.base += count
+        self.size -= count
+
+    def query(self, start: int, stop: int) -> Tuple[int, int]:
+        """
+        取得位置 [start, stop) 的最小值與最大值
+
+        Returns:
+            (最小值, 最大值)，範圍內沒有數值時為 (INT16_MAX, INT16_MIN)
+        """
+        low, high = INT16_MAX, INT16_MIN
+        left = self.capacity + self.base + start
+        right = self.capacity + self.base + stop
+        mins, maxs = self.mins, self.maxs
+
+        while left < right:
+            if left & 1:
+                if mins[left] < low:
+                    low = mins[left]
+                if maxs[left] > high:
+                    high = maxs[left]
+                left += 1
+            if right & 1:
+                right -= 1
+                if mins[right] < low:
+                    low = mins[right]
+                if maxs[right] > high:
+                    high = maxs[right]
+            left //= 2
+            right //= 2
+
+        return low, high
+
+
+class AggregateIndex:
+    """每個指標的前綴和與最小值/最大值線段樹"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空"""
+        # 前綴陣列第 i 個元素為前 i 筆的累計值，長度為筆數 + 1
+        self.counts = {metric: array('l', [0]) for metric in METRICS}
+        self.sums = {metric: array('q', [0]) for metric in METRICS}
+        self.squares = {metric: array('q', [0]) for metric in METRICS}
+        self.trees = {metric: MinMaxTree() for metric in METRICS}
+
+    def __len__(self) -> int:
+        return len(self.counts['temperature']) - 1
+
+    def append(self, reading: Dict[str, Any]):
+        """附加一筆紀錄"""
+        for metric in METRICS:
+            value = reading.get(metric)
+            counts, sums, squares = self.counts[metric], self.sums[metric], self.squares[metric]
+            tree = self.trees[metric]
+            if tree.is_full():
+                tree = self.trees[metric] = tree.grown()
+
+            if value is None:
+                counts.append(counts[-1])
+                sums.append(sums[-1])
+                squares.append(squares[-1])
+                tree.append(None)
+                continue
+
+            scaled = max(INT16_MIN + 1, min(INT16_MAX - 1, int(round(value * SCALES[metric]))))
+            counts.append(counts[-1] + 1)
+            sums.append(sums[-1] + scaled)
+            squares.append(squares[-1] + scaled * scaled)
+            tree.append(scaled)
+
+    def arrays(self) -> Dict[str, array]:
+        """所有內部陣列（寫入檢查點用）"""
+        result = {}
+        for metric in METRICS:
+            tree = self.trees[metric]
+            result[f'{metric}.counts'] = self.counts[metric]
+            result[f'{metric}.sums'] = self.sums[metric]
+            result[f'{metric}.squares'] = self.squares[metric]
+            result[f'{metric}.tree'] = array('q', [tree.base, tree.size])
+            result[f'{metric}.mins'] = tree.mins
+            result[f'{metric}.maxs'] = tree.maxs
+        return result
+
+    def restore(self, arrays: Dict[str, array]):
+        """從 arrays() 的結果還原（讀取檢查點用）"""
+        for metric in METRICS:
+            tree = MinMaxTree.__new__(MinMaxTree)
+            tree.base, tree.size = arrays[f'{metric}.tree']
+            tree.mins = arrays[f'{metric}.mins']
+            tree.maxs = arrays[f'{metric}.maxs']
+            tree.capacity = len(tree.mins) // 2
+            self.counts[metric] = arrays[f'{metric}.counts']
+            self.sums[metric] = arrays[f'{metric}.sums']
+            self.squares[metric] = arrays[f'{metric}.squares']
+            self.trees[metric] = tree
+
+    def snapshot(self) -> 'AggregateIndex':
+        """目前內容的唯讀快照（與原物件共用陣列與線段樹）"""
+        frozen = AggregateIndex.__new__(AggregateIndex)
+        frozen.counts = dict(self.counts)
+        frozen.sums = dict(self.sums)
+        frozen.squares = dict(self.squares)
+        frozen.trees = dict(self.trees)
+        return frozen
+
+    def drop_prefix(self, count: int):
+        """刪除最前面 count 筆（前綴和以相減計算，保留原本的累計值即可；快照不受影響）"""
+        for metric in METRICS:
+            self.counts[metric] = self.counts[metric][count:]
+            self.sums[metric] = self.sums[metric][count:]
+            self.squares[metric] = self.squares[metric][count:]
+            tree = self.trees[metric].copy()
+            tree.drop_prefix(count)
+            self.trees[metric] = tree
+
+    def metric_summary(self, metric: str, start: int, stop: int) -> Dict[str, Any]:
+        """
+        計算單一指標在位置 [start, stop) 的統計
+
+        Returns:
+            {'avg', 'min', 'max', 'stddev'}，範圍內沒有數值時皆為 None
+        """
+        counts, sums, squares = self.counts[metric], self.sums[metric], self.squares[metric]
+        count = counts[stop] - counts[start]
+        if count == 0:
+            return {'avg': None, 'min': None, 'max': None, 'stddev': None}
+
+        scale = SCALES[metric]
+        total = sums[stop] - sums[start]
+        mean = total / count
+        variance = max(0.0, (squares[stop] - squares[start]) / count - mean * mean)
+        low, high = self.trees[metric].query(start, stop)
+
+        if scale == 1:
+            return {
+                'avg': round(mean, 1),
+                'min': low,
+                'max': high,
+                'stddev': round(math.sqrt(variance), 2)
+            }
+
+        return {
+            'avg': round(mean / scale, 1),
+            'min': round(low / scale, 1),
+            'max': round(high / scale, 1),
+            'stddev': round(math.sqrt(variance) / scale, 2)
+        }
+
+    def aggregate(self, metric: str, start: int, stop: int, agg: str) -> Optional[float]:
+        """
+        計算單一指標在位置 [start, stop) 的單一聚合值（只查詢需要的前綴和或線段樹）
+
+        Args:
+            agg: 'avg'、'min'、'max'、'sum' 或 'count'
+
+        Returns:
+            聚合值（avg 與 sum 四捨五入到一位小數），範圍內沒有數值時為 None（count 為 0）
+        """
+        counts = self.counts[metric]
+        count = counts[stop] - counts[start]
+        if agg == 'count':
+            return count
+        if count == 0:
+            return None
+
+        scale = SCALES[metric]
+        if agg in ('min', 'max'):
+            low, high = self.trees[metric].query(start, stop)
+            value = low if agg == 'min' else high
+            return value if scale == 1 else round(value / scale, 1)
+
+        total = self.sums[metric][stop] - self.sums[metric][start]
+        if agg == 'sum':
+            return total if scale == 1 else round(total / scale, 1)
+        return round(total / count / scale, 1)
+
+    def summary(self, start: int, stop: int) -> Dict[str, Any]:
+        """
+        計算位置 [start, stop) 所有指標的統計
+
+        Returns:
+            {'count': 筆數, 'temperature': {...}, 'humidity': {...}, ...}
+        """
+        stop = max(start, stop)
+        result: Dict[str, Any] = {'count': stop - start}
+        for metric in METRICS:
+            result[metric] = self.metric_summary(metric, start, stop)
+        return result
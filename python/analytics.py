@@ -0,0 +1,248 @@
+"""
+長期分析模組 - Parquet 封存與 DuckDB 查詢
+生物機電工程概論 期末專題
+
+database.export_to_parquet() 把已結束的每一天寫成依日期分區的 Parquet 檔：
+    data/parquet/date=2025-01-01/data.parquet
+Web 伺服器執行時由 parquet_export.py 在背景定期匯出，/api/analytics 只查詢已存在的分區。
+
+每個檔案包含各欄位的最小值/最大值統計，DuckDB 查詢時會依日期分區
+與欄位統計略過不需要的檔案與 row group（predicate pushdown）。
+
+分析查詢（週比較、每小時的季節性剖面、百分位數等）以內嵌的 DuckDB 執行，
+不需要把數據載入 Python。兩個套件都是選用的：
+    pip install pyarrow duckdb
+未安裝時 is_available() 回傳 False，/api/analytics 會回傳錯誤訊息。
+
+命令列使用：
+    python analytics.py export
+    python analytics.py daily --metric humidity --days 90
+"""
+
+import os
+from datetime import datetime, date, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from devices import DEFAULT_DEVICE
+
+# 可查詢的指標（欄位名稱直接放入 SQL，只接受此清單中的值）
+METRICS = ('temperature', 'humidity', 'heat_index', 'air_quality')
+
+# 每個 row group 的筆數（每 10 秒一筆時一天約 8,640 筆，一小時一個 row group）
+ROW_GROUP_ROWS = 360
+
+# 分區內的檔案名稱
+PARTITION_FILE = 'data.parquet'
+
+# 分析查詢：名稱對應 SQL 樣板（{metric} 為指標欄位，readings 為查詢範圍內的讀數）
+QUERIES = {
+    # 每日統計與 7 日移動平均
+    'daily': """
+        SELECT date AS period,
+               count({metric}) AS count,
+               round(avg({metric}), 2) AS avg,
+               min({metric}) AS min,
+               max({metric}) AS max,
+               round(avg(avg({metric})) OVER (ORDER BY date ROWS BETWEEN 6 PRECEDING AND CURRENT ROW), 2) AS avg_7d
+        FROM readings
+        GROUP BY date
+        ORDER BY date
+    """,
+    # 每週平均、中位數與相較前一週的變化
+    'weekly': """
+        SELECT date_trunc('week', recorded_at) AS period,
+               count({metric}) AS count,
+               round(avg({metric}), 2) AS avg,
+               round(median({metric}), 2) AS median,
+               round(avg({metric}) - lag(avg({metric})) OVER (ORDER BY date_trunc('week', recorded_at)), 2) AS change
+        FROM readings
+        GROUP BY period
+        ORDER BY period
+    """,
+    # 一天中各小時的剖面（例如季節性的濕度變化）
+    'hourly': """
+        SELECT hour(recorded_at) AS period,
+               count({metric}) AS count,
+               round(avg({metric}), 2) AS avg,
+               round(quantile_cont({metric}, 0.05), 2) AS p5,
+               round(quantile_cont({metric}, 0.5), 2) AS p50,
+               round(quantile_cont({metric}, 0.95), 2) AS p95
+        FROM readings
+        GROUP BY period
+        ORDER BY period
+    """,
+    # 每月百分位數
+    'percentiles': """
+        SELECT date_trunc('month', recorded_at) AS period,
+               count({metric}) AS count,
+               round(quantile_cont({metric}, 0.05), 2) AS p5,
+               round(quantile_cont({metric}, 0.25), 2) AS p25,
+               round(quantile_cont({metric}, 0.5), 2) AS p50,
+               round(quantile_cont({metric}, 0.75), 2) AS p75,
+               round(quantile_cont({metric}, 0.95), 2) AS p95
+        FROM readings
+        GROUP BY period
+        ORDER BY period
+    """
+}
+
+
+def can_export() -> bool:
+    """是否已安裝 pyarrow（匯出 Parquet 需要）"""
+    return pa is not None
+
+
+def is_available() -> bool:
+    """是否可執行分析查詢（需要 pyarrow 與 duckdb）"""
+    return pa is not None and duckdb is not None
+
+
+# ========== Parquet 匯出 ==========
+
+def partition_path(directory: Path, day: date) -> Path:
+    """某一天的分區檔案路徑"""
+    return Path(directory) / f"date={day.isoformat()}" / PARTITION_FILE
+
+
+def latest_partition(directory: Path) -> Optional[date]:
+    """已匯出的最新一天（沒有任何分區時回傳 None）"""
+    latest = None
+    for path in Path(directory).glob(f"date=*/{PARTITION_FILE}"):
+        try:
+            day = date.fromisoformat(path.parent.name[len('date='):])
+        except ValueError:
+            continue
+        if latest is None or day > latest:
+            latest = day
+    return latest
+
+
+def write_partition(path: Path, readings: Iterable[Dict[str, Any]]) -> int:
+    """
+    將一天的讀數寫成 Parquet 檔（含欄位統計，先寫暫存檔再取代）
+
+    Args:
+        path: 分區檔案路徑
+        readings: 依時間排序的讀數
+
+    Returns:
+        寫入的筆數，沒有讀數時不建立檔案並回傳 0
+    """
+    columns = {'id': [], 'recorded_at': [], 'temperature': [], 'humidity': [], 'heat_index': [], 'air_quality': [],
+               'device_id': []}
+    for reading in readings:
+        columns['id'].append(reading['id'])
+        columns['recorded_at'].append(datetime.fromisoformat(reading['recorded_at']))
+        columns['device_id'].append(reading.get('device_id') or DEFAULT_DEVICE)
+        for metric in METRICS:
+            columns[metric].append(reading.get(metric))
+
+    if not columns['id']:
+        return 0
+
+    table = pa.table({
+        'id': pa.array(columns['id'], pa.int64()),
+        'recorded_at': pa.array(columns['recorded_at'], pa.timestamp('us')),
+        'temperature': pa.array(columns['temperature'], pa.float64()),
+        'humidity': pa.array(columns['humidity'], pa.float64()),
+        'heat_index': pa.array(columns['heat_index'], pa.float64()),
+        'air_quality': pa.array(columns['air_quality'], pa.int32()),
+        'device_id': pa.array(columns['device_id'], pa.dictionary(pa.int32(), pa.string()))
+    })
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix('.tmp')
+    pq.write_table(table, tmp_file, row_group_size=ROW_GROUP_ROWS,
+                   compression='zstd', write_statistics=True)
+    os.replace(tmp_file, path)
+    return table.num_rows
+
+
+# ========== DuckDB 查詢 ==========
+
+def _json_value(value):
+    """DuckDB 回傳的日期時間轉為 ISO 字串"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def query(directory: Path, name: str, metric: str = 'temperature', days: int = 90) -> List[Dict[str, Any]]:
+    """
+    對 Parquet 封存執行分析查詢
+
+    Args:
+        directory: Parquet 分區目錄
+        name: QUERIES 中的查詢名稱
+        metric: METRICS 中的指標
+        days: 查詢最近幾天（依日期分區與時間欄位統計略過其他檔案）
+
+    Returns:
+        每個時段一筆的結果列表
+    """
+    if name not in QUERIES:
+        raise ValueError(f"Unknown analytics query: {name}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    directory = Path(directory)
+    if not any(directory.glob(f"date=*/{PARTITION_FILE}")):
+        return []
+
+    since = datetime.now() - timedelta(days=days)
+    source = str(directory / '*' / PARTITION_FILE)
+
+    # 日期分區與 recorded_at 的條件都會下推到 Parquet 讀取
+    sql = (
+        "WITH readings AS ("
+        "SELECT * FROM read_parquet(?, hive_partitioning = true) "
+        "WHERE date >= CAST(? AS DATE) AND recorded_at >= CAST(? AS TIMESTAMP)) "
+        + QUERIES[name].format(metric=metric)
+    )
+
+    conn = duckdb.connect()
+    try:
+        cursor = conn.execute(sql, [source, since.date().isoformat(), since.isoformat()])
+        names = [column[0] for column in cursor.description]
+        return [
+            {column: _json_value(value) for column, value in zip(names, row)}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import database as db
+
+    parser = argparse.ArgumentParser(description='Parquet 封存與分析查詢')
+    parser.add_argument('command', choices=['export'] + list(QUERIES), help='export 或查詢名稱')
+    parser.add_argument('--metric', default='temperature', choices=METRICS)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--overwrite', action='store_true', help='重新匯出已存在的分區')
+    args = parser.parse_args()
+
+    db.init_database()
+    if args.command == 'export':
+        db.export_to_parquet(overwrite=args.overwrite)
+    elif not is_available():
+        print("[ERROR] Analytics requires pyarrow and duckdb: pip install pyarrow duckdb")
+    else:
+        db.export_to_parquet()
+        for row in query(db.PARQUET_DIR, args.command, args.metric, args.days):
+            print(json.dumps(row, ensure_ascii=False))
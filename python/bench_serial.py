@@ -0,0 +1,749 @@
+"""
+Serial 讀取效能測試（以 pty 模擬 Arduino，僅限 Linux / macOS）
+生物機電工程概論 期末專題
+
+以虛擬終端（pty）取代實體的 Arduino：測試程式寫入 pty 的主端，
+ArduinoReader 以 pyserial 開啟從端，與連接實體 Arduino 時走相同的程式路徑。
+
+- 正確性：行在任意位置被切斷、CRLF、無法解析的雜訊與過長的行都能正確重組，順序不變
+- 吞吐量：寫入端全速送出時每秒處理的行數
+- 延遲：寫入一行到回呼函數收到的時間（每 50 毫秒一行；poll 模式每秒只能處理 10 行，會逐漸落後）
+- 閒置 CPU：沒有資料時讀取執行緒消耗的 CPU 時間
+- 二進位框架：FrameDecoder 在任意切割、位元翻轉、遺失位元組與 JSON 行混雜時都能重新對齊；
+  以模擬的 Arduino 測試 PROTOCOL:BINARY / BAUD 協商與舊版 sketch 的 JSON 退回；
+  比較每筆讀數的位元組數與解碼速度（JSON 行 / 二進位框架）
+- 指令：連續送出讀數的同時發送指令，每個指令都取得自己的回應（不會拿到讀數），讀數也不會遺失；
+  沒有回應的指令逾時；測量指令來回時間
+- 重新連接：模擬拔除再插上 Arduino，測量從插上到收到讀數的時間，確認執行緒數不增加；
+  連線時收到就緒訊息即完成，不再固定等待 2 秒
+- 多埠：SerialManager（serial_manager.py）同時讀取 --ports 個 pty，檢查每個埠的行依序收到且標記正確的來源，
+  比較單一 select 執行緒與每個埠一個執行緒的吞吐量、執行緒數與閒置 CPU
+
+event 與 poll（SERIAL_READ_MODE）兩種模式分別測量。
+pty 不會模擬 baud rate；實際 9600 baud 約為每秒 960 bytes（約每秒 15 行 JSON）。
+
+使用方式:
+    python bench_serial.py                  # 全部測試
+    python bench_serial.py --lines 50000    # 吞吐量測試的行數
+    python bench_serial.py --check          # 只執行正確性測試
+    python bench_serial.py --multi --ports 12   # 只執行多埠測試
+    python bench_serial.py --binary         # 只執行二進位框架測試
+    python bench_serial.py --commands       # 只執行指令測試
+    python bench_serial.py --reconnect      # 只執行重新連接測試
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import select
+import statistics
+import sys
+import threading
+import time
+from typing import List, Dict, Any, Tuple
+
+from serial_manager import SerialManager
+from serial_reader import (
+    ArduinoReader, LineBuffer, FrameDecoder, MAX_LINE_BYTES,
+    FRAME_TEXT, NEGOTIATE_TIMEOUT, encode_frame, encode_reading
+)
+
+
+class PtyArduino:
+    """以 pty 模擬的 Arduino（寫入主端的資料會出現在從端的 Serial 埠）"""
+
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self._write_lock = threading.Lock()
+
+    def write(self, data: bytes):
+        """寫入全部資料（pty 緩衝區滿時等待讀取端；多個執行緒寫入時不會交錯）"""
+        view = memoryview(data)
+        with self._write_lock:
+            while view:
+                written = os.write(self.master, view)
+                view = view[written:]
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def _line(seq: int, **extra) -> bytes:
+    """一行模擬的感測器 JSON"""
+    data = {'temp': round(random.uniform(15, 35), 1), 'humidity': round(random.uniform(30, 90), 1), 'seq': seq}
+    data.update(extra)
+    return (json.dumps(data) + '\n').encode()
+
+
+def _open(mode: str) -> Tuple[PtyArduino, ArduinoReader, List[Dict[str, Any]]]:
+    """建立 pty 與連接好的讀取器，回傳 (pty, 讀取器, 收到的數據列表)"""
+    device = PtyArduino()
+    reader = ArduinoReader(port=device.port, read_mode=mode)
+    if not reader.connect(ready_timeout=0):
+        raise RuntimeError(f"cannot open {device.port}")
+    received: List[Dict[str, Any]] = []
+    return device, reader, received
+
+
+def _close(device: PtyArduino, reader: ArduinoReader):
+    reader.stop_continuous_read()
+    reader.disconnect()
+    device.close()
+
+
+def _wait(predicate, timeout: float) -> bool:
+    """等待條件成立（測試端輪詢，不影響被測的讀取器）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+# ========== 正確性 ==========
+
+def check_line_buffer():
+    """LineBuffer 單元檢查"""
+    buffer = LineBuffer()
+    assert buffer.feed(b'{"a": 1') == []
+    assert buffer.feed(b'}\r\n{"b"') == ['{"a": 1}']
+    assert buffer.feed(b': 2}\n\n\n') == ['{"b": 2}']
+    assert buffer.feed(b'x' * (MAX_LINE_BYTES + 1)) == [] and buffer.dropped == 1
+    assert buffer.feed(b'{"c": 3}\n') == ['{"c": 3}']
+    assert buffer.feed('{"t": "溫度"}\n'.encode()[:5]) == []
+    print("[OK] LineBuffer")
+
+
+def check_pty(lines: int = 5000):
+    """以隨機切割的位元組送出 lines 行，確認全部依序收到"""
+    device, reader, received = _open('event')
+    reader.start_continuous_read(received.append)
+    try:
+        payload = bytearray()
+        for seq in range(lines):
+            payload += _line(seq)
+            if seq % 1000 == 500:
+                payload += b'not json\r\n' + b'\r\n'
+        # 在任意位置切斷，模擬 USB 封包邊界
+        position = 0
+        while position < len(payload):
+            size = random.randint(1, 300)
+            device.write(bytes(payload[position:position + size]))
+            position += size
+            if random.random() < 0.01:
+                time.sleep(0.002)
+
+        assert _wait(lambda: len(received) >= lines, 10), f"received {len(received)} / {lines}"
+        assert [data['seq'] for data in received] == list(range(lines)), "out of order"
+        assert all(data['device_id'] == reader.device_id for data in received)
+
+        # read_blocking：數據一到就回傳，沒有數據時在逾時後回傳 None
+        reader.stop_continuous_read()
+        threading.Timer(0.05, device.write, args=(_line(-1, pong=True),)).start()
+        started = time.perf_counter()
+        data = reader.read_blocking(timeout=2)
+        elapsed = time.perf_counter() - started
+        assert data and data['seq'] == -1 and elapsed < 0.5, (data, elapsed)
+        started = time.perf_counter()
+        assert reader.read_blocking(timeout=0.3) is None
+        assert 0.25 < time.perf_counter() - started < 1.0
+    finally:
+        _close(device, reader)
+    print(f"[OK] pty: {lines:,} lines in random fragments, in order")
+
+
+def _frames(count: int) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """count 個讀數框架（每 100 個插入一行 JSON 與一個文字框架），回傳 (位元組, 預期的讀數)"""
+    payload = bytearray()
+    expected = []
+    for seq in range(count):
+        temperature, humidity = round(random.uniform(-10, 45), 1), round(random.uniform(0, 100), 1)
+        heat_index = None if seq % 7 == 0 else round(random.uniform(-10, 50), 1)
+        air_quality = None if seq % 5 == 0 else random.randint(0, 2000)
+        payload += encode_reading(temperature, humidity, heat_index, air_quality, 'bad', seq)
+        expected.append({'temp': temperature, 'humidity': humidity, 'heat_index': heat_index,
+                         'air_quality': air_quality, 'quality': 'bad', 'count': seq})
+        if seq % 100 == 50:
+            payload += b'{"pong": true}\r\n' + encode_frame(FRAME_TEXT, b'{"led": "auto"}')
+    return bytes(payload), expected
+
+
+def check_frame_decoder(count: int = 5000):
+    """FrameDecoder：隨機切割時完全還原，損毀時只遺失受影響的框架"""
+    payload, expected = _frames(count)
+
+    decoder = FrameDecoder()
+    items = []
+    position = 0
+    while position < len(payload):
+        size = random.randint(1, 64)
+        items += decoder.feed(payload[position:position + size])
+        position += size
+    readings = [item for item in items if isinstance(item, dict)]
+    assert readings == expected, "frames not restored"
+    assert items.count('{"pong": true}') == items.count('{"led": "auto"}') == len(range(50, count, 100))
+    assert decoder.crc_errors == decoder.dropped == 0
+
+    # 位元翻轉與遺失位元組：其餘的框架都要正確解出，不能解出錯誤的讀數
+    corrupted = bytearray(payload)
+    damaged = 0
+    for _ in range(count // 50):
+        index = random.randrange(len(corrupted))
+        if random.random() < 0.5:
+            corrupted[index] ^= 1 << random.randrange(8)
+        else:
+            del corrupted[index]
+        damaged += 1
+    decoder = FrameDecoder()
+    readings = [item for item in decoder.feed(bytes(corrupted)) if isinstance(item, dict)]
+    known = {reading['count']: reading for reading in expected}
+    assert all(known.get(reading['count']) == reading for reading in readings), "corrupted reading decoded"
+    assert len(readings) >= count - 2 * damaged, (len(readings), count, damaged)
+    print(f"[OK] FrameDecoder: {count:,} frames in random fragments; "
+          f"{damaged} corruptions lost {count - len(readings)} frames "
+          f"({decoder.crc_errors} CRC errors, {decoder.dropped} bytes skipped)")
+
+
+class FakeArduino(PtyArduino):
+    """
+    會回應指令的模擬 Arduino（與 sketch 相同的回應；不回應 STATUS，用來測試逾時）
+
+    legacy=True 時模擬不認得 PROTOCOL / BAUD 的舊版 sketch
+    """
+
+    REPLIES = {
+        'PING': '{"pong": true}',
+        'BUZZ': '{"buzzer": "triggered", "count": 3}',
+        'AUTO_COLOR': '{"led": "auto"}',
+        'SILENT_ON': '{"silent": true}',
+        'SILENT_OFF': '{"silent": false}',
+    }
+
+    def __init__(self, legacy: bool = False, boot_delay: float = None, interval: float = None):
+        """
+        Args:
+            legacy: 模擬舊版 sketch
+            boot_delay: 經過此秒數後送出就緒訊息（模擬開機；None 為不送出）
+            interval: 每隔此秒數送出一筆讀數（None 為不送出）
+        """
+        super().__init__()
+        self.legacy = legacy
+        self.binary = False
+        self.commands: List[str] = []
+        self.closed = threading.Event()
+        self._threads = [threading.Thread(target=self._serve, daemon=True)]
+        if boot_delay is not None or interval is not None:
+            self._threads.append(threading.Thread(target=self._run, args=(boot_delay, interval), daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self, boot_delay: float, interval: float):
+        """開機後送出就緒訊息，之後定時送出讀數"""
+        try:
+            if boot_delay is not None:
+                if self.closed.wait(boot_delay):
+                    return
+                self.send('{"status": "ready", "version": "0.4.0"}')
+            seq = 0
+            while interval is not None and not self.closed.wait(interval):
+                self.write(_line(seq, sent=time.perf_counter()))
+                seq += 1
+        except OSError:
+            pass  # 已拔除
+
+    def close(self):
+        # 先結束執行緒再關閉 fd，否則 fd 編號被下一個 pty 重新使用時，舊的執行緒會讀到新的 pty
+        self.closed.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=1)
+        super().close()
+
+    def send(self, text: str):
+        """以目前的格式送出一則 JSON 訊息"""
+        self.write(encode_frame(FRAME_TEXT, text.encode()) if self.binary else (text + '\r\n').encode())
+
+    def _serve(self):
+        buffer = LineBuffer()
+        while not self.closed.is_set():
+            # 以 select 等待，close() 後才能真正釋放 pty（阻塞在 read() 中的 fd 不會因 close() 而關閉）
+            try:
+                if not select.select([self.master], [], [], 0.05)[0]:
+                    continue
+                chunk = os.read(self.master, 1024)
+            except (OSError, ValueError):
+                return
+            for command in buffer.feed(chunk):
+                self.commands.append(command)
+                if command == 'PROTOCOL:BINARY' and not self.legacy:
+                    self.binary = True
+                    self.send('{"protocol": "binary"}')
+                elif command.startswith('BAUD:') and not self.legacy:
+                    self.send(f'{{"baud": {int(command[5:])}}}')
+                elif command.startswith('SET_COLOR:'):
+                    r, g, b = command[10:].split(',')
+                    self.send(f'{{"led": "set", "r": {r}, "g": {g}, "b": {b}}}')
+                elif command in self.REPLIES:
+                    self.send(self.REPLIES[command])
+
+
+def check_negotiation():
+    """協商二進位框架與通訊速率，舊版 sketch 不回應時退回 JSON"""
+    device = FakeArduino()
+    reader = ArduinoReader(port=device.port, protocol='binary')
+    received: List[Dict[str, Any]] = []
+    try:
+        # 協商期間送出的讀數不會遺失
+        device.write(_line(-1))
+        assert reader.connect(ready_timeout=0) and reader.binary_active
+        device.write(b'{"temp": 20.0, "humidity": 50.0, "seq": -1}\n')
+        assert reader.negotiate(fast_baud=57600, timeout=2) and reader.baud_rate == 57600
+        assert device.commands[-3:] == ['PROTOCOL:BINARY', 'BAUD:57600', 'PING'], device.commands
+        reader.start_continuous_read(received.append)
+        device.write(b''.join(encode_reading(21.5, 60.0, 22.1, 400, 'good', seq) for seq in range(100)))
+        assert _wait(lambda: len(received) >= 100, 5), len(received)
+        readings = [data for data in received if 'count' in data]
+        assert [data['count'] for data in readings] == list(range(100))
+        assert readings[0]['temp'] == 21.5 and readings[0]['device_id'] == reader.device_id
+        assert reader.get_link_stats()['frames'] >= 100
+    finally:
+        _close(device, reader)
+
+    device = FakeArduino(legacy=True)
+    reader = ArduinoReader(port=device.port, protocol='binary')
+    try:
+        # 協商逾時後仍連接成功，以 JSON 繼續
+        started = time.perf_counter()
+        assert reader.connect(ready_timeout=0) is True and not reader.binary_active
+        assert time.perf_counter() - started < NEGOTIATE_TIMEOUT + 1
+        device.write(_line(7))
+        data = reader.read_blocking(timeout=2)
+        assert data and data['seq'] == 7
+    finally:
+        _close(device, reader)
+    print("[OK] negotiation: binary + baud switch, JSON fallback for legacy sketch")
+
+
+def check_commands(commands: int = 200) -> List[float]:
+    """
+    模擬 Arduino 每毫秒送出讀數的同時發送指令，確認每個指令取得自己的回應且讀數沒有遺失
+
+    Returns:
+        每個指令的來回時間（秒）
+    """
+    device = FakeArduino()
+    reader = ArduinoReader(port=device.port, protocol='json')
+    received: List[Dict[str, Any]] = []
+    assert reader.connect(ready_timeout=0)
+    stop = threading.Event()
+
+    def stream():
+        seq = 0
+        while not stop.is_set():
+            device.write(_line(seq))
+            seq += 1
+            time.sleep(0.001)
+        return seq
+
+    # 連續讀取開始前：由呼叫端讀取，其間的讀數留給之後的讀取
+    device.write(_line(-1))
+    assert reader.ping()
+    assert reader.read_blocking(timeout=1)['seq'] == -1
+
+    reader.start_continuous_read(received.append)
+    streamer = threading.Thread(target=stream, daemon=True)
+    streamer.start()
+    latencies = []
+    try:
+        for i in range(commands):
+            started = time.perf_counter()
+            if i % 3 == 0:
+                assert reader.ping(), "ping answered with a reading"
+            elif i % 3 == 1:
+                reply = reader.request(f"SET_COLOR:{i % 256},0,0")
+                assert reply and reply['led'] == 'set' and reply['r'] == i % 256, reply
+            else:
+                reply = reader.request("BUZZ")
+                assert reply and reply['buzzer'] == 'triggered', reply
+            latencies.append(time.perf_counter() - started)
+
+        # 同時發送多個指令（Future），依序取得各自的回應
+        futures = [reader.send_request(command) for command in ("SILENT_ON", "PING", "AUTO_COLOR", "SILENT_OFF")]
+        replies = [future.result(timeout=2) for future in futures]
+        assert [reply.get('silent', reply.get('pong', reply.get('led'))) for reply in replies] == [True, True, 'auto', False]
+
+        # 沒有回應的指令逾時，不影響之後的指令
+        started = time.perf_counter()
+        assert reader.request("STATUS", timeout=0.2) is None
+        assert 0.15 < time.perf_counter() - started < 1
+        assert reader.ping()
+
+        # 在事件迴圈中等待（Discord bot 的用法）
+        async def bot():
+            return await asyncio.gather(reader.acommand("BUZZ"), reader.acommand("STATUS", timeout=0.2))
+        buzzed, status = asyncio.run(bot())
+        assert buzzed['buzzer'] == 'triggered' and status is None
+    finally:
+        stop.set()
+        streamer.join()
+        time.sleep(0.2)
+        _close(device, reader)
+
+    seqs = [data['seq'] for data in received]
+    assert seqs == list(range(len(seqs))) and len(seqs) > 100, "readings lost while commands were running"
+    assert not reader._pending
+    print(f"[OK] commands: {commands + 7} commands answered while {len(seqs):,} readings streamed, none lost")
+    return latencies
+
+
+def _wait_port_free(port: str, timeout: float = 2) -> bool:
+    """等待讀取器關閉中斷的埠（pty 編號在所有人關閉後才會釋出並重新使用）"""
+    return _wait(lambda: not os.path.exists(port), timeout)
+
+
+def _replug(port: str, **kwargs) -> FakeArduino:
+    """在同一個埠號上重新插上模擬的 Arduino（系統會重新使用剛釋出的 pty 編號）"""
+    spare = []
+    try:
+        while True:
+            device = FakeArduino(**kwargs)
+            if device.port == port:
+                return device
+            spare.append(device)  # 佔住較小的編號，直到取得原本的埠號
+            if len(spare) > 32:
+                raise RuntimeError(f"{port} was not reused")
+    finally:
+        for device in spare:
+            device.close()
+
+
+def check_reconnect(cycles: int = 3) -> List[float]:
+    """
+    就緒訊息與拔除再插上：每次插上後在 3 秒內重新收到讀數，且執行緒沒有增加
+
+    Returns:
+        每次從插上到收到第一筆讀數的秒數
+    """
+    threads_before = threading.active_count()
+
+    # 收到就緒訊息即完成連線（模擬開機 0.3 秒）
+    device = FakeArduino(boot_delay=0.3)
+    reader = ArduinoReader(port=device.port, protocol='json')
+    started = time.perf_counter()
+    assert reader.connect()
+    elapsed = time.perf_counter() - started
+    assert 0.25 < elapsed < 1.5, elapsed
+    assert reader.read_blocking(timeout=0.2) is None, "ready message was passed on as data"
+    _close(device, reader)
+    print(f"[OK] ready message: connected in {elapsed:.2f} s (fixed wait was 2 s)")
+
+    device = FakeArduino(interval=0.02)
+    port = device.port
+    reader = ArduinoReader(port=port, protocol='json')
+    received: List[Dict[str, Any]] = []
+    assert reader.connect(ready_timeout=1)
+    reader.start_continuous_read(received.append)
+    recoveries = []
+    try:
+        for _ in range(cycles):
+            assert _wait(lambda: len(received) > 5, 2)
+            device.close()  # 拔除
+            assert _wait_port_free(port), "port was not released after unplug"
+            assert _wait(lambda: not reader.is_connected, 1)
+            time.sleep(0.5)
+
+            received.clear()
+            device = _replug(port, boot_delay=0.3, interval=0.02)  # 插上
+            plugged = time.perf_counter()
+            assert _wait(lambda: received, 3), "no data within 3 s after replug"
+            recoveries.append(time.perf_counter() - plugged)
+        assert reader.reconnects == cycles and reader.is_connected
+        assert threading.active_count() == threads_before + 3  # 讀取器 1 個、模擬 Arduino 2 個
+    finally:
+        _close(device, reader)
+    assert _wait(lambda: threading.active_count() == threads_before, 2), "threads leaked"
+    print(f"[OK] reconnect: {cycles} unplug/replug cycles, "
+          f"recovered in {min(recoveries):.2f} – {max(recoveries):.2f} s, no thread leaks")
+    return recoveries
+
+
+def check_manager_reconnect(ports: int = 3):
+    """SerialManager：一個埠拔除時其餘的埠繼續讀取，插上後自動回復，停止後沒有殘留的執行緒"""
+    threads_before = threading.active_count()
+    devices = [FakeArduino(interval=0.02) for _ in range(ports)]
+    manager = SerialManager([(device.port, None) for device in devices], use_selector=True)
+    assert manager.connect(ready_timeout=1) == ports
+    received: List[Dict[str, Any]] = []
+    manager.start(received.append)
+    try:
+        port = devices[0].port
+        devices[0].close()
+        assert _wait_port_free(port)
+        received.clear()
+        assert _wait(lambda: len(received) > 20, 2)
+        assert all(data['port'] != port for data in received), "data from unplugged port"
+        assert len(manager.connected) == ports - 1
+
+        devices[0] = _replug(port, boot_delay=0.3, interval=0.02)
+        plugged = time.perf_counter()
+        assert _wait(lambda: any(data['port'] == port for data in received), 3), "port did not recover"
+        recovered = time.perf_counter() - plugged
+        assert len(manager.connected) == ports and not manager._reconnect_threads
+
+        # 停止時仍在等待插上的埠
+        devices[1].close()
+        assert _wait(lambda: len(manager._reconnect_threads) == 1, 2)
+    finally:
+        manager.stop()
+        for device in devices:
+            device.close()
+    assert _wait(lambda: threading.active_count() == threads_before, 2), "threads leaked"
+    print(f"[OK] manager reconnect: other ports kept streaming, port recovered in {recovered:.2f} s, "
+          f"no thread leaks after stop")
+
+
+def check_manager_commands(ports: int = 3):
+    """SerialManager.acommand 同時等待每個埠的回應"""
+    devices = [FakeArduino() for _ in range(ports)]
+    manager = SerialManager([(device.port, None) for device in devices], use_selector=True)
+    assert manager.connect(ready_timeout=0) == ports
+    manager.start(lambda data: None)
+    try:
+        replies = asyncio.run(manager.acommand("BUZZ"))
+        assert sorted(replies) == sorted(device.port for device in devices)
+        assert all(reply and reply['buzzer'] == 'triggered' for reply in replies.values()), replies
+        replies = asyncio.run(manager.acommand("STATUS", timeout=0.2))
+        assert all(reply is None for reply in replies.values())
+    finally:
+        manager.stop()
+        for device in devices:
+            device.close()
+    print(f"[OK] manager: command acknowledged by all {ports} ports")
+
+
+# ========== 效能 ==========
+
+def bench_throughput(mode: str, lines: int, seconds: float) -> float:
+    """寫入端全速送出，回傳讀取端每秒處理的行數（最多測量 seconds 秒）"""
+    device, reader, received = _open(mode)
+    payload = b''.join(_line(seq) for seq in range(lines))
+
+    def writer():
+        try:
+            device.write(payload)
+        except OSError:
+            pass  # 測試結束時 pty 已關閉
+
+    reader.start_continuous_read(received.append)
+    started = time.perf_counter()
+    threading.Thread(target=writer, daemon=True).start()
+    _wait(lambda: len(received) >= lines, seconds)
+    elapsed = time.perf_counter() - started
+    count = len(received)
+    _close(device, reader)
+    return count / elapsed
+
+
+def bench_latency(mode: str, samples: int) -> List[float]:
+    """每 50 毫秒寫入一行，回傳每行從寫入到回呼的延遲（秒）"""
+    device, reader, received = _open(mode)
+    latencies: List[float] = []
+    reader.start_continuous_read(lambda data: latencies.append(time.perf_counter() - data['sent']))
+    for seq in range(samples):
+        device.write(_line(seq, sent=time.perf_counter()))
+        time.sleep(0.05)
+    _wait(lambda: len(latencies) >= samples, 2)
+    _close(device, reader)
+    return latencies
+
+
+def bench_idle(mode: str, seconds: float) -> float:
+    """沒有資料時讀取器消耗的 CPU 時間（毫秒 / 秒）"""
+    device, reader, received = _open(mode)
+    reader.start_continuous_read(received.append)
+    time.sleep(0.2)
+    cpu = time.process_time()
+    time.sleep(seconds)
+    used = time.process_time() - cpu
+    _close(device, reader)
+    return used * 1000 / seconds
+
+
+def bench_decode(count: int) -> Dict[str, Dict[str, float]]:
+    """
+    相同讀數以 JSON 行（與 sketch 輸出相同的欄位）與二進位框架表示時的大小與解碼速度
+
+    Returns:
+        {'json' | 'binary': {'bytes', 'per_s'}}
+    """
+    frames, expected = _frames(count)
+    frames = b''.join(encode_reading(data['temp'], data['humidity'], data['heat_index'], data['air_quality'],
+                                     data['quality'], data['count']) for data in expected)
+    lines = b''.join((json.dumps(data) + '\r\n').encode() for data in expected)
+
+    results = {}
+    for name, payload, make in (('json', lines, LineBuffer), ('binary', frames, FrameDecoder)):
+        decoder = make()
+        started = time.perf_counter()
+        items = decoder.feed(payload)
+        if name == 'json':
+            items = [json.loads(line) for line in items]
+        elapsed = time.perf_counter() - started
+        assert len(items) == count
+        results[name] = {'bytes': len(payload) / count, 'per_s': count / elapsed}
+    return results
+
+
+def bench_multi(ports: int, lines: int, seconds: float, use_selector: bool) -> Dict[str, float]:
+    """
+    以 SerialManager 同時讀取 ports 個 pty（每個埠 lines 行，隨機切割並交錯寫入）
+
+    Returns:
+        {'lines_per_s', 'threads', 'idle_cpu'}
+    """
+    devices = [PtyArduino() for _ in range(ports)]
+    manager = SerialManager([(device.port, f"node-{i}") for i, device in enumerate(devices)],
+                            use_selector=use_selector)
+    threads_before = threading.active_count()
+    assert manager.connect(ready_timeout=0) == ports
+    received: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def on_data(data):
+        with lock:
+            received.append(data)
+
+    manager.start(on_data)
+    threads = threading.active_count() - threads_before
+
+    # 閒置 CPU
+    time.sleep(0.2)
+    cpu = time.process_time()
+    time.sleep(seconds)
+    idle_cpu = (time.process_time() - cpu) * 1000 / seconds
+
+    payloads = [b''.join(_line(seq) for seq in range(lines)) for _ in devices]
+    positions = [0] * ports
+    started = time.perf_counter()
+    while any(position < len(payload) for position, payload in zip(positions, payloads)):
+        for i, device in enumerate(devices):
+            if positions[i] < len(payloads[i]):
+                size = random.randint(1, 400)
+                device.write(payloads[i][positions[i]:positions[i] + size])
+                positions[i] += size
+    _wait(lambda: len(received) >= ports * lines, 30)
+    elapsed = time.perf_counter() - started
+
+    for i, device in enumerate(devices):
+        mine = [data for data in received if data['port'] == device.port]
+        assert [data['seq'] for data in mine] == list(range(lines)), f"port {device.port} out of order"
+        assert all(data['device_id'] == f"node-{i}" for data in mine)
+
+    manager.stop()
+    for device in devices:
+        device.close()
+    return {'lines_per_s': len(received) / elapsed, 'threads': threads, 'idle_cpu': idle_cpu}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial 讀取效能測試（pty）')
+    parser.add_argument('--lines', type=int, default=20000, help='吞吐量測試的行數（預設 20,000）')
+    parser.add_argument('--seconds', type=float, default=3, help='每項效能測試最長秒數（預設 3）')
+    parser.add_argument('--samples', type=int, default=40, help='延遲測試的行數（預設 40）')
+    parser.add_argument('--check', action='store_true', help='只執行正確性測試')
+    parser.add_argument('--multi', action='store_true', help='只執行多埠測試')
+    parser.add_argument('--ports', type=int, default=12, help='多埠測試的埠數（預設 12）')
+    parser.add_argument('--binary', action='store_true', help='只執行二進位框架測試')
+    parser.add_argument('--commands', action='store_true', help='只執行指令測試')
+    parser.add_argument('--reconnect', action='store_true', help='只執行重新連接測試')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'openpty'):
+        print("[ERROR] pty is not available on this platform (Linux / macOS only)")
+        sys.exit(1)
+
+    random.seed(1)
+    if args.multi:
+        _print_multi(args)
+        return
+    if args.binary:
+        _print_binary(args)
+        return
+    if args.commands:
+        _print_commands()
+        return
+    if args.reconnect:
+        check_reconnect()
+        check_manager_reconnect()
+        return
+
+    print("=== 正確性 ===")
+    check_line_buffer()
+    check_pty()
+    check_frame_decoder()
+    check_negotiation()
+    _print_commands()
+    check_reconnect()
+    check_manager_reconnect()
+    if args.check:
+        return
+
+    print(f"\n=== 效能: event / poll ===")
+    print(f"{'mode':<8} {'lines/s':>12} {'p50 latency':>13} {'p99 latency':>13} {'idle CPU':>14}")
+    for mode in ('event', 'poll'):
+        throughput = bench_throughput(mode, args.lines, args.seconds)
+        latencies = sorted(bench_latency(mode, args.samples))
+        p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else float('nan')
+        idle = bench_idle(mode, args.seconds)
+        print(f"{mode:<8} {throughput:>12,.0f} {p50:>10.2f} ms {p99:>10.2f} ms {idle:>8.2f} ms/s")
+
+    print()
+    _print_binary(args)
+    print()
+    _print_multi(args)
+
+
+def _print_commands():
+    """指令測試與來回時間"""
+    latencies = sorted(check_commands())
+    check_manager_commands()
+    print(f"     command round trip while streaming: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+
+
+def _print_binary(args):
+    """二進位框架測試（正確性與大小、解碼速度）"""
+    if args.binary:
+        print("=== 正確性 ===")
+        check_frame_decoder()
+        check_negotiation()
+        print()
+    print(f"=== JSON 行 / 二進位框架: {args.lines:,} 筆讀數 ===")
+    print(f"{'format':<8} {'bytes/reading':>14} {'decoded/s':>12} {'readings/s @ 9600 baud':>24}")
+    for name, result in bench_decode(args.lines).items():
+        # 8N1：每個位元組 10 個位元
+        print(f"{name:<8} {result['bytes']:>14.1f} {result['per_s']:>12,.0f} {960 / result['bytes']:>24.1f}")
+
+
+def _print_multi(args):
+    """多埠測試（單一 select 執行緒 / 每個埠一個執行緒）"""
+    lines = max(1, args.lines // args.ports)
+    print(f"=== 多埠: {args.ports} 個埠，每個埠 {lines:,} 行 ===")
+    print(f"{'readers':<18} {'lines/s':>12} {'threads':>8} {'idle CPU':>14}")
+    for label, use_selector in (('one select thread', True), ('thread per port', False)):
+        result = bench_multi(args.ports, lines, args.seconds, use_selector)
+        print(f"{label:<18} {result['lines_per_s']:>12,.0f} {result['threads']:>8} "
+              f"{result['idle_cpu']:>8.2f} ms/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+儲存效能測試
+生物機電工程概論 期末專題
+
+- 記憶體：N 筆讀數以 list-of-dicts 與欄位式 array（columns.py）保存時的用量
+- 範圍掃描：JSONL 日誌與二進位紀錄檔（binary_store.py）讀取全部讀數的時間
+- 壓縮區塊：gorilla.py 與舊版整包 JSON（indent=2）的檔案大小比、編碼與解碼速度
+- 啟動時間：不同歷史長度下，新程序從 init_database() 到取得最新讀數（/api/current）的時間，
+  比較使用檢查點與完整掃描
+
+使用方式:
+    python bench_storage.py                 # 預設 1,000,000 筆
+    python bench_storage.py --rows 100000
+    python bench_storage.py --scan          # 只執行範圍掃描測試
+    python bench_storage.py --codec         # 只執行壓縮區塊測試
+    python bench_storage.py --startup       # 只執行啟動時間測試（歷史為 1%、10%、100% 的 --rows）
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator
+
+import gorilla
+import logfile
+from binary_store import BinaryStore
+from columns import ReadingColumns
+
+
+def generate_readings(rows: int) -> Iterator[Dict[str, Any]]:
+    """產生與日誌格式相同、每 10 秒一筆的模擬讀數"""
+    start = time.time() - rows * 10
+    for i in range(rows):
+        temperature = round(random.uniform(15, 35), 1)
+        yield {
+            'id': i + 1,
+            'temperature': temperature,
+            'humidity': round(random.uniform(30, 90), 1),
+            'heat_index': round(temperature + random.uniform(0, 3), 1),
+            'air_quality': random.randint(50, 800),
+            'recorded_at': datetime.fromtimestamp(start + i * 10 + random.random()).isoformat()
+        }
+
+
+def generate_series(rows: int) -> Iterator[Dict[str, Any]]:
+    """產生接近實際感測器的讀數：數值緩慢變化、間隔約 10 秒且有毫秒級抖動"""
+    start = time.time() - rows * 10
+    temperature, humidity, air_quality = 25.0, 60.0, 120
+    for i in range(rows):
+        temperature = round(min(max(temperature + random.choice((-0.1, 0, 0, 0, 0.1)), 15), 35), 1)
+        humidity = round(min(max(humidity + random.choice((-0.1, 0, 0, 0.1)), 30), 90), 1)
+        air_quality = min(max(air_quality + random.randint(-2, 2), 50), 800)
+        yield {
+            'id': i + 1,
+            'temperature': temperature,
+            'humidity': humidity,
+            'heat_index': round(temperature + humidity / 100, 1),
+            'air_quality': air_quality,
+            'recorded_at': datetime.fromtimestamp(start + i * 10 + random.uniform(0, 0.05)).isoformat()
+        }
+
+
+def measure(label: str, build, rows: int) -> int:
+    """建立資料結構並回傳 tracemalloc 量到的記憶體增量"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = build(generate_readings(rows))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<16} {used / 1024 / 1024:>9.1f} MB  {used / rows:>7.1f} B/row  build {elapsed:.1f}s")
+    del store
+    return used
+
+
+def timed(label: str, scan, rows: int):
+    """執行一次掃描並輸出每秒筆數"""
+    started = time.perf_counter()
+    count = scan()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {elapsed:>7.2f}s  {count / elapsed:>12,.0f} rows/s")
+    assert count == rows, (label, count)
+
+
+def bench_scan(rows: int):
+    """比較 JSONL 日誌與二進位紀錄檔的全範圍掃描"""
+    print(f"=== 範圍掃描: {rows:,} 筆讀數 ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / 'bench.jsonl'
+        store = BinaryStore(Path(tmp) / 'bench.bin')
+        store.init()
+
+        with open(log_file, 'w', encoding='utf-8') as f:
+            for reading in generate_readings(rows):
+                f.write(json.dumps(reading, ensure_ascii=False) + '\n')
+        store.insert_many(generate_readings(rows))
+
+        timed('JSONL (json.loads)', lambda: sum(1 for _ in logfile.scan(log_file)), rows)
+        timed('binary (struct)', lambda: sum(1 for _ in store.iter_all()), rows)
+        if store.view_between() is not None:
+            def numpy_scan():
+                # 讀取每筆的溫度欄位（平均值），確保整個範圍都被實際掃描
+                view = store.view_between()
+                view['temperature'].mean()
+                return len(view)
+
+            timed('binary (numpy view)', numpy_scan, rows)
+        else:
+            print("binary (numpy view)      NumPy not installed, skipped")
+        store.close()
+
+
+def bench_codec(rows: int):
+    """比較壓縮區塊與舊版整包 JSON 的大小，並測量編碼/解碼速度"""
+    print(f"=== 壓縮區塊: {rows:,} 筆讀數 ===")
+    # 每筆讀數包含溫度、濕度、體感溫度、空氣品質 4 個 (時間, 數值) 資料點
+    points = rows * 4
+    with tempfile.TemporaryDirectory() as tmp:
+        readings = list(generate_series(rows))
+        json_file = Path(tmp) / 'bench.json'
+        log_file = Path(tmp) / 'bench.jsonl'
+        block_file = Path(tmp) / 'bench.blk'
+
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump({'readings': readings}, f, ensure_ascii=False, indent=2)
+        with open(log_file, 'w', encoding='utf-8') as f:
+            for reading in readings:
+                f.write(json.dumps(reading, ensure_ascii=False) + '\n')
+
+        started = time.perf_counter()
+        gorilla.write_file(block_file, readings)
+        encode_elapsed = time.perf_counter() - started
+
+        block_size = block_file.stat().st_size
+        for label, path in (('JSON (indent=2)', json_file), ('JSONL', log_file)):
+            size = path.stat().st_size
+            print(f"{label:<24} {size / 1024 / 1024:>9.2f} MB  {size / block_size:>6.1f}x")
+        print(f"{'compressed blocks':<24} {block_size / 1024 / 1024:>9.2f} MB  "
+              f"{block_size / rows:.2f} B/row  encode {rows / encode_elapsed:,.0f} rows/s")
+
+        def decode(use_numpy):
+            # 實際讀取每個欄位的長度，確保整個區塊都已解碼
+            return sum(len(columns['temperature']) for columns in gorilla.iter_columns(block_file, use_numpy))
+
+        for label, use_numpy in (('decode (numpy)', True), ('decode (pure Python)', False)):
+            if use_numpy and gorilla.np is None:
+                print(f"{label:<24} NumPy not installed, skipped")
+                continue
+            started = time.perf_counter()
+            count = decode(use_numpy)
+            elapsed = time.perf_counter() - started
+            assert count == rows, (label, count)
+            print(f"{label:<24} {elapsed:>7.2f}s  {points / elapsed:>14,.0f} points/s")
+
+        started = time.perf_counter()
+        count = sum(1 for _ in gorilla.iter_readings(block_file))
+        elapsed = time.perf_counter() - started
+        print(f"{'decode (dicts)':<24} {elapsed:>7.2f}s  {count / elapsed:>14,.0f} rows/s")
+
+
+# 在新程序中建立歷史數據（JSONL 後端，每 10,000 筆批次新增）
+SETUP_SCRIPT = """
+import sys
+import bench_storage, csv_stream, database as db
+db.init_database()
+for chunk in csv_stream.chunked(bench_storage.generate_series(int(sys.argv[1])), 10000):
+    db.insert_readings(chunk)
+db.save_checkpoint()
+"""
+
+# 在新程序中測量啟動到取得最新讀數的時間（與 /api/current 沒有即時數據時相同的查詢）
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import database as db
+db.init_database()
+db.get_latest_reading()
+print(time.perf_counter() - started)
+"""
+
+
+def _run(script: str, data_root: Path, *args) -> str:
+    """以 data_root 為資料目錄在新程序中執行腳本，回傳最後一行輸出"""
+    env = dict(os.environ, DATABASE_PATH=str(data_root / 'sensor_data.db'), STORAGE_BACKEND='jsonl')
+    result = subprocess.run([sys.executable, '-c', script, *args], env=env, cwd=Path(__file__).parent,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def bench_startup(rows: int):
+    """比較有無檢查點時，從啟動到取得最新讀數的時間"""
+    print(f"=== 啟動時間: 歷史 {rows // 100:,} / {rows // 10:,} / {rows:,} 筆 ===")
+    for size in (rows // 100, rows // 10, rows):
+        with tempfile.TemporaryDirectory() as tmp:
+            data_root = Path(tmp)
+            _run(SETUP_SCRIPT, data_root, str(size))
+
+            with_checkpoint = float(_run(STARTUP_SCRIPT, data_root))
+            (data_root / 'data' / 'checkpoint.bin').unlink()
+            full_scan = float(_run(STARTUP_SCRIPT, data_root))
+
+            print(f"{size:>10,} rows   checkpoint {with_checkpoint * 1000:>8.1f} ms   "
+                  f"full scan {full_scan * 1000:>9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='儲存效能測試')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='讀數筆數（預設 1,000,000）')
+    parser.add_argument('--scan', action='store_true', help='只執行範圍掃描測試')
+    parser.add_argument('--codec', action='store_true', help='只執行壓縮區塊測試')
+    parser.add_argument('--startup', action='store_true', help='只執行啟動時間測試')
+    args = parser.parse_args()
+
+    if args.scan:
+        bench_scan(args.rows)
+        return
+    if args.codec:
+        bench_codec(args.rows)
+        return
+    if args.startup:
+        bench_startup(args.rows)
+        return
+
+    print(f"=== 記憶體用量: {args.rows:,} 筆讀數 ===")
+    dicts = measure('list-of-dicts', list, args.rows)
+
+    def build_columns(readings):
+        columns = ReadingColumns()
+        columns.extend(readings)
+        return columns
+
+    arrays = measure('ReadingColumns', build_columns, args.rows)
+    print(f"\n欄位式儲存為 list-of-dicts 的 {arrays / dicts:.1%}（{dicts / arrays:.1f} 倍差距）\n")
+
+    bench_scan(args.rows)
+    print()
+    bench_codec(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,748 @@
+"""
+二進位定長紀錄儲存後端 - struct + mmap
+生物機電工程概論 期末專題
+
+在 config.py 設定 STORAGE_BACKEND = "binary" 後，database.py 會改用這個後端。
+- 每筆讀數固定 32 bytes（struct 打包），檔案開頭為 32 bytes 的檔頭
+- 透過 mmap 讀取，不需解析文字；第 i 筆位於 HEADER.size + i * RECORD.size
+- 時間欄位遞增，時間範圍查詢直接在檔案上二分搜尋
+- 安裝 NumPy 時，view_between() 以 numpy.frombuffer 回傳零複製的結構化陣列
+- 裝置：紀錄中存裝置代碼，名稱列表存於 <檔名>.devices.json（代碼 0 為預設裝置，
+  舊檔案的填充位元組為 0，因此不需轉換）；各裝置的紀錄位置在第一次依裝置查詢時建立，
+  單一裝置的查詢只讀取該裝置的紀錄
+
+檔頭格式（little-endian）：
+    magic "DHTB" | version u16 | record_size u16 | first_live u64 | next_id u64 | 保留 8 bytes
+
+紀錄格式：
+    id i64 | epoch f64 | temperature f32 | humidity f32 | heat_index f32 | air_quality i16 | device u16
+
+cleanup 與 clear 只更新檔頭的 first_live（之前的紀錄視為已刪除），累積過多時才重寫檔案。
+Windows 無法取代仍被映射的檔案：其他執行緒的 mmap 或 NumPy 視圖仍在使用時重寫會失敗，
+此時維持只更新檔頭的刪除，下次啟動載入時再重寫。
+
+一次性遷移既有 JSON/JSONL 數據：
+    python binary_store.py --migrate data/segments
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from devices import DEFAULT_DEVICE
+
+MAGIC = b'DHTB'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHQQ8x')
+RECORD = struct.Struct('<qdfffhH')
+
+# 紀錄中 epoch 欄位的位置
+EPOCH = struct.Struct('<d')
+EPOCH_OFFSET = 8
+
+# air_quality 沒有數值時的哨兵（heat_index 沒有數值時為 NaN）
+AQ_MISSING = -32768
+
+# 已刪除紀錄佔檔案比例超過此值時重寫檔案
+COMPACT_DEAD_RATIO = 0.5
+COMPACT_MIN_DEAD = 10000
+
+# 與 RECORD 相同配置的 NumPy dtype
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('epoch', '<f8'),
+    ('temperature', '<f4'),
+    ('humidity', '<f4'),
+    ('heat_index', '<f4'),
+    ('air_quality', '<i2'),
+    ('device', '<u2')
+]) if np is not None else None
+
+STAT_METRICS = ('temperature', 'humidity', 'heat_index', 'air_quality')
+
+# query() 支援的聚合函數
+AGGREGATES = ('avg', 'min', 'max', 'sum', 'count')
+
+
+def _to_epoch(value: str) -> float:
+    """ISO 格式字串轉為 epoch 秒數"""
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _pack(record_id: int, epoch: float, reading: Dict[str, Any], device: int = 0) -> bytes:
+    """將一筆讀數打包為定長紀錄（device 為裝置代碼）"""
+    heat_index = reading.get('heat_index')
+    air_quality = reading.get('air_quality')
+    return RECORD.pack(
+        record_id,
+        epoch,
+        reading['temperature'],
+        reading['humidity'],
+        math.nan if heat_index is None else heat_index,
+        AQ_MISSING if air_quality is None else max(AQ_MISSING + 1, min(32767, air_quality)),
+        device
+    )
+
+
+def _unpack(fields: Tuple, names: List[str]) -> Dict[str, Any]:
+    """將定長紀錄欄位轉回讀數 dict（float32 四捨五入回一位小數，names 為裝置代碼對應的名稱）"""
+    record_id, epoch, temperature, humidity, heat_index, air_quality, device = fields
+    return {
+        'id': record_id,
+        'temperature': round(temperature, 1),
+        'humidity': round(humidity, 1),
+        'heat_index': None if math.isnan(heat_index) else round(heat_index, 1),
+        'air_quality': None if air_quality == AQ_MISSING else air_quality,
+        'recorded_at': datetime.fromtimestamp(epoch).isoformat(),
+        'device_id': names[device]
+    }
+
+
+def _bucket_value(field: str, agg: str, value: float, present: int):
+    """分組聚合值的回傳格式（沒有數值時為 None，count 為整數，其餘四捨五入到一位小數）"""
+    if agg == 'count':
+        return int(present)
+    if not present:
+        return None
+    if field == 'air_quality' and agg in ('min', 'max'):
+        return int(value)
+    return round(value, 1)
+
+
+def _python_buckets(rows: Iterable[Tuple[float, Dict[str, Any]]], origin: float, step: float,
+                    fields: List[str], agg: str) -> List[Dict[str, Any]]:
+    """未安裝 NumPy 時逐筆分組聚合（rows 為 (epoch, 讀數) ）"""
+    points = []
+    bucket, totals = None, None
+    for epoch, row in rows:
+        current = math.floor((epoch - origin) / step)
+        if current != bucket:
+            if totals is not None:
+                points.append(_python_point(origin, step, bucket, totals, fields, agg))
+            bucket, totals = current, {'count': 0, **{field: [] for field in fields}}
+        totals['count'] += 1
+        for field in fields:
+            if row[field] is not None:
+                totals[field].append(row[field])
+    if totals is not None:
+        points.append(_python_point(origin, step, bucket, totals, fields, agg))
+    return points
+
+
+def _python_point(origin: float, step: float, bucket: int, totals: Dict[str, Any],
+                  fields: List[str], agg: str) -> Dict[str, Any]:
+    """將一組的數值轉為資料點"""
+    point = {'recorded_at': datetime.fromtimestamp(origin + bucket * step).isoformat(), 'count': totals['count']}
+    for field in fields:
+        values = totals[field]
+        if agg == 'count' or not values:
+            value = 0
+        elif agg == 'min':
+            value = min(values)
+        elif agg == 'max':
+            value = max(values)
+        else:
+            value = sum(values) / (len(values) if agg == 'avg' else 1)
+        point[field] = _bucket_value(field, agg, value, len(values))
+    return point
+
+
+class BinaryStore:
+    """定長二進位紀錄檔案儲存"""
+
+    def __init__(self, path: Path):
+        """
+        初始化儲存
+
+        Args:
+            path: 紀錄檔案路徑
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._first_live = 0
+        self._next_id = 1
+        self._count = 0         # 檔案中的紀錄數（含已刪除）
+        self._last_epoch = float('-inf')
+        self._mm: Optional[mmap.mmap] = None
+        self._mapped = 0        # 目前 mmap 涵蓋的紀錄數
+        self.devices_path = self.path.with_suffix('.devices.json')
+        self._names: List[str] = [DEFAULT_DEVICE]   # 裝置代碼對應的名稱（只會附加）
+        self._codes: Dict[str, int] = {DEFAULT_DEVICE: 0}
+        # 各裝置代碼的紀錄位置（遞增；第一次依裝置查詢時建立，之後新增時維護）
+        self._device_rows: Optional[Dict[int, array]] = None
+
+    # ========== 檔案底層操作 ==========
+
+    def _write_header(self, f):
+        """寫入檔頭"""
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self._first_live, self._next_id))
+
+    def init(self):
+        """建立檔案（若不存在）並載入檔頭"""
+        with self._lock:
+            self._load(force=True)
+
+    def _load(self, force: bool = False):
+        """讀取檔頭與紀錄數，截斷當機時寫到一半的最後一筆"""
+        if self._loaded and not force:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+            self._first_live, self._next_id = 0, 1
+            with open(self.path, 'wb') as f:
+                self._write_header(f)
+
+        with open(self.path, 'rb+') as f:
+            magic, version, record_size, first_live, next_id = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{self.path} is not a DHT binary record file")
+
+            size = f.seek(0, os.SEEK_END)
+            extra = (size - HEADER.size) % RECORD.size
+            if extra:
+                f.truncate(size - extra)
+                print(f"[WARN] Truncated incomplete last record in {self.path.name}")
+
+            self._count = (size - extra - HEADER.size) // RECORD.size
+            self._first_live = min(first_live, self._count)
+            self._next_id = next_id
+            self._last_epoch = float('-inf')
+            if self._count:
+                f.seek(HEADER.size + (self._count - 1) * RECORD.size + EPOCH_OFFSET)
+                self._last_epoch = EPOCH.unpack(f.read(EPOCH.size))[0]
+
+        if self.devices_path.exists():
+            with open(self.devices_path, 'r', encoding='utf-8') as f:
+                self._names = json.load(f)
+            self._codes = {name: code for code, name in enumerate(self._names)}
+
+        self._mm = None
+        self._mapped = 0
+        self._device_rows = None
+        self._loaded = True
+
+        # 執行期間無法重寫時（Windows 上檔案仍被映射）留下的已刪除紀錄，在沒有映射的載入時重寫
+        if self._should_compact():
+            self._compact()
+
+    def _device_code(self, device_id: Optional[str]) -> int:
+        """取得裝置代碼，新裝置先寫入名稱檔（先寫暫存檔再取代）再分配代碼"""
+        device_id = device_id or DEFAULT_DEVICE
+        code = self._codes.get(device_id)
+        if code is None:
+            code = len(self._names)
+            names = self._names + [device_id]
+            tmp_file = self.devices_path.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(names, f, ensure_ascii=False)
+            os.replace(tmp_file, self.devices_path)
+            self._names = names
+            self._codes[device_id] = code
+        return code
+
+    def _index_devices(self) -> Dict[int, array]:
+        """取得各裝置的紀錄位置（第一次使用時掃描檔案中的裝置欄位）"""
+        if self._device_rows is None:
+            rows: Dict[int, array] = {}
+            mm = self._map()
+            if mm is not None:
+                if np is not None:
+                    codes = np.frombuffer(mm, dtype=RECORD_DTYPE, count=self._count, offset=HEADER.size)['device']
+                    order = np.argsort(codes, kind='stable')
+                    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+                    for group in np.split(order, bounds):
+                        if len(group):
+                            rows[int(codes[group[0]])] = array('q', group.tolist())
+                else:
+                    for position, record in enumerate(self._iter_records(mm, 0, self._count)):
+                        rows.setdefault(record[6], array('q')).append(position)
+            self._device_rows = rows
+        return self._device_rows
+
+    def _device_positions(self, device_id: str, first: int, last: int) -> array:
+        """裝置在位置 [first, last) 中的紀錄位置（沒有此裝置時為空）"""
+        code = self._codes.get(device_id)
+        rows = self._index_devices().get(code) if code is not None else None
+        if rows is None:
+            return array('q')
+        return rows[bisect_left(rows, first):bisect_left(rows, last)]
+
+    def _read_at(self, mm: mmap.mmap, positions: Iterable[int]) -> Iterator[Tuple]:
+        """逐筆解開指定位置的紀錄"""
+        for position in positions:
+            yield RECORD.unpack_from(mm, HEADER.size + position * RECORD.size)
+
+    def _map(self) -> Optional[mmap.mmap]:
+        """取得涵蓋所有紀錄的唯讀 mmap（檔案變長後重新映射）"""
+        if self._mapped < self._count or self._mm is None:
+            if self._count == 0:
+                return None
+            with open(self.path, 'rb') as f:
+                # 舊的 mmap 可能仍被 NumPy 視圖引用，不主動關閉，交由垃圾回收
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = self._count
+        return self._mm
+
+    def _epoch_at(self, mm: mmap.mmap, index: int) -> float:
+        """讀取第 index 筆紀錄的 epoch"""
+        return EPOCH.unpack_from(mm, HEADER.size + index * RECORD.size + EPOCH_OFFSET)[0]
+
+    def _bisect(self, mm: mmap.mmap, epoch: float, right: bool = False) -> int:
+        """在有效紀錄中二分搜尋 epoch 的位置（right=True 時等同 bisect_right）"""
+        low, high = self._first_live, self._count
+        while low < high:
+            middle = (low + high) // 2
+            value = self._epoch_at(mm, middle)
+            if value < epoch or (right and value == epoch):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, start: Optional[str], end: Optional[str]) -> Tuple[Optional[mmap.mmap], int, int]:
+        """取得時間範圍對應的 (mmap, 起始位置, 結束位置)"""
+        self._load()
+        mm = self._map()
+        if mm is None:
+            return None, 0, 0
+        first = self._bisect(mm, _to_epoch(start)) if start is not None else self._first_live
+        last = self._bisect(mm, _to_epoch(end), right=True) if end is not None else self._mapped
+        return mm, first, max(first, last)
+
+    def _iter_records(self, mm: mmap.mmap, first: int, last: int) -> Iterator[Tuple]:
+        """逐筆解開位置 [first, last) 的紀錄"""
+        if first >= last:
+            return
+        view = memoryview(mm)[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+        try:
+            yield from RECORD.iter_unpack(view)
+        finally:
+            view.release()
+
+    # ========== 與 SQLiteStore 相同的介面 ==========
+
+    def close(self):
+        """釋放 mmap"""
+        with self._lock:
+            self._mm = None
+            self._mapped = 0
+
+    def insert(self, reading: Dict[str, Any]) -> int:
+        """
+        新增一筆讀數
+
+        Args:
+            reading: 讀數字典（不含 id）
+
+        Returns:
+            新增的記錄 ID
+        """
+        return self._append([reading])[0]
+
+    def insert_many(self, readings: Iterable[Dict[str, Any]], keep_ids: bool = False) -> int:
+        """
+        一次附加多筆讀數並只更新一次檔頭
+
+        Args:
+            readings: 讀數字典
+            keep_ids: 是否保留原本的 id（遷移用）
+
+        Returns:
+            新增的記錄數
+        """
+        return len(self._append(readings, keep_ids))
+
+    def _append(self, readings: Iterable[Dict[str, Any]], keep_ids: bool = False) -> List[int]:
+        """附加讀數到檔尾，最後才更新檔頭；回傳新增的 ID"""
+        with self._lock:
+            self._load()
+            ids = []
+            with open(self.path, 'rb+') as f:
+                f.seek(HEADER.size + self._count * RECORD.size)
+                for reading in readings:
+                    record_id = reading['id'] if keep_ids else self._next_id
+                    epoch = _to_epoch(reading['recorded_at'])
+                    # 系統時間被往回調整時記錄為前一筆的時間，維持檔案遞增才能二分搜尋
+                    epoch = max(epoch, self._last_epoch)
+                    code = self._device_code(reading.get('device_id'))
+                    f.write(_pack(record_id, epoch, reading, code))
+                    if self._device_rows is not None:
+                        self._device_rows.setdefault(code, array('q')).append(self._count)
+                    ids.append(record_id)
+                    self._next_id = max(self._next_id, record_id + 1)
+                    self._count += 1
+                    self._last_epoch = epoch
+                self._write_header(f)
+        return ids
+
+    def latest(self, device_id: str = None) -> Optional[Dict[str, Any]]:
+        """取得最新一筆讀數（指定 device_id 時為該裝置的最新讀數）"""
+        with self._lock:
+            mm, first, last = self._range(None, None)
+            if device_id is not None:
+                positions = self._device_positions(device_id, first, last)
+                first, last = (positions[-1], positions[-1] + 1) if positions else (0, 0)
+            if first >= last:
+                return None
+            return _unpack(RECORD.unpack_from(mm, HEADER.size + (last - 1) * RECORD.size), self._names)
+
+    def recent(self, n: int, device_id: str = None) -> List[Dict[str, Any]]:
+        """取得最近 n 筆讀數（依時間排序；直接以位置讀取檔尾的 n 筆紀錄）"""
+        with self._lock:
+            mm, first, last = self._range(None, None)
+            if mm is None:
+                return []
+            if device_id is not None:
+                positions = self._device_positions(device_id, first, last)[-n:]
+            else:
+                positions = range(max(first, last - n), last)
+            names = self._names
+        return [_unpack(fields, names) for fields in self._read_at(mm, positions)]
+
+    def between(self, start: str, end: str = None, device_id: str = None) -> List[Dict[str, Any]]:
+        """取得指定時間範圍內的讀數（二分搜尋定位）"""
+        return list(self.iter_between(start, end, device_id))
+
+    def _records(self, start: Optional[str], end: Optional[str],
+                 device_id: Optional[str]) -> Tuple[Optional[mmap.mmap], Any, List[str]]:
+        """
+        時間範圍（與裝置）內的紀錄
+
+        Returns:
+            (mmap, 紀錄位置, 裝置名稱)；紀錄位置為 range 或該裝置的位置 array
+        """
+        with self._lock:
+            mm, first, last = self._range(start, end)
+            if mm is not None and device_id is not None:
+                return mm, self._device_positions(device_id, first, last), self._names
+            return mm, range(first, last), self._names
+
+    def iter_between(self, start: str = None, end: str = None, device_id: str = None) -> Iterator[Dict[str, Any]]:
+        """依時間順序逐筆讀取指定範圍內的讀數（指定 device_id 時只讀取該裝置的紀錄）"""
+        mm, positions, names = self._records(start, end, device_id)
+        if mm is None:
+            return
+        if isinstance(positions, range):
+            records = self._iter_records(mm, positions.start, positions.stop)
+        else:
+            records = self._read_at(mm, positions)
+        for fields in records:
+            yield _unpack(fields, names)
+
+    def view_between(self, start: str = None, end: str = None, device_id: str = None):
+        """
+        取得指定時間範圍的零複製 NumPy 結構化陣列（欄位見 RECORD_DTYPE）
+
+        陣列直接引用 mmap，不會複製或解析資料；指定 device_id 時為只含該裝置紀錄的複本。
+        未安裝 NumPy 時回傳 None。
+        """
+        if np is None:
+            return None
+        mm, positions, _ = self._records(start, end, device_id)
+        if mm is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return self._view(mm, positions)
+
+    @staticmethod
+    def _view(mm: mmap.mmap, positions):
+        """位置（range 或 array）對應的 NumPy 結構化陣列（range 為零複製）"""
+        if isinstance(positions, range):
+            return np.frombuffer(mm, dtype=RECORD_DTYPE, count=len(positions),
+                                 offset=HEADER.size + positions.start * RECORD.size)
+        view = np.frombuffer(mm, dtype=RECORD_DTYPE, count=(len(mm) - HEADER.size) // RECORD.size,
+                             offset=HEADER.size)
+        return view[np.frombuffer(positions, dtype=np.int64)] if positions else view[:0]
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """依時間順序逐筆讀取所有讀數"""
+        return self.iter_between()
+
+    def statistics(self, since: str, device_id: str = None) -> Dict[str, Any]:
+        """計算指定時間之後的統計（有 NumPy 時以向量運算完成；可只統計單一裝置）"""
+        view = self.view_between(since, device_id=device_id)
+        if view is not None:
+            return self._numpy_statistics(view)
+
+        count = 0
+        values = {metric: [] for metric in STAT_METRICS}
+        for reading in self.iter_between(since, device_id=device_id):
+            count += 1
+            for metric in STAT_METRICS:
+                if reading[metric] is not None:
+                    values[metric].append(reading[metric])
+
+        result: Dict[str, Any] = {'count': count}
+        for metric in STAT_METRICS:
+            data = values[metric]
+            if not data:
+                result[metric] = {'avg': None, 'min': None, 'max': None, 'stddev': None}
+                continue
+            mean = sum(data) / len(data)
+            variance = max(0.0, sum(x * x for x in data) / len(data) - mean * mean)
+            result[metric] = {
+                'avg': round(mean, 1),
+                'min': min(data),
+                'max': max(data),
+                'stddev': round(math.sqrt(variance), 2)
+            }
+        return result
+
+    @staticmethod
+    def _numpy_statistics(view) -> Dict[str, Any]:
+        """以 NumPy 欄位計算統計（略過 NaN 與空氣品質哨兵值）"""
+        result: Dict[str, Any] = {'count': len(view)}
+        for metric in STAT_METRICS:
+            column = view[metric].astype(np.float64)
+            if metric == 'air_quality':
+                column = column[view[metric] != AQ_MISSING]
+            else:
+                column = column[~np.isnan(column)]
+
+            if len(column) == 0:
+                result[metric] = {'avg': None, 'min': None, 'max': None, 'stddev': None}
+                continue
+            low, high = column.min(), column.max()
+            result[metric] = {
+                'avg': round(float(column.mean()), 1),
+                'min': int(low) if metric == 'air_quality' else round(float(low), 1),
+                'max': int(high) if metric == 'air_quality' else round(float(high), 1),
+                'stddev': round(float(column.std()), 2)
+            }
+        return result
+
+    def query(self, start: Optional[str], end: Optional[str], fields: List[str], step: Optional[float] = None,
+              agg: str = 'avg', limit: Optional[int] = None, descending: bool = False,
+              device_id: str = None) -> List[Dict[str, Any]]:
+        """
+        時間範圍、欄位選擇、分組與筆數限制（參數與回傳格式同 SQLiteStore.query）
+
+        原始讀數只解開 limit 範圍內的紀錄；分組在有 NumPy 時直接以 mmap 上的欄位向量運算。
+        """
+        mm, positions, names = self._records(start, end, device_id)
+        if mm is None or not positions:
+            return []
+
+        if step is None:
+            if limit is not None:
+                positions = positions[-limit:] if descending else positions[:limit]
+            if isinstance(positions, range):
+                records = self._iter_records(mm, positions.start, positions.stop)
+            else:
+                records = self._read_at(mm, positions)
+            rows = [_unpack(record, names) for record in records]
+            if descending:
+                rows.reverse()
+            return [{'id': row['id'], 'recorded_at': row['recorded_at'], **{field: row[field] for field in fields}}
+                    for row in rows]
+
+        origin = _to_epoch(start) if start is not None else self._epoch_at(mm, positions[0])
+        if np is not None:
+            points = self._numpy_buckets(self._view(mm, positions), origin, step, fields, agg)
+        else:
+            records = self._read_at(mm, positions)
+            points = _python_buckets(((record[1], _unpack(record, names)) for record in records),
+                                     origin, step, fields, agg)
+
+        if descending:
+            points.reverse()
+        return points[:limit] if limit is not None else points
+
+    @staticmethod
+    def _numpy_buckets(view, origin: float, step: float, fields: List[str], agg: str) -> List[Dict[str, Any]]:
+        """以 NumPy 分組聚合（每組為連續的紀錄，以 reduceat 一次計算所有組）"""
+        buckets = np.floor((view['epoch'] - origin) / step).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(starts, len(view)))
+
+        columns = {}
+        for field in fields:
+            column = view[field].astype(np.float64)
+            if field == 'air_quality':
+                column[view[field] == AQ_MISSING] = np.nan
+            else:
+                # float32 四捨五入回原本的一位小數，聚合結果與其他後端一致
+                column = np.round(column, 1)
+            valid = ~np.isnan(column)
+            present = np.add.reduceat(valid, starts)
+            if agg == 'count':
+                values = present
+            elif agg == 'min':
+                values = np.fmin.reduceat(column, starts)
+            elif agg == 'max':
+                values = np.fmax.reduceat(column, starts)
+            else:
+                values = np.add.reduceat(np.where(valid, column, 0.0), starts)
+                if agg == 'avg':
+                    values = values / np.maximum(present, 1)
+            columns[field] = (values.tolist(), present.tolist())
+
+        points = []
+        for i, bucket in enumerate(buckets[starts].tolist()):
+            point = {'recorded_at': datetime.fromtimestamp(origin + bucket * step).isoformat(),
+                     'count': int(counts[i])}
+            for field in fields:
+                values, present = columns[field]
+                point[field] = _bucket_value(field, agg, values[i], present[i])
+            points.append(point)
+        return points
+
+    def count(self, device_id: str = None) -> int:
+        """取得總讀數數量（指定 device_id 時為該裝置的筆數）"""
+        with self._lock:
+            self._load()
+            if device_id is None:
+                return self._count - self._first_live
+            return len(self._device_positions(device_id, self._first_live, self._count))
+
+    def devices(self) -> List[Dict[str, Any]]:
+        """
+        各裝置的筆數與最新讀數
+
+        Returns:
+            [{'device_id', 'count', 'latest'}]，依 device_id 排序
+        """
+        result = []
+        with self._lock:
+            mm, first, last = self._range(None, None)
+            if mm is None:
+                return result
+            for code, rows in self._index_devices().items():
+                count = len(rows) - bisect_left(rows, first)
+                if count:
+                    latest = _unpack(RECORD.unpack_from(mm, HEADER.size + rows[-1] * RECORD.size), self._names)
+                    result.append({'device_id': self._names[code], 'count': count, 'latest': latest})
+        result.sort(key=lambda device: device['device_id'])
+        return result
+
+    def delete_before(self, cutoff: str) -> int:
+        """刪除早於指定時間的讀數（只移動檔頭的 first_live，過多時重寫檔案）"""
+        with self._lock:
+            mm, first, _ = self._range(cutoff, None)
+            deleted = first - self._first_live
+            if deleted <= 0:
+                return 0
+
+            self._first_live = first
+            with open(self.path, 'rb+') as f:
+                self._write_header(f)
+
+            del mm
+            if self._should_compact():
+                self._compact()
+            return deleted
+
+    def _should_compact(self) -> bool:
+        """已刪除的紀錄是否多到需要重寫檔案"""
+        return self._first_live >= COMPACT_MIN_DEAD and self._first_live >= self._count * COMPACT_DEAD_RATIO
+
+    def _compact(self) -> bool:
+        """
+        重寫檔案，移除 first_live 之前的紀錄（先寫暫存檔再取代）
+
+        Windows 上其他執行緒仍持有 mmap 或 NumPy 視圖時無法取代檔案，此時保留原檔與
+        只更新檔頭的刪除（讀取結果不變），下次載入時再重寫。
+
+        Returns:
+            是否已重寫
+        """
+        tmp_file = self.path.with_suffix('.tmp')
+        live = self._count - self._first_live
+        with open(self.path, 'rb') as src, open(tmp_file, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, self._next_id))
+            src.seek(HEADER.size + self._first_live * RECORD.size)
+            remaining = live * RECORD.size
+            while remaining > 0:
+                chunk = src.read(min(remaining, 1 << 20))
+                f.write(chunk)
+                remaining -= len(chunk)
+
+        self._mm = None
+        self._mapped = 0
+        try:
+            os.replace(tmp_file, self.path)
+        except PermissionError:
+            tmp_file.unlink()
+            print(f"[WARN] {self.path.name} is still mapped by a reader, compaction deferred")
+            return False
+        self._first_live = 0
+        self._count = live
+        self._device_rows = None
+        print(f"[COMPACT] {self.path.name} compacted, {live} records kept")
+        return True
+
+    def clear(self) -> int:
+        """
+        刪除所有讀數（保留 ID 計數器）
+
+        先把 first_live 移到檔尾（不截斷檔案，其他執行緒仍在讀取的 mmap 維持有效），
+        再嘗試重寫為只有檔頭的檔案；Windows 上檔案仍被映射時維持只更新檔頭的刪除。
+        """
+        with self._lock:
+            self._load()
+            deleted = self._count - self._first_live
+            self._first_live = self._count
+            self._last_epoch = float('-inf')
+            with open(self.path, 'rb+') as f:
+                self._write_header(f)
+            if self._count:
+                self._compact()
+            return deleted
+
+
+def migrate_from_json(source: Path, store: BinaryStore) -> int:
+    """
+    將既有的 JSON/JSONL 數據依時間順序匯入二進位紀錄檔
+
+    Args:
+        source: sensor_data.json、sensor_data.jsonl 或分段目錄路徑
+        store: 目標二進位儲存（應為空）
+
+    Returns:
+        匯入的記錄數
+    """
+    from sqlite_store import _iter_json_readings
+
+    source = Path(source)
+    store.init()
+    if store.count():
+        print(f"[MIGRATE] {store.path} already has data, skipping")
+        return 0
+
+    imported = store.insert_many(_iter_json_readings(source), keep_ids=True)
+    print(f"[MIGRATE] Imported {imported} records from {source} into {store.path}")
+    return imported
+
+
+if __name__ == "__main__":
+    import argparse
+    import database as db
+
+    parser = argparse.ArgumentParser(description='二進位紀錄儲存工具')
+    parser.add_argument('--migrate', metavar='JSON_FILE', nargs='?', const=str(db.SEGMENT_DIR),
+                        help='從 JSON/JSONL 檔案或分段目錄匯入數據（預設 data/segments/）')
+    args = parser.parse_args()
+
+    store = BinaryStore(db.BINARY_FILE)
+
+    if args.migrate:
+        migrate_from_json(Path(args.migrate), store)
+    else:
+        store.init()
+        print(f"[OK] {store.path}: {store.count()} records")
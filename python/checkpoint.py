@@ -0,0 +1,117 @@
+"""
+檢查點模組 - 快速啟動
+生物機電工程概論 期末專題
+
+database.py 的 JSONL 後端定期把記憶體中的狀態（時間索引、分段位置、聚合索引、
+最近讀數快取與計數器）寫入 data/checkpoint.bin。啟動時只需讀回這些陣列，
+再重新讀取檢查點之後附加到日誌的少量紀錄，不必解析全部歷史。
+
+檔案格式：
+    檔頭 '<4sHxxI'：magic "DHTC"、版本、JSON 標頭長度
+    JSON 標頭：計數器、最新讀數、分段清單與各陣列的型別/長度
+    各陣列的原始位元組（依標頭順序）
+    CRC32 '<I'：以上所有內容的檢查碼
+
+寫入時先寫暫存檔再取代，中途當機不會留下不完整的檢查點；
+檔案損毀或與目前平台不相容時 load() 回傳 None，呼叫端改為完整掃描日誌。
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+
+MAGIC = b'DHTC'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHxxI')
+CHECKSUM = struct.Struct('<I')
+
+
+def save(path: Path, header: Dict[str, Any], arrays: Dict[str, array]):
+    """
+    寫入檢查點
+
+    Args:
+        path: 檢查點檔案路徑
+        header: 可轉為 JSON 的標頭資料
+        arrays: 名稱對應 array 的字典
+    """
+    header = dict(header)
+    header['byteorder'] = sys.byteorder
+    header['arrays'] = [[name, data.typecode, data.itemsize, len(data)] for name, data in arrays.items()]
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    path = Path(path)
+    tmp_file = path.with_suffix('.tmp')
+    with open(tmp_file, 'wb') as f:
+        prefix = HEADER.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes
+        f.write(prefix)
+        crc = zlib.crc32(prefix)
+        for data in arrays.values():
+            raw = memoryview(data).cast('B')
+            f.write(raw)
+            crc = zlib.crc32(raw, crc)
+        f.write(CHECKSUM.pack(crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def load_header(path: Path) -> Optional[Dict[str, Any]]:
+    """只讀取標頭（不讀取陣列、不驗證檢查碼），檔案不存在或格式不符時回傳 None"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            return json.loads(f.read(length).decode('utf-8'))
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def load(path: Path) -> Optional[Tuple[Dict[str, Any], Dict[str, array]]]:
+    """
+    讀取整個檢查點並驗證檢查碼
+
+    Returns:
+        (標頭, 陣列字典)；檔案不存在、損毀或由不同位元組順序的平台寫入時為 None
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < HEADER.size + CHECKSUM.size:
+        return None
+    (crc,) = CHECKSUM.unpack_from(data, len(data) - CHECKSUM.size)
+    if zlib.crc32(memoryview(data)[:-CHECKSUM.size]) != crc:
+        print(f"[WARN] Checkpoint {Path(path).name} is corrupted, ignoring")
+        return None
+
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    pos = HEADER.size
+    header = json.loads(data[pos:pos + length].decode('utf-8'))
+    pos += length
+
+    if header.get('byteorder') != sys.byteorder:
+        return None
+
+    arrays = {}
+    for name, typecode, itemsize, count in header['arrays']:
+        values = array(typecode)
+        if values.itemsize != itemsize:
+            return None
+        size = itemsize * count
+        values.frombytes(data[pos:pos + size])
+        arrays[name] = values
+        pos += size
+    return header, arrays
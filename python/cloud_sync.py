@@ -12,7 +12,8 @@ from datetime import datetime
 from config import (
     CLOUD_API_URL,
     CLOUD_API_KEY,
-    CLOUD_SYNC_ENABLED
+    CLOUD_SYNC_ENABLED,
+    DEVICE_ID
 )
 
 
@@ -44,7 +45,8 @@ class CloudSync:
         heat_index: float = None,
         air_quality: float = None,
         send_discord: bool = True,
-        async_mode: bool = True
+        async_mode: bool = True,
+        device_id: str = None
     ) -> bool:
         """
         推送讀數到雲端
@@ -56,6 +58,7 @@ class CloudSync:
             air_quality: 空氣品質
             send_discord: 是否讓雲端發送 Discord 通知
             async_mode: 是否非同步執行（不阻塞主程式）
+            device_id: 裝置名稱（預設使用 config.py 的 DEVICE_ID）
         
         Returns:
             是否成功（async_mode 時總是返回 True）
@@ -66,13 +69,13 @@ class CloudSync:
         if async_mode:
             thread = threading.Thread(
                 target=self._push_reading_sync,
-                args=(temperature, humidity, heat_index, air_quality, send_discord),
+                args=(temperature, humidity, heat_index, air_quality, send_discord, device_id),
                 daemon=True
             )
             thread.start()
             return True
         else:
-            return self._push_reading_sync(temperature, humidity, heat_index, air_quality, send_discord)
+            return self._push_reading_sync(temperature, humidity, heat_index, air_quality, send_discord, device_id)
     
     def _push_reading_sync(
         self,
@@ -80,7 +83,8 @@ class CloudSync:
         humidity: float,
         heat_index: float = None,
         air_quality: float = None,
-        send_discord: bool = True
+        send_discord: bool = True,
+        device_id: str = None
     ) -> bool:
         """同步推送數據"""
         try:
@@ -91,6 +95,7 @@ class CloudSync:
                     'humidity': humidity,
                     'heat_index': heat_index,
                     'air_quality': air_quality,
+                    'device_id': device_id or DEVICE_ID,
                     'send_discord': send_discord
                 },
                 headers={
@@ -0,0 +1,221 @@
+"""
+欄位式讀數儲存 - 記憶體中的讀數表示法
+生物機電工程概論 期末專題
+
+每個欄位是一個型別固定的 array，每筆讀數只佔約 30 bytes
+（dict 加上 ISO 時間字串約 500 bytes 以上）：
+- id：int64
+- epoch：float64（recorded_at 的 epoch 秒數，可精確還原到微秒）
+- temperature / humidity / heat_index：float32（沒有數值時為 NaN）
+- air_quality：int16（沒有數值時為 -32768）
+- device：uint16 裝置代碼，對應 device_names 中的名稱（代碼 0 為 DEFAULT_DEVICE）
+
+讀取時回傳輕量的 Reading 列視圖（__slots__），只在公開 API 邊界轉成 dict。
+
+記憶體比較：
+    python bench_storage.py --rows 1000000
+"""
+
+import math
+from array import array
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterable
+
+from devices import DEFAULT_DEVICE
+
+# air_quality 沒有數值時的哨兵
+AQ_MISSING = -32768
+
+NAN = float('nan')
+
+
+class Reading:
+    """欄位式儲存中一筆讀數的列視圖"""
+
+    __slots__ = ('id', 'epoch', 'temperature', 'humidity', 'heat_index', 'air_quality', 'device_id')
+
+    def __init__(self, id: int, epoch: float, temperature: float, humidity: float,
+                 heat_index: Optional[float], air_quality: Optional[int], device_id: str = DEFAULT_DEVICE):
+        self.id = id
+        self.epoch = epoch
+        self.temperature = temperature
+        self.humidity = humidity
+        self.heat_index = heat_index
+        self.air_quality = air_quality
+        self.device_id = device_id
+
+    @property
+    def recorded_at(self) -> str:
+        """ISO 格式的記錄時間"""
+        return datetime.fromtimestamp(self.epoch).isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉為與日誌紀錄相同格式的 dict"""
+        return {
+            'id': self.id,
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'heat_index': self.heat_index,
+            'air_quality': self.air_quality,
+            'recorded_at': self.recorded_at,
+            'device_id': self.device_id
+        }
+
+
+def _float_or_nan(value) -> float:
+    """None 轉為 NaN"""
+    return NAN if value is None else value
+
+
+def _round_or_none(value: float) -> Optional[float]:
+    """NaN 轉為 None，其餘四捨五入回一位小數"""
+    return None if math.isnan(value) else round(value, 1)
+
+
+class ReadingColumns:
+    """以型別 array 儲存讀數的欄位式表格（只在尾端附加、從頭端刪除）"""
+
+    COLUMNS = ('ids', 'epochs', 'temperature', 'humidity', 'heat_index', 'air_quality', 'devices')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.epochs = array('d')
+        self.temperature = array('f')
+        self.humidity = array('f')
+        self.heat_index = array('f')
+        self.air_quality = array('h')
+        self.devices = array('H')
+        # 裝置代碼對應的名稱（只會附加；快照共用同一個列表）
+        self.device_names: List[str] = [DEFAULT_DEVICE]
+        self._device_codes: Dict[str, int] = {DEFAULT_DEVICE: 0}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, reading: Dict[str, Any], epoch: float = None):
+        """
+        附加一筆讀數
+
+        Args:
+            reading: 日誌格式的讀數 dict
+            epoch: recorded_at 的 epoch 秒數（已計算過時傳入以免重複解析）
+        """
+        if epoch is None:
+            epoch = datetime.fromisoformat(reading['recorded_at']).timestamp()
+        air_quality = reading.get('air_quality')
+        device_id = reading.get('device_id') or DEFAULT_DEVICE
+        code = self._device_codes.get(device_id)
+        if code is None:
+            code = len(self.device_names)
+            self.device_names.append(device_id)
+            self._device_codes[device_id] = code
+
+        self.ids.append(reading['id'])
+        self.epochs.append(epoch)
+        self.temperature.append(reading['temperature'])
+        self.humidity.append(reading['humidity'])
+        self.heat_index.append(_float_or_nan(reading.get('heat_index')))
+        self.air_quality.append(AQ_MISSING if air_quality is None else max(AQ_MISSING + 1, min(32767, air_quality)))
+        self.devices.append(code)
+
+    def extend(self, readings: Iterable[Dict[str, Any]]):
+        """附加多筆讀數"""
+        for reading in readings:
+            self.append(reading)
+
+    def __getitem__(self, index: int) -> Reading:
+        """取得第 index 筆的列視圖（支援負數索引）"""
+        # float32 無法精確表示 0.1 的倍數，讀出時四捨五入回原本的一位小數
+        air_quality = self.air_quality[index]
+        return Reading(
+            self.ids[index],
+            self.epochs[index],
+            round(self.temperature[index], 1),
+            round(self.humidity[index], 1),
+            _round_or_none(self.heat_index[index]),
+            None if air_quality == AQ_MISSING else air_quality,
+            self.device_names[self.devices[index]]
+        )
+
+    def views(self, start: int = 0, stop: int = None) -> List[Reading]:
+        """取得位置 [start, stop) 的列視圖"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [self[i] for i in range(max(0, start), stop)]
+
+    def to_dicts(self, start: int = 0, stop: int = None) -> List[Dict[str, Any]]:
+        """取得位置 [start, stop) 的讀數 dict（公開 API 回傳用）"""
+        return [reading.to_dict() for reading in self.views(start, stop)]
+
+    def to_dicts_at(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        """取得指定位置（可不連續，例如某個裝置的紀錄）的讀數 dict"""
+        return [self[i].to_dict() for i in positions]
+
+    def column(self, name: str, start: int = 0, stop: int = None) -> List[Any]:
+        """取得單一指標在位置 [start, stop) 的數值（與 to_dicts 相同的四捨五入與 None）"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        values = getattr(self, name)[max(0, start):stop]
+        if name == 'air_quality':
+            return [None if value == AQ_MISSING else value for value in values]
+        if name == 'heat_index':
+            return [_round_or_none(value) for value in values]
+        return [round(value, 1) for value in values]
+
+    def project(self, fields: List[str], start: int = 0, stop: int = None) -> List[Dict[str, Any]]:
+        """取得位置 [start, stop) 的讀數 dict，只包含 id、recorded_at 與 fields（只轉換需要的欄位）"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(0, start)
+        if start >= stop:
+            return []
+        columns = [(field, self.column(field, start, stop)) for field in fields]
+        rows = []
+        for i, (record_id, epoch) in enumerate(zip(self.ids[start:stop], self.epochs[start:stop])):
+            row = {'id': record_id, 'recorded_at': datetime.fromtimestamp(epoch).isoformat()}
+            for field, values in columns:
+                row[field] = values[i]
+            rows.append(row)
+        return rows
+
+    def arrays(self) -> Dict[str, array]:
+        """各欄位 array（寫入檢查點用）"""
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def restore(self, arrays: Dict[str, array], device_names: List[str] = None):
+        """
+        從 arrays() 的結果還原（讀取檢查點用）
+
+        Args:
+            arrays: 各欄位 array
+            device_names: 裝置代碼對應的名稱（檢查點標頭中的 device_names）
+        """
+        for name in self.COLUMNS:
+            setattr(self, name, arrays[name])
+        if device_names is not None:
+            self.device_names = list(device_names)
+            self._device_codes = {name: code for code, name in enumerate(self.device_names)}
+
+    def snapshot(self) -> 'ReadingColumns':
+        """
+        目前內容的唯讀快照（與原物件共用欄位 array）
+
+        之後的附加只會在快照範圍之後，drop_prefix() 則以新的 array 取代，
+        因此快照範圍內的讀數不會改變。
+        """
+        frozen = ReadingColumns.__new__(ReadingColumns)
+        frozen.restore(self.arrays())
+        frozen.device_names = self.device_names
+        return frozen
+
+    def drop_prefix(self, count: int):
+        """刪除最前面 count 筆（複製剩餘部分到新的 array，快照不受影響）"""
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(self, name)[count:])
+
+    def clear(self):
+        """清空"""
+        self.drop_prefix(len(self))
+
+    def nbytes(self) -> int:
+        """各欄位 array 佔用的位元組數"""
+        return sum(column.itemsize * len(column) for column in (
+            self.ids, self.epochs, self.temperature,
+            self.humidity, self.heat_index, self.air_quality, self.devices))
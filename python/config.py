@@ -43,11 +43,72 @@ SERIAL_BAUD_RATE = 9600
 # Serial 讀取逾時（秒）
 SERIAL_TIMEOUT = 2
 
+# 連續讀取模式
+# event：阻塞等待 Serial 資料，一有資料就整批讀取並重組成行（延遲低、閒置時幾乎不耗 CPU）
+# poll：每 0.1 秒檢查一次並讀取一行（舊版做法，每秒最多 10 行）
+SERIAL_READ_MODE = os.getenv("SERIAL_READ_MODE", "event").lower()
+
+# 傳輸格式
+# json：每行一個 JSON 物件（所有版本的 Arduino 程式都支援）
+# binary：連線後要求 Arduino 改送含 CRC16 的二進位框架（需 v0.4.0 以上的 sketch，舊版不回應時自動維持 JSON）
+SERIAL_PROTOCOL = os.getenv("SERIAL_PROTOCOL", "json").lower()
+
+# binary 協定時改用的通訊速率（例如 115200；0 為維持 SERIAL_BAUD_RATE）
+SERIAL_FAST_BAUD = int(os.getenv("SERIAL_FAST_BAUD", "0"))
+
+# 指令等待 Arduino 確認的秒數（Discord 的 !buzz、!setcolor 等指令）
+SERIAL_COMMAND_TIMEOUT = float(os.getenv("SERIAL_COMMAND_TIMEOUT", "2"))
+
+# 開啟埠後等待 Arduino 就緒訊息 {"status": "ready"} 的最長秒數（收到就立即開始，不再固定等待 2 秒）
+SERIAL_READY_TIMEOUT = float(os.getenv("SERIAL_READY_TIMEOUT", "5"))
+
+# Arduino 中斷（例如被拔除）後自動重新連接；重新插上時立即偵測，開啟失敗時間隔加倍，最長為下方秒數
+SERIAL_RECONNECT = os.getenv("SERIAL_RECONNECT", "true").lower() == "true"
+SERIAL_RECONNECT_MAX_DELAY = float(os.getenv("SERIAL_RECONNECT_MAX_DELAY", "5"))
+
+# 多個 Arduino 同時連接時的埠號（以逗號分隔，例如 "COM3,COM4"；可寫成 "COM3=greenhouse" 指定裝置名稱）
+# 設定為 auto 時自動偵測所有 Arduino；空白時只使用 SERIAL_PORT（單一 Arduino）
+# 未指定名稱的埠以 "<DEVICE_ID>-<埠名稱>" 作為裝置名稱（Arduino 送出的 device_id 優先）
+SERIAL_PORTS = os.getenv("SERIAL_PORTS", "")
+
+# 此感測節點的裝置名稱（多個節點寫入同一個資料庫或雲端時用來區分）
+# Arduino 送出的 JSON 已帶有 device_id 時以其為準
+DEVICE_ID = os.getenv("DEVICE_ID", "default")
+
 # ========== 資料庫設定 ==========
 
-# SQLite 資料庫檔案路徑
+# 儲存後端：jsonl（分段 JSON Lines 日誌 + CSV，預設）、sqlite（SQLite WAL 資料庫）或 binary（定長二進位紀錄檔 + mmap）
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "jsonl").lower()
+
+# SQLite 資料庫檔案路徑（檔案會放在其所在目錄下的 data/ 資料夾）
 DATABASE_PATH = os.getenv("DATABASE_PATH", "sensor_data.db")
 
+# 記憶體快取保留最近幾小時的讀數（此範圍內的查詢不需讀取磁碟）
+DB_CACHE_HOURS = int(os.getenv("DB_CACHE_HOURS", "24"))
+
+# JSONL 後端的分段單位：day（每天一個分段檔，預設）或 hour（每小時一個）
+DB_PARTITION = os.getenv("DB_PARTITION", "day").lower()
+
+# 開始新的分段時，將前一個分段轉為壓縮區塊（gorilla.py）以節省空間
+DB_COMPRESS_SEALED = os.getenv("DB_COMPRESS_SEALED", "true").lower() == "true"
+
+# 每新增這麼多筆寫入一次檢查點（啟動時只需重新讀取檢查點之後的紀錄）
+DB_CHECKPOINT_ROWS = int(os.getenv("DB_CHECKPOINT_ROWS", "10000"))
+
+# 延遲寫入：收到的讀數先放入緩衝，每 DB_FLUSH_MS 毫秒或累積 DB_FLUSH_ROWS 筆時批次提交
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "false").lower() == "true"
+DB_FLUSH_MS = int(os.getenv("DB_FLUSH_MS", "1000"))
+DB_FLUSH_ROWS = int(os.getenv("DB_FLUSH_ROWS", "100"))
+
+# 非同步 API（Discord bot 使用）執行查詢的背景執行緒數，同時最多這麼多個查詢佔用執行緒
+DB_ASYNC_WORKERS = int(os.getenv("DB_ASYNC_WORKERS", "2"))
+
+# 1 分鐘彙總保留的天數（只用於約 100 小時以內的圖表；1 小時與 1 天彙總永久保存）
+ROLLUP_1M_DAYS = int(os.getenv("ROLLUP_1M_DAYS", "7"))
+
+# Web 伺服器執行時在背景匯出 Parquet 封存的間隔（秒，另外在每天午夜後匯出前一天；0 = 不在背景匯出）
+PARQUET_EXPORT_INTERVAL = int(os.getenv("PARQUET_EXPORT_INTERVAL", "3600"))
+
 # ========== Web 伺服器設定 ==========
 
 # Web 伺服器主機（本地: 127.0.0.1 / 雲端: 0.0.0.0）
@@ -140,6 +201,6 @@ if __name__ == "__main__":
     
     print("\n=== 目前設定 ===")
     print(f"Serial Port: {SERIAL_PORT}")
-    print(f"Database: {DATABASE_PATH}")
+    print(f"Database: {DATABASE_PATH} ({STORAGE_BACKEND})")
     print(f"Web Server: http://{WEB_HOST}:{WEB_PORT}")
     print(f"Webhook Interval: {WEBHOOK_INTERVAL} 秒")
@@ -0,0 +1,99 @@
+"""
+CSV 串流匯入/匯出模組
+生物機電工程概論 期末專題
+
+以 generator 逐筆讀寫 CSV，記憶體用量與檔案大小無關：
+- 副檔名為 .gz 時自動以 gzip 壓縮/解壓縮
+- 匯入時每 IMPORT_CHUNK_ROWS 筆以 database.insert_readings 提交一次
+- 匯出時可指定時間範圍
+
+命令列使用（在現場電腦與分析電腦之間搬移數據）：
+    python csv_stream.py export archive.csv.gz --since 2025-01-01 --until 2025-06-30
+    python csv_stream.py import archive.csv.gz --keep-timestamps
+"""
+
+import csv
+import gzip
+import io
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, TextIO
+
+
+# 匯入時每批提交的筆數
+IMPORT_CHUNK_ROWS = 10000
+
+
+def open_text(filepath: str, mode: str = 'r') -> TextIO:
+    """
+    開啟 CSV 文字檔（.gz 結尾時使用 gzip）
+
+    Args:
+        filepath: 檔案路徑
+        mode: 'r' 讀取或 'w' 寫入
+
+    Returns:
+        文字檔物件（UTF-8 with BOM，方便 Excel 開啟）
+    """
+    if str(filepath).endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(filepath, mode + 'b', compresslevel=6), encoding='utf-8-sig', newline='')
+    return open(filepath, mode, encoding='utf-8-sig', newline='')
+
+
+def read_rows(filepath: str) -> Iterator[Dict[str, str]]:
+    """逐行讀取 CSV，產生以表頭為鍵的字典"""
+    with open_text(filepath, 'r') as f:
+        yield from csv.DictReader(f)
+
+
+def write_rows(filepath: str, readings: Iterable[Dict[str, Any]], header: List[str]) -> int:
+    """
+    逐筆寫入讀數到 CSV（None 寫成空字串）
+
+    Returns:
+        寫入的筆數
+    """
+    count = 0
+    with open_text(filepath, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for reading in readings:
+            writer.writerow(['' if reading.get(column) is None else reading[column] for column in header])
+            count += 1
+    return count
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """將 iterable 切成每份最多 size 個元素的列表"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+if __name__ == "__main__":
+    import argparse
+    import database as db
+
+    parser = argparse.ArgumentParser(description='CSV 串流匯入/匯出')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='匯出讀數（.gz 結尾時壓縮）')
+    export_parser.add_argument('file')
+    export_parser.add_argument('--since', help='起始時間（ISO 格式，含）')
+    export_parser.add_argument('--until', help='結束時間（ISO 格式，含）')
+
+    import_parser = subparsers.add_parser('import', help='匯入讀數（.gz 結尾時解壓縮）')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--keep-timestamps', action='store_true',
+                               help='保留檔案中的 recorded_at（早於現有最新讀數的紀錄會被略過）')
+    import_parser.add_argument('--chunk', type=int, default=IMPORT_CHUNK_ROWS, help='每批提交的筆數')
+
+    args = parser.parse_args()
+    db.init_database()
+
+    if args.command == 'export':
+        db.export_to_csv(args.file, start=args.since, end=args.until)
+    else:
+        db.import_from_csv(args.file, chunk_size=args.chunk, keep_timestamps=args.keep_timestamps)
@@ -1,20 +1,66 @@
 """
-資料儲存模組 - JSON/CSV 格式
+資料儲存模組 - JSON Lines/CSV 格式
 生物機電工程概論 期末專題
 
-這個模組使用 JSON 和 CSV 格式儲存數據，取代 SQLite。
-- JSON：完整數據，適合程式讀取
-- CSV：試算表格式，可用 Excel 開啟
+這個模組預設使用依時間分段的 JSON Lines 附加式日誌儲存數據（segments.py）。
+- JSONL：每天（或每小時，DB_PARTITION）一個分段檔，每筆讀數一行，新增時只附加到檔尾（O(1)）
+- CSV：每個分段同時寫入試算表格式，可用 Excel 開啟
+- 分段：範圍查詢只開啟重疊的分段，清理舊數據時直接刪除過期的分段檔
+- 封存：已結束的分段轉為壓縮區塊（gorilla.py），大小約為舊版 JSON 的 1/40
+- META：記錄 ID 計數器與已刪除範圍（只刪除部分內容的分段以標記略過）
+- 檢查點：定期保存記憶體中的索引與快取（checkpoint.py），啟動時只讀取之後附加的紀錄
+- 快取：在記憶體中保留最近 DB_CACHE_HOURS 小時的讀數，新增時同步寫入（write-through）；
+  以欄位式 array 儲存（columns.py），只在公開 API 回傳時轉為 dict
+- 索引：每筆有效紀錄的 epoch 時間與日誌位置，時間範圍查詢以二分搜尋定位（O(log n + k)）
+- 聚合索引：與時間索引平行的前綴和與線段樹（agg_index.py），任意範圍統計為 O(log n)
+- 裝置：每筆讀數帶有 device_id（DEVICE_ID 或 Arduino 送出的值），每個裝置另有自己的時間索引、
+  聚合索引與最新讀數（devices.py），依裝置查詢只處理該裝置的紀錄，與裝置數量無關
+- 彙總：1 分鐘 / 1 小時 / 1 天的最小值、最大值、平均與筆數（rollups.py）；cleanup_old_data 時
+  1 分鐘彙總只保留 ROLLUP_1M_DAYS 天，1 小時與 1 天彙總永久保存
+- 並行：單一寫入者、多個讀取者。新增、清理與載入持有 _write_lock；每次寫入完成後發布
+  不可變的快照（_Snapshot），讀取端（Flask、Discord bot、Gemini）只使用快照、不需要鎖。
+  寫入只附加在快照範圍之後，刪除與封存以新的陣列取代（copy-on-write），
+  被取代的分段檔等到沒有快照使用時才刪除，因此寫入者不必等待讀取端
+- 非同步 API：aget_* 函數供 Discord bot 的事件迴圈使用，最新讀數與筆數直接取自快照，
+  其餘查詢在 DB_ASYNC_WORKERS 個背景執行緒中執行，並記錄每次呼叫的延遲（get_async_stats）
+
+舊版的 sensor_data.json 與單一日誌 sensor_data.jsonl 會在 init_database() 時自動轉換為分段檔。
+
+在 config.py 設定 STORAGE_BACKEND = "sqlite" 時，所有公開函數改由 sqlite_store.py
+的 SQLite 資料庫處理，範圍查詢與統計直接以索引 SQL 執行。
+設定為 "binary" 時改由 binary_store.py 的定長二進位紀錄檔處理，以 mmap 讀取並二分搜尋時間。
 """
 
 import os
 import json
-import csv
+import math
+import asyncio
+import functools
+import threading
+import time
+import weakref
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Union
 from pathlib import Path
 
-from config import DATABASE_PATH
+from config import (DATABASE_PATH, DB_ASYNC_WORKERS, DB_CACHE_HOURS, DB_CHECKPOINT_ROWS,
+                    DB_COMPRESS_SEALED, DB_PARTITION, DEVICE_ID, ROLLUP_1M_DAYS, STORAGE_BACKEND)
+import analytics
+import checkpoint
+import logfile
+import csv_stream
+from agg_index import AggregateIndex
+from columns import ReadingColumns
+from devices import DeviceIndexes, DEFAULT_DEVICE
+from rollups import Rollups, METRICS
+from sketches import TDigest
+from segments import SegmentLog, CSV_HEADER
+from sqlite_store import SQLiteStore
+from binary_store import BinaryStore
 
 
 # 取得資料目錄
@@ -22,336 +68,1590 @@ DATA_DIR = Path(os.path.dirname(DATABASE_PATH)) if DATABASE_PATH != "sensor_data
 DATA_DIR = DATA_DIR / "data"
 
 # 檔案路徑
-JSON_FILE = DATA_DIR / "sensor_data.json"
+SEGMENT_DIR = DATA_DIR / "segments"
+META_FILE = DATA_DIR / "sensor_data.meta.json"
+CHECKPOINT_FILE = DATA_DIR / "checkpoint.bin"
+
+# export_to_csv 的預設輸出檔案
 CSV_FILE = DATA_DIR / "sensor_data.csv"
 
+# export_to_parquet 的預設輸出目錄（依日期分區）
+PARQUET_DIR = DATA_DIR / "parquet"
+
+# 舊版整包 JSON 檔案與單一 JSONL 日誌（僅用於遷移）
+JSON_FILE = DATA_DIR / "sensor_data.json"
+LOG_FILE = DATA_DIR / "sensor_data.jsonl"
+
+# SQLite 資料庫檔案（STORAGE_BACKEND = "sqlite" 時使用）
+SQLITE_FILE = DATA_DIR / os.path.basename(DATABASE_PATH)
+
+# 二進位紀錄檔案（STORAGE_BACKEND = "binary" 時使用）
+BINARY_FILE = DATA_DIR / "sensor_data.bin"
+
+# get_history 預設至少回傳的資料點數（決定使用哪種彙總解析度）
+HISTORY_POINTS = 100
+
+# query() 可選的聚合函數
+QUERY_AGGREGATES = ('avg', 'min', 'max', 'sum', 'count')
+
+# 日誌狀態（第一次使用時載入，只有寫入者會修改）
+_state: Dict[str, Any] = {
+    'loaded': False,
+    'next_id': 1,       # 下一筆紀錄 ID
+    'cache_base': 0,    # 快取第一筆對應的索引位置
+    'meta': {},
+    'since_checkpoint': 0,  # 上次寫入檢查點之後新增的筆數
+    'latest': None,     # 最新一筆讀數（尚未載入索引時由檢查點取得）
+    'rows': 0           # 有效紀錄數
+}
+
+# 寫入鎖：新增、清理、清空與延遲載入同一時間只有一個執行緒進行（讀取不需要）
+_write_lock = threading.RLock()
+
+# Parquet 匯出鎖（避免背景匯出與命令列同時寫入同一個分區）
+_export_lock = threading.Lock()
+
+# 最近一次完成的 Parquet 匯出（exported_through: 已匯出到哪一天，finished_at: 完成時間）
+_export_status: Dict[str, Any] = {'exported_through': None, 'finished_at': None}
+
+# 有效紀錄的時間索引：第 i 筆紀錄的 epoch 秒數（遞增；刪除時以新的陣列取代）
+_epochs = array('d')
+
+# 分段日誌，並保存第 i 筆紀錄所在的分段與位元組位置
+_segments = SegmentLog(SEGMENT_DIR, DB_PARTITION, DB_COMPRESS_SEALED)
+
+# 與時間索引平行的聚合索引（各指標的前綴和與最小值/最大值線段樹）
+_aggregates = AggregateIndex()
+
+# 最近 DB_CACHE_HOURS 小時的讀數（欄位式），對應索引中 cache_base 之後的紀錄
+_cache = ReadingColumns()
+
+# 各裝置的時間索引、聚合索引與最新讀數
+_devices = DeviceIndexes()
+
+# SQLite 或二進位後端（使用 JSONL 日誌時為 None），兩者提供相同的介面
+if STORAGE_BACKEND == "sqlite":
+    _store: Optional[Union[SQLiteStore, BinaryStore]] = SQLiteStore(SQLITE_FILE)
+elif STORAGE_BACKEND == "binary":
+    _store = BinaryStore(BINARY_FILE)
+else:
+    _store = None
+
+# 多解析度彙總（兩種後端共用，第一次使用時載入）
+_rollups = Rollups(DATA_DIR)
+
+
+class _Pin:
+    """
+    快照的使用標記
+
+    每個標記引用下一個快照的標記，因此某個標記被回收時，它和所有更早的快照都已無人使用，
+    可以安全刪除在那之後被取代的分段檔。
+    """
+
+    __slots__ = ('newer', '__weakref__')
+
+    def __init__(self):
+        self.newer: Optional['_Pin'] = None
+
+
+class _Snapshot:
+    """
+    某次寫入完成時的唯讀狀態（讀取端取得後即可不加鎖地查詢）
+
+    索引相關欄位在索引尚未載入時為 None（只有最新讀數與筆數）。
+    """
+
+    __slots__ = ('rows', 'latest', 'epochs', 'segments', 'aggregates', 'cache', 'cache_base', 'devices', 'pin')
+
+    def __init__(self, rows: int, latest: Optional[Dict[str, Any]], indexed: bool, pin: _Pin):
+        self.rows = rows
+        self.latest = latest
+        self.pin = pin
+        if indexed:
+            self.epochs = _epochs
+            self.segments = _segments.snapshot()
+            self.aggregates = _aggregates.snapshot()
+            self.cache = _cache.snapshot()
+            self.cache_base = _state['cache_base']
+            self.devices = _devices.view(rows)
+        else:
+            self.epochs = self.segments = self.aggregates = self.cache = self.devices = None
+            self.cache_base = 0
+
+
+# 目前的快照（寫入者以單一賦值替換）
+_snapshot: Optional[_Snapshot] = None
+
+# 非同步 API 的背景執行緒（第一次使用時建立）
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 非同步 API 每個函數保留最近幾次呼叫的延遲
+ASYNC_LATENCY_SAMPLES = 1000
+
+# 非同步 API 的延遲紀錄：函數名稱對應最近的延遲秒數
+_async_latency: Dict[str, deque] = {}
+
 
 def init_database():
     """初始化資料儲存"""
     # 建立資料目錄
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # 初始化 JSON 檔案
-    if not JSON_FILE.exists():
-        with open(JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump({"readings": [], "metadata": {
-                "created_at": datetime.now().isoformat(),
-                "version": "0.1.0"
-            }}, f, ensure_ascii=False, indent=2)
-    
-    # 初始化 CSV 檔案
-    if not CSV_FILE.exists():
-        with open(CSV_FILE, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'temperature', 'humidity', 'heat_index', 'air_quality', 'recorded_at'])
-    
-    print(f"[OK] Data storage initialized")
-    print(f"     JSON: {JSON_FILE}")
-    print(f"     CSV:  {CSV_FILE}")
-
-
-def _load_json() -> Dict:
-    """載入 JSON 數據"""
-    if not JSON_FILE.exists():
-        # 確保目錄存在
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        return {"readings": [], "metadata": {}}
-    
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
+
+    if _store:
+        _store.init()
+        with _write_lock:
+            _load_rollups(force=True)
+        print(f"[OK] Data storage initialized")
+        if isinstance(_store, SQLiteStore):
+            print(f"     SQLite: {SQLITE_FILE}")
+        else:
+            print(f"     Binary: {BINARY_FILE}")
+        return
+
+    # 轉換舊版 JSON 檔案與單一日誌
+    if JSON_FILE.exists() and not LOG_FILE.exists() and not _segments.exists():
+        _migrate_legacy_json()
+    if LOG_FILE.exists() and not _segments.exists():
+        _migrate_single_log()
+
+    if not META_FILE.exists():
+        _save_meta({
+            "created_at": datetime.now().isoformat(),
+            "version": "0.2.0",
+            "deleted_before": None
+        })
+
+    # 有檢查點時只讀取其標頭與之後附加的紀錄，索引與彙總在第一次需要時才載入
+    with _write_lock:
+        if _open_from_checkpoint():
+            source = "checkpoint"
+        else:
+            _load_state(force=True)
+            source = "full scan"
+        _rollups.loaded = False
+
+    print(f"[OK] Data storage initialized ({source})")
+    print(f"     JSONL + CSV: {SEGMENT_DIR} (one segment per {_segments.partition})")
+
+
+# ========== 日誌底層操作 ==========
+
+def _to_epoch(value) -> float:
+    """將 datetime 或 ISO 格式字串轉為 epoch 秒數"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _load_meta() -> Dict:
+    """載入中繼資料"""
+    if not META_FILE.exists():
+        return {"deleted_before": None}
+
+    with open(META_FILE, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def _save_json(data: Dict):
-    """儲存 JSON 數據"""
-    # 確保目錄存在
+def _save_meta(meta: Dict):
+    """儲存中繼資料（先寫暫存檔再取代，避免寫到一半損毀）"""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    tmp_file = META_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, META_FILE)
+
+
+def _current(indexed: bool = True) -> _Snapshot:
+    """
+    取得目前的快照（讀取端使用）
+
+    Args:
+        indexed: 需要時間索引與快取（尚未載入時先載入）；只需最新讀數與筆數時為 False
+    """
+    snapshot = _snapshot
+    if snapshot is None or (indexed and snapshot.epochs is None):
+        _load_state()
+        snapshot = _snapshot
+    return snapshot
+
+
+def _publish():
+    """
+    發布目前狀態的快照（寫入者在每次寫入完成後呼叫）
+
+    寫入期間被取代的分段檔（封存前的 JSONL、過期的分段）在前一個快照及更早的快照
+    都不再被使用時才刪除；沒有讀取端持有它們時立即刪除。
+    """
+    global _snapshot
+    pin = _Pin()
+    previous = _snapshot
+    retired = _segments.take_retired()
+    if previous is not None:
+        previous.pin.newer = pin
+        if retired:
+            weakref.finalize(previous.pin, _segments.remove_retired, retired)
+    elif retired:
+        _segments.remove_retired(retired)
+    _snapshot = _Snapshot(_state['rows'], _state['latest'], _state['loaded'], pin)
+
+
+def _iter_live() -> Iterator[Dict]:
+    """依序讀取所有有效紀錄（從第一筆有效紀錄的位置開始，略過已刪除範圍）"""
+    snapshot = _current()
+    return _iter_rows(snapshot, 0, snapshot.rows)
+
+
+def _read_rows(snapshot: _Snapshot, start: int, stop: int) -> List[Dict[str, Any]]:
+    """
+    取得快照中索引位置 [start, stop) 的紀錄
+
+    落在快取範圍內的部分直接取自記憶體，其餘從日誌中對應的位置讀取 stop - start 行。
+    """
+    cache_base = snapshot.cache_base
+    if start >= cache_base:
+        return snapshot.cache.to_dicts(start - cache_base, stop - cache_base)
+    return list(_iter_rows(snapshot, start, stop))
+
+
+def _iter_rows(snapshot: _Snapshot, start: int, stop: int, chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    逐筆產生快照中索引位置 [start, stop) 的紀錄（串流版的 _read_rows）
+
+    快取之前的部分從起點所在的分段開始讀取，其餘每次從快取轉換 chunk 筆。
+    """
+    cache_base = snapshot.cache_base
+    index = start
+    if index < min(stop, cache_base):
+        for reading in snapshot.segments.iter_from(index):
+            yield reading
+            index += 1
+            if index >= stop or index >= cache_base:
+                break
+
+    while index < stop:
+        rows = snapshot.cache.to_dicts(index - cache_base, min(stop, index + chunk) - cache_base)
+        if not rows:
+            break
+        yield from rows
+        index += len(rows)
+
+
+def _iter_positions(snapshot: _Snapshot, positions: List[int], chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    逐筆產生快照中指定位置（遞增，例如某個裝置的紀錄）的紀錄
+
+    快取內的部分直接以位置讀取；快取之前的部分從第一個位置所在的分段開始依序讀取，
+    只保留需要的紀錄。
+    """
+    cache_base = snapshot.cache_base
+    split = bisect_left(positions, cache_base)
+    if split:
+        wanted = iter(positions[:split])
+        target = next(wanted)
+        for index, reading in enumerate(_iter_rows(snapshot, target, positions[split - 1] + 1), target):
+            if index == target:
+                yield reading
+                target = next(wanted, None)
+                if target is None:
+                    break
+
+    for i in range(split, len(positions), chunk):
+        yield from snapshot.cache.to_dicts_at(position - cache_base for position in positions[i:i + chunk])
+
+
+def _device_range(snapshot: _Snapshot, device_id: str, start: Union[datetime, str] = None,
+                  end: Union[datetime, str] = None):
+    """
+    裝置在快照中時間範圍對應的索引位置
+
+    Returns:
+        (裝置索引, 起始位置, 結束位置)；沒有此裝置時裝置索引為 None
+    """
+    index = snapshot.devices.get(device_id)
+    if index is None:
+        return None, 0, 0
+    first, last = snapshot.devices.range(index, _to_epoch(start) if start is not None else None,
+                                         _to_epoch(end) if end is not None else None)
+    return index, first, last
+
+
+def _cache_window_start() -> float:
+    """快取涵蓋範圍的起始時間（epoch 秒數）"""
+    return (datetime.now() - timedelta(hours=DB_CACHE_HOURS)).timestamp()
+
+
+def _evict_cache(before: float = None):
+    """移除快取中早於指定時間（預設為快取範圍起點）的讀數"""
+    if before is None:
+        before = _cache_window_start()
+
+    cache_base = _state['cache_base']
+    expired = bisect_left(_epochs, before, cache_base) - cache_base
+    if expired > 0:
+        _cache.drop_prefix(expired)
+        _state['cache_base'] = cache_base + expired
+
+
+def _index_append(reading: Dict, epoch: float):
+    """將一筆紀錄加入時間索引與聚合索引"""
+    # 系統時間被往回調整時，索引值取前一筆的時間，維持陣列遞增才能二分搜尋
+    _epochs.append(epoch if not _epochs or epoch >= _epochs[-1] else _epochs[-1])
+    _aggregates.append(reading)
+    _devices.append(reading.get('device_id') or DEFAULT_DEVICE, len(_epochs) - 1, _epochs[-1], reading)
+    _state['latest'] = reading
+
+
+def _load_state(force: bool = False):
+    """
+    載入日誌狀態（ID 計數器、時間索引、最近讀數快取）
+
+    優先從檢查點還原並只讀取之後附加的紀錄；沒有可用的檢查點時掃描全部分段，
+    並寫入新的檢查點。多個執行緒同時需要索引時只有一個會載入，其餘等待完成。
+    """
+    if _state['loaded'] and not force:
+        return
+
+    with _write_lock:
+        if _state['loaded'] and not force:
+            return
+
+        global _epochs
+        meta = _load_meta()
+        deleted_before = meta.get('deleted_before')
+        deleted_before = _to_epoch(deleted_before) if deleted_before else None
+
+        restored = _restore_checkpoint(meta, deleted_before)
+        if not restored:
+            max_id = 0
+            window_start = _cache_window_start()
+            _epochs = array('d')
+            _aggregates.clear()
+            _cache.clear()
+            _devices.clear()
+            _state['latest'] = None
+
+            for epoch, reading in _segments.load(deleted_before):
+                max_id = max(max_id, reading.get('id', 0))
+                _index_append(reading, epoch)
+                if _epochs[-1] >= window_start:
+                    _cache.append(reading, epoch)
+
+            _state['next_id'] = max(max_id + 1, meta.get('next_id', 1))
+            _state['cache_base'] = len(_epochs) - len(_cache)
 
+        _state['meta'] = meta
+        _state['rows'] = len(_epochs)
+        _state['loaded'] = True
+        _publish()
 
-def _append_csv(reading: Dict):
-    """附加一筆數據到 CSV"""
-    with open(CSV_FILE, 'a', newline='', encoding='utf-8-sig') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            reading['id'],
-            reading['temperature'],
-            reading['humidity'],
-            reading.get('heat_index', ''),
-            reading.get('air_quality', ''),
-            reading['recorded_at']
-        ])
+        if not restored:
+            _save_checkpoint()
 
 
-def insert_reading(temperature: float, humidity: float, heat_index: float = None, air_quality: float = None) -> int:
+# ========== 檢查點 ==========
+
+def _checkpoint_tail(header: Dict[str, Any], meta: Dict) -> Optional[List[tuple]]:
+    """
+    比對檢查點與目前的分段檔
+
+    Returns:
+        檢查點之後需要讀取的 (分段名稱, 起點位置)；
+        分段在檢查點之後被刪除、封存或截斷時為 None（需要完整掃描）
+    """
+    if header.get('deleted_before') != meta.get('deleted_before'):
+        return None
+
+    saved = header['files']
+    files = _segments.listing()
+    added = files[len(saved):]
+    if files[:len(saved)] != saved or any(sealed for _, sealed in added):
+        return None
+
+    tail = [(name, 0) for name, _ in added]
+    if saved and not saved[-1][1]:
+        name = saved[-1][0]
+        if _segments.path(name).stat().st_size < header['tail_size']:
+            return None
+        tail.insert(0, (name, header['tail_size']))
+    return tail
+
+
+def _open_from_checkpoint() -> bool:
+    """
+    只讀取檢查點標頭與之後附加的紀錄，取得最新讀數與筆數
+
+    /api/current 等只需要最新讀數的查詢因此不必等待索引載入，
+    啟動時間與歷史長度無關。
+
+    Returns:
+        是否有可用的檢查點
+    """
+    header = checkpoint.load_header(CHECKPOINT_FILE)
+    if header is None:
+        return False
+
+    meta = _load_meta()
+    tail = _checkpoint_tail(header, meta)
+    if tail is None:
+        return False
+
+    latest, rows = header['latest'], header['rows']
+    for name, start in tail:
+        for reading in _segments.read(name, start):
+            latest = reading
+            rows += 1
+
+    _state['meta'] = meta
+    _state['latest'] = latest
+    _state['rows'] = rows
+    _state['loaded'] = False
+    _publish()
+    return True
+
+
+def _restore_checkpoint(meta: Dict, deleted_before: Optional[float]) -> bool:
+    """
+    從檢查點還原索引、分段位置與快取，再加入之後附加的紀錄
+
+    Returns:
+        是否成功還原（檢查點不存在、損毀或已過時時為 False）
+    """
+    loaded = checkpoint.load(CHECKPOINT_FILE)
+    if loaded is None:
+        return False
+
+    header, arrays = loaded
+    tail = _checkpoint_tail(header, meta)
+    if tail is None or 'devices' not in header:
+        # 沒有裝置索引的舊版檢查點也需要完整掃描
+        return False
+
+    def section(prefix: str) -> Dict[str, array]:
+        return {name[len(prefix):]: values for name, values in arrays.items() if name.startswith(prefix)}
+
+    global _epochs
+    _epochs = arrays['epochs']
+    _state['latest'] = header['latest']
+    _segments.restore(header['segments'], section('segments.'))
+    _aggregates.restore(section('aggregates.'))
+    _cache.restore(section('cache.'), header['device_names'])
+    _devices.restore(header['devices'], section('devices.'))
+    _state['next_id'] = header['next_id']
+    _state['cache_base'] = header['cache_base']
+
+    replayed = 0
+    for name, start in tail:
+        for epoch, reading in _segments.replay(name, start, deleted_before):
+            _state['next_id'] = max(_state['next_id'], reading.get('id', 0) + 1)
+            _index_append(reading, epoch)
+            _cache.append(reading, epoch)
+            replayed += 1
+    _evict_cache()
+
+    _state['since_checkpoint'] = replayed
+    return True
+
+
+def _save_checkpoint():
+    """將時間索引、分段位置、聚合索引、快取與計數器寫入檢查點（寫入者呼叫）"""
+    if _store or not _state['loaded']:
+        return
+
+    files = _segments.listing()
+    tail_size = 0
+    if files and not files[-1][1]:
+        tail_size = _segments.path(files[-1][0]).stat().st_size
+
+    header = {
+        'saved_at': datetime.now().isoformat(),
+        'rows': len(_epochs),
+        'next_id': _state['next_id'],
+        'cache_base': _state['cache_base'],
+        'deleted_before': _state['meta'].get('deleted_before'),
+        'latest': _state['latest'],
+        'segments': _segments.names,
+        'files': files,
+        'tail_size': tail_size,
+        'device_names': _cache.device_names,
+        'devices': _devices.header()
+    }
+
+    arrays = {'epochs': _epochs}
+    for prefix, section in (('segments.', _segments.arrays()),
+                            ('aggregates.', _aggregates.arrays()),
+                            ('cache.', _cache.arrays()),
+                            ('devices.', _devices.arrays())):
+        arrays.update((prefix + name, values) for name, values in section.items())
+
+    checkpoint.save(CHECKPOINT_FILE, header, arrays)
+    _state['since_checkpoint'] = 0
+
+
+def _after_append(count: int, segments_before: int):
+    """新增紀錄後，累積足夠筆數或開始新的分段（前一個分段已封存）時寫入檢查點"""
+    _state['since_checkpoint'] += count
+    if _state['since_checkpoint'] >= DB_CHECKPOINT_ROWS or len(_segments.names) != segments_before:
+        _save_checkpoint()
+
+
+def _load_rollups(force: bool = False):
+    """載入彙總，並重新累加最後一個已結束時段之後的原始讀數"""
+    if _rollups.loaded and not force:
+        return
+
+    with _write_lock:
+        if _rollups.loaded and not force:
+            return
+
+        since = _rollups.load()
+        if since == float('-inf'):
+            # 從沒有彙總過（例如既有數據升級）：以所有原始讀數建立
+            readings = _store.iter_all() if _store else _iter_live()
+        else:
+            readings = get_readings_between(datetime.fromtimestamp(since))
+
+        for reading in readings:
+            _rollups.replay(_to_epoch(reading['recorded_at']), reading)
+
+
+def _migrate_legacy_json():
+    """將舊版整包 JSON 檔案轉換為 JSONL 日誌"""
+    with open(JSON_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    readings = data.get('readings', [])
+    tmp_file = LOG_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for reading in readings:
+            f.write(json.dumps(reading, ensure_ascii=False) + '\n')
+    os.replace(tmp_file, LOG_FILE)
+
+    meta = data.get('metadata', {})
+    meta['deleted_before'] = None
+    meta['migrated_at'] = datetime.now().isoformat()
+    _save_meta(meta)
+
+    # 保留舊檔以供備查，但改名避免重複轉換
+    os.replace(JSON_FILE, JSON_FILE.with_suffix('.json.migrated'))
+
+    print(f"[MIGRATE] Converted {len(readings)} records from {JSON_FILE.name} to {LOG_FILE.name}")
+
+
+def _migrate_single_log():
+    """將單一 JSONL 日誌依時間拆成分段檔（略過已標記刪除的紀錄）"""
+    meta = _load_meta()
+    deleted_before = meta.get('deleted_before')
+    deleted_before = _to_epoch(deleted_before) if deleted_before else None
+
+    logfile.repair_tail(LOG_FILE)
+    migrated = 0
+    readings = (reading for _, reading in logfile.scan(LOG_FILE))
+    for chunk in csv_stream.chunked(readings, csv_stream.IMPORT_CHUNK_ROWS):
+        epochs = [_to_epoch(reading['recorded_at']) for reading in chunk]
+        live = [(r, e) for r, e in zip(chunk, epochs) if deleted_before is None or e >= deleted_before]
+        if live:
+            _segments.append([r for r, _ in live], [e for _, e in live])
+            migrated += len(live)
+        meta['next_id'] = max(meta.get('next_id', 1), max(r.get('id', 0) for r in chunk) + 1)
+
+    meta['deleted_before'] = None
+    meta['migrated_at'] = datetime.now().isoformat()
+    _save_meta(meta)
+
+    # 保留舊檔以供備查，但改名避免重複轉換
+    os.replace(LOG_FILE, LOG_FILE.with_suffix('.jsonl.migrated'))
+
+    print(f"[MIGRATE] Split {migrated} records from {LOG_FILE.name} into {SEGMENT_DIR.name}/")
+
+
+def _new_reading(temperature: float, humidity: float, heat_index: float = None,
+                 air_quality: float = None, recorded_at: Union[datetime, str] = None,
+                 device_id: str = None) -> Dict[str, Any]:
+    """建立尚未指定 ID 的讀數（數值四捨五入，時間預設為現在，裝置預設為 DEVICE_ID）"""
+    if recorded_at is None:
+        recorded_at = datetime.now()
+    return {
+        'temperature': round(temperature, 1),
+        'humidity': round(humidity, 1),
+        'heat_index': round(heat_index, 1) if heat_index else None,
+        'air_quality': int(air_quality) if air_quality is not None else None,
+        'recorded_at': recorded_at.isoformat() if isinstance(recorded_at, datetime) else recorded_at,
+        'device_id': str(device_id) if device_id else DEVICE_ID
+    }
+
+
+# ========== 公開 API ==========
+
+def insert_reading(temperature: float, humidity: float, heat_index: float = None, air_quality: float = None,
+                   device_id: str = None) -> int:
     """
     新增一筆感測器讀數
-    
+
+    只附加一行到所屬分段的日誌與 CSV 尾端，不需要讀取既有數據。
+
     Args:
         temperature: 溫度（攝氏）
         humidity: 濕度（%）
         heat_index: 體感溫度（可選）
-    
+        air_quality: 空氣品質 PPM（可選）
+        device_id: 裝置名稱（預設為 DEVICE_ID）
+
     Returns:
         新增的記錄 ID
     """
-    data = _load_json()
-    
-    # 產生新 ID
-    if data['readings']:
-        new_id = max(r['id'] for r in data['readings']) + 1
-    else:
-        new_id = 1
-    
     # 建立新記錄
-    reading = {
-        'id': new_id,
-        'temperature': round(temperature, 1),
-        'humidity': round(humidity, 1),
-        'heat_index': round(heat_index, 1) if heat_index else None,
-        'air_quality': int(air_quality) if air_quality is not None else None,
-        'recorded_at': datetime.now().isoformat()
-    }
-    
-    # 加入 JSON
-    data['readings'].append(reading)
-    _save_json(data)
-    
-    # 附加到 CSV
-    _append_csv(reading)
-    
-    return new_id
+    reading = _new_reading(temperature, humidity, heat_index, air_quality, device_id=device_id)
+
+    _load_rollups()
+
+    with _write_lock:
+        if _store:
+            new_id = _store.insert(reading)
+            _rollups.add(_to_epoch(reading['recorded_at']), reading)
+            return new_id
+
+        _load_state()
 
+        # 產生新 ID
+        new_id = _state['next_id']
+        _state['next_id'] += 1
+        reading = {'id': new_id, **reading}
 
-def get_latest_reading() -> Optional[Dict[str, Any]]:
-    """取得最新一筆讀數"""
-    data = _load_json()
-    
-    if data['readings']:
-        return data['readings'][-1]
-    return None
+        # 附加到分段日誌與 CSV，並加入索引
+        epoch = _to_epoch(reading['recorded_at'])
+        segments_before = len(_segments.names)
+        _segments.append([reading], [epoch])
+        _index_append(reading, epoch)
 
+        # 同步寫入快取
+        _cache.append(reading, epoch)
+        _evict_cache()
 
-def get_readings_by_hours(hours: int = 24) -> List[Dict[str, Any]]:
+        # 累加到彙總
+        _rollups.add(epoch, reading)
+
+        _state['rows'] = len(_epochs)
+        _publish()
+        _after_append(1, segments_before)
+        return new_id
+
+
+def insert_readings(readings: Iterable[Dict[str, Any]]) -> int:
+    """
+    批次新增多筆感測器讀數，整批只提交一次
+
+    JSONL 日誌的每個分段以單次寫入加 fsync 附加整批紀錄，CSV 只開啟一次；
+    SQLite 在單一交易中寫入；二進位檔只更新一次檔頭。
+
+    Args:
+        readings: 讀數字典，需有 temperature、humidity，
+                  可選 heat_index、air_quality、recorded_at（預設為現在）、device_id（預設為 DEVICE_ID）
+
+    Returns:
+        新增的記錄數
+    """
+    batch = [
+        _new_reading(
+            r['temperature'], r['humidity'],
+            r.get('heat_index'), r.get('air_quality'), r.get('recorded_at'), r.get('device_id')
+        )
+        for r in readings
+    ]
+    if not batch:
+        return 0
+
+    _load_rollups()
+
+    with _write_lock:
+        if _store:
+            inserted = _store.insert_many(batch)
+            for reading in batch:
+                _rollups.add(_to_epoch(reading['recorded_at']), reading)
+            return inserted
+
+        _load_state()
+
+        # 產生連續的 ID
+        first_id = _state['next_id']
+        _state['next_id'] += len(batch)
+        batch = [{'id': first_id + i, **reading} for i, reading in enumerate(batch)]
+
+        # 一次附加到分段日誌與 CSV，之後才更新索引、快取與彙總
+        epochs = [_to_epoch(reading['recorded_at']) for reading in batch]
+        segments_before = len(_segments.names)
+        _segments.append(batch, epochs)
+        for reading, epoch in zip(batch, epochs):
+            _index_append(reading, epoch)
+            _cache.append(reading, epoch)
+            _rollups.add(epoch, reading)
+        _evict_cache()
+
+        _state['rows'] = len(_epochs)
+        _publish()
+        _after_append(len(batch), segments_before)
+        return len(batch)
+
+
+def get_latest_reading(device_id: str = None) -> Optional[Dict[str, Any]]:
+    """
+    取得最新一筆讀數（取自快照，啟動後尚未載入索引時也不需讀取日誌）
+
+    Args:
+        device_id: 只取此裝置的最新讀數（取自裝置索引），None 為所有裝置中最新的一筆
+    """
+    if _store:
+        return _store.latest(device_id)
+
+    if device_id is None:
+        latest = _current(indexed=False).latest
+        return dict(latest) if latest is not None else None
+
+    snapshot = _current()
+    index = snapshot.devices.get(device_id)
+    latest = snapshot.devices.latest(index) if index is not None else None
+    if latest is None:
+        return None
+    position, reading = latest
+    if reading is None:
+        reading = _read_rows(snapshot, position, position + 1)[0]
+    return dict(reading)
+
+
+def get_recent(n: int = 10, device_id: str = None) -> List[Dict[str, Any]]:
+    """
+    取得最近 n 筆讀數（成本只與 n 有關，與歷史長度無關）
+
+    - JSONL：從時間索引尾端取 n 個位置，通常都在記憶體快取內；n 為 1 時直接取自快照的最新讀數
+    - SQLite：以 recorded_at（或 (device_id, recorded_at)）索引反向讀取 n 筆
+    - 二進位：直接以位置讀取檔尾的 n 筆紀錄
+
+    Args:
+        n: 筆數
+        device_id: 只取此裝置的讀數（JSONL 取自裝置索引的尾端），None 為所有裝置
+
+    Returns:
+        依時間排序（由舊到新）的讀數列表，最後一筆為最新讀數
+    """
+    if n <= 0:
+        return []
+    if _store:
+        return _store.recent(n, device_id)
+
+    if n == 1:
+        latest = get_latest_reading(device_id)
+        return [latest] if latest is not None else []
+
+    snapshot = _current()
+    if device_id is None:
+        return _read_rows(snapshot, max(0, snapshot.rows - n), snapshot.rows)
+
+    index = snapshot.devices.get(device_id)
+    if index is None:
+        return []
+    count = snapshot.devices.span(index)
+    return list(_iter_positions(snapshot, snapshot.devices.positions(index, max(0, count - n), count)))
+
+
+def get_readings_between(start: Union[datetime, str], end: Union[datetime, str] = None,
+                         device_id: str = None) -> List[Dict[str, Any]]:
+    """
+    取得指定時間範圍內的讀數
+
+    以時間索引二分搜尋定位範圍，只讀取範圍內的紀錄。
+
+    Args:
+        start: 起始時間（含），datetime 或 ISO 格式字串
+        end: 結束時間（含），預設為最新一筆
+        device_id: 只取此裝置的讀數（以裝置的時間索引定位），None 為所有裝置
+
+    Returns:
+        依時間排序的讀數列表
+    """
+    if _store:
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        return _store.between(start, end, device_id)
+
+    snapshot = _current()
+    if device_id is not None:
+        return list(_iter_between(snapshot, start, end, device_id))
+
+    first = bisect_left(snapshot.epochs, _to_epoch(start), 0, snapshot.rows)
+    last = bisect_right(snapshot.epochs, _to_epoch(end), 0, snapshot.rows) if end is not None else snapshot.rows
+
+    if first >= last:
+        return []
+    return _read_rows(snapshot, first, last)
+
+
+def iter_readings_between(start: Union[datetime, str] = None, end: Union[datetime, str] = None,
+                          device_id: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    逐筆產生指定時間範圍內的讀數（不會一次載入整個範圍，適合匯出大量數據）
+
+    Args:
+        start: 起始時間（含），預設為第一筆
+        end: 結束時間（含），預設為最新一筆
+        device_id: 只取此裝置的讀數，None 為所有裝置
+
+    Returns:
+        依時間排序的讀數 iterator
+    """
+    if _store:
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        yield from _store.iter_between(start, end, device_id)
+        return
+
+    yield from _iter_between(_current(), start, end, device_id)
+
+
+def _iter_between(snapshot: _Snapshot, start: Union[datetime, str] = None,
+                  end: Union[datetime, str] = None, device_id: str = None) -> Iterator[Dict[str, Any]]:
+    """逐筆產生快照中指定時間範圍內的讀數（指定 device_id 時只讀取該裝置的紀錄）"""
+    if device_id is not None:
+        index, first, last = _device_range(snapshot, device_id, start, end)
+        if first >= last:
+            return iter(())
+        return _iter_positions(snapshot, snapshot.devices.positions(index, first, last))
+
+    first = bisect_left(snapshot.epochs, _to_epoch(start), 0, snapshot.rows) if start is not None else 0
+    last = bisect_right(snapshot.epochs, _to_epoch(end), 0, snapshot.rows) if end is not None else snapshot.rows
+    return _iter_rows(snapshot, first, last)
+
+
+def get_readings_by_hours(hours: int = 24, device_id: str = None) -> List[Dict[str, Any]]:
     """
     取得過去 N 小時的所有讀數
-    
+
     Args:
         hours: 要查詢的小時數
-    
+        device_id: 只取此裝置的讀數，None 為所有裝置
+
     Returns:
         讀數列表
     """
-    data = _load_json()
+    return get_readings_between(datetime.now() - timedelta(hours=hours), device_id=device_id)
+
+
+def get_history(hours: float = 24, points: int = HISTORY_POINTS, device_id: str = None) -> Dict[str, Any]:
+    """
+    取得過去 N 小時的歷史數據，自動選擇解析度
+
+    使用仍能提供至少 points 個資料點的最粗彙總（1 天 / 1 小時 / 1 分鐘），
+    範圍太短時回傳原始讀數。彙總資料點的指標欄位為平均值，
+    另有 count 與 <指標>_min / <指標>_max。
+
+    Args:
+        hours: 要查詢的小時數
+        points: 至少需要的資料點數
+        device_id: 只取此裝置的數據。彙總只保存所有裝置合計的值，
+                   因此改以 query() 在相同的時段上分組計算（仍限於未被清理的原始數據）
+
+    Returns:
+        {'resolution': '1d' / '1h' / '1m' / 'raw', 'data': 依時間排序的資料點}
+    """
     since = datetime.now() - timedelta(hours=hours)
-    
-    results = []
-    for reading in data['readings']:
-        recorded_at = datetime.fromisoformat(reading['recorded_at'])
-        if recorded_at >= since:
-            results.append(reading)
-    
-    return results
 
+    _load_rollups()
+    series = _rollups.select(hours, points)
+    if series is None:
+        return {'resolution': 'raw', 'data': get_readings_between(since, device_id=device_id)}
+
+    if device_id is None:
+        return {'resolution': series.name, 'data': series.points_between(since.timestamp())}
+
+    start = datetime.fromtimestamp(series.bucket_start(since.timestamp()))
+    data = query(start, step=series.seconds, device_id=device_id)
+    for agg in ('min', 'max'):
+        for point, extreme in zip(data, query(start, step=series.seconds, agg=agg, device_id=device_id)):
+            for metric in METRICS:
+                point[f'{metric}_{agg}'] = extreme[metric]
+    return {'resolution': series.name, 'data': data}
+
+
+def _percentiles(since: datetime, snapshot: _Snapshot = None,
+                 device_id: str = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    合併彙總時段的分位數摘要，估計 since 之後各指標的 p5/p50/p95/p99
+
+    範圍開頭不足一小時的部分直接使用原始讀數，之後到午夜使用 1 小時時段，
+    其餘使用 1 天時段；合併的摘要數量只與天數成正比，不需排序原始讀數。
+    已被清理的原始數據之前的時段不計入，與其他統計的範圍一致。
+    JSONL 後端傳入 snapshot 時，原始讀數取自與其他統計相同的快照。
+    指定 device_id 時彙總不適用（只保存所有裝置合計的摘要），改以該裝置的原始讀數建立摘要。
+    """
+    _load_rollups()
+
+    def between(start, end=None):
+        if snapshot is None:
+            return iter_readings_between(start, end, device_id)
+        return _iter_between(snapshot, start, end, device_id)
+
+    sketches = {metric: TDigest() for metric in METRICS}
+    if device_id is not None:
+        for reading in between(since):
+            for metric in METRICS:
+                if reading.get(metric) is not None:
+                    sketches[metric].add(reading[metric])
+        return {metric: sketches[metric].percentiles() for metric in METRICS}
+
+    first = next(between(since), None)
+    if first is None:
+        return {metric: sketches[metric].percentiles() for metric in METRICS}
+
+    start = max(since.timestamp(), _to_epoch(first['recorded_at']))
+    hourly = _rollups.get('1h')
+    daily = _rollups.get('1d')
+    hour_start = hourly.next_start(start)
+    day_start = daily.next_start(hour_start)
 
-def get_statistics(hours: int = 24) -> Dict[str, Any]:
+    edge_end = datetime.fromtimestamp(hour_start) - timedelta(microseconds=1)
+    for reading in between(datetime.fromtimestamp(start), edge_end):
+        for metric in METRICS:
+            if reading.get(metric) is not None:
+                sketches[metric].add(reading[metric])
+
+    hourly.merge_sketches(sketches, hour_start, day_start)
+    daily.merge_sketches(sketches, day_start)
+
+    return {metric: sketches[metric].percentiles() for metric in METRICS}
+
+
+def get_statistics(hours: int = 24, device_id: str = None) -> Dict[str, Any]:
     """
     取得過去 N 小時的統計數據
-    
+
+    平均、最小、最大值與標準差以聚合索引計算，不需讀取範圍內的紀錄（O(log n)）；
+    分位數合併彙總時段的 t-digest 摘要。
+
     Args:
         hours: 要統計的小時數
-    
+        device_id: 只統計此裝置（使用裝置的聚合索引），None 為所有裝置
+
     Returns:
-        統計資料字典
-    """
-    readings = get_readings_by_hours(hours)
-    
-    if not readings:
-        return {
-            'count': 0,
-            'temperature': {'avg': None, 'min': None, 'max': None},
-            'humidity': {'avg': None, 'min': None, 'max': None},
-            'hours': hours
-        }
-    
-    temps = [r['temperature'] for r in readings]
-    humids = [r['humidity'] for r in readings]
-    
-    return {
-        'count': len(readings),
-        'temperature': {
-            'avg': round(sum(temps) / len(temps), 1),
-            'min': min(temps),
-            'max': max(temps)
-        },
-        'humidity': {
-            'avg': round(sum(humids) / len(humids), 1),
-            'min': min(humids),
-            'max': max(humids)
-        },
-        'hours': hours
-    }
+        統計資料字典，每個指標包含 avg/min/max/stddev/p5/p50/p95/p99
+    """
+    since = datetime.now() - timedelta(hours=hours)
+
+    snapshot = None
+    if _store:
+        result = {**_store.statistics(since.isoformat(), device_id), 'hours': hours}
+    elif device_id is not None:
+        snapshot = _current()
+        index, first, last = _device_range(snapshot, device_id, since)
+        aggregates = index.aggregates if index is not None else AggregateIndex()
+        result = {**aggregates.summary(first, last), 'hours': hours}
+    else:
+        snapshot = _current()
+        first = bisect_left(snapshot.epochs, since.timestamp(), 0, snapshot.rows)
+        result = {**snapshot.aggregates.summary(first, snapshot.rows), 'hours': hours}
 
+    for metric, percentiles in _percentiles(since, snapshot, device_id).items():
+        result[metric].update(percentiles)
+    return result
 
-def get_reading_count() -> int:
-    """取得總讀數數量"""
-    data = _load_json()
-    return len(data['readings'])
+
+def query(start: Union[datetime, str] = None, end: Union[datetime, str] = None, fields: Iterable[str] = None,
+          step: float = None, agg: str = 'avg', limit: int = None, order: str = 'asc',
+          device_id: str = None, by_device: bool = False) -> List[Dict[str, Any]]:
+    """
+    通用範圍查詢：時間範圍、欄位選擇、分組聚合與筆數限制都在儲存層完成
+
+    - JSONL：以時間索引二分搜尋範圍，只轉換 limit 內的紀錄；分組以聚合索引計算每組的值（每組 O(log n)），
+      不需讀取範圍內的紀錄
+    - SQLite：單一 SQL（WHERE / GROUP BY / ORDER BY / LIMIT）
+    - 二進位：在 mmap 上二分搜尋，分組以 NumPy 向量運算
+
+    Args:
+        start: 起始時間（含），預設為第一筆
+        end: 結束時間（含），預設為最新一筆
+        fields: 要回傳的指標（METRICS 中的值），預設為全部
+        step: 分組間隔秒數，從 start（未指定時為範圍內第一筆）起每 step 秒一組；None 為回傳原始讀數
+        agg: 分組的聚合函數（QUERY_AGGREGATES）
+        limit: 最多回傳幾筆（或幾組）
+        order: 'asc'（由舊到新）或 'desc'（由新到舊，搭配 limit 即為最近 N 筆）
+        device_id: 只查詢此裝置（JSONL 使用裝置的時間索引與聚合索引），None 為所有裝置
+        by_device: 依裝置分別查詢（device_id 為 None 時為所有裝置），每筆結果加上 device_id，
+                   依裝置名稱排列，limit 套用在每個裝置
+
+    Returns:
+        原始讀數為 id、recorded_at 與 fields；分組為時段起點 recorded_at、筆數 count 與 fields 的聚合值
+        （沒有讀數的時段不回傳）
+
+    Raises:
+        ValueError: 參數不合法
+    """
+    fields = list(fields) if fields else list(METRICS)
+    unknown = [field for field in fields if field not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown} (available: {list(METRICS)})")
+    if agg not in QUERY_AGGREGATES:
+        raise ValueError(f"Unknown aggregate: {agg} (available: {list(QUERY_AGGREGATES)})")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"order must be 'asc' or 'desc', got {order!r}")
+    if step is not None and step <= 0:
+        raise ValueError("step must be positive")
+    if limit is not None and limit < 0:
+        raise ValueError("limit must not be negative")
+
+    # 統一為 ISO 字串（格式錯誤時 fromisoformat 會拋出 ValueError）
+    start = start.isoformat() if isinstance(start, datetime) else start
+    end = end.isoformat() if isinstance(end, datetime) else end
+    for value in (start, end):
+        if value is not None:
+            datetime.fromisoformat(value)
+
+    if by_device:
+        names = [device['device_id'] for device in get_devices()] if device_id is None else [device_id]
+        results = []
+        for name in names:
+            for point in query(start, end, fields, step, agg, limit, order, device_id=name):
+                point['device_id'] = name
+                results.append(point)
+        return results
+
+    descending = order == 'desc'
+    if limit == 0:
+        return []
+    if _store:
+        return _store.query(start, end, fields, step, agg, limit, descending, device_id)
+
+    snapshot = _current()
+    if device_id is not None:
+        index, first, last = _device_range(snapshot, device_id, start, end)
+        if first >= last:
+            return []
+        epochs, aggregates = index.epochs, index.aggregates
+    else:
+        epochs, aggregates = snapshot.epochs, snapshot.aggregates
+        first = bisect_left(epochs, _to_epoch(start), 0, snapshot.rows) if start is not None else 0
+        last = bisect_right(epochs, _to_epoch(end), 0, snapshot.rows) if end is not None else snapshot.rows
+        if first >= last:
+            return []
+
+    if step is None:
+        if limit is not None:
+            first, last = (max(first, last - limit), last) if descending else (first, min(last, first + limit))
+        if device_id is not None:
+            rows = _project_positions(snapshot, snapshot.devices.positions(index, first, last), fields)
+        else:
+            rows = _project_rows(snapshot, first, last, fields)
+        if descending:
+            rows.reverse()
+        return rows
+
+    origin = _to_epoch(start) if start is not None else epochs[first]
+    return _query_buckets(epochs, aggregates, first, last, origin, step, fields, agg, limit, descending)
+
+
+def _project_rows(snapshot: _Snapshot, start: int, stop: int, fields: List[str]) -> List[Dict[str, Any]]:
+    """取得快照中位置 [start, stop) 的紀錄，只保留 id、recorded_at 與 fields（快取內的部分直接讀取欄位）"""
+    rows = []
+    cache_base = snapshot.cache_base
+    if start < cache_base:
+        dropped = [metric for metric in METRICS if metric not in fields] + ['device_id']
+        for reading in _iter_rows(snapshot, start, min(stop, cache_base)):
+            for metric in dropped:
+                reading.pop(metric, None)
+            rows.append(reading)
+        start = cache_base
+    if start < stop:
+        rows.extend(snapshot.cache.project(fields, start - cache_base, stop - cache_base))
+    return rows
+
+
+def _project_positions(snapshot: _Snapshot, positions: List[int], fields: List[str]) -> List[Dict[str, Any]]:
+    """取得快照中指定位置的紀錄，只保留 id、recorded_at 與 fields（裝置的原始讀數查詢使用）"""
+    dropped = [metric for metric in METRICS if metric not in fields] + ['device_id']
+    rows = []
+    for reading in _iter_positions(snapshot, positions):
+        for key in dropped:
+            reading.pop(key, None)
+        rows.append(reading)
+    return rows
+
+
+def _query_buckets(epochs: array, aggregates: AggregateIndex, first: int, last: int, origin: float, step: float,
+                   fields: List[str], agg: str, limit: Optional[int], descending: bool) -> List[Dict[str, Any]]:
+    """
+    以聚合索引計算位置 [first, last) 每 step 秒一組的聚合值
+
+    epochs 與 aggregates 為全域或某個裝置的時間索引與聚合索引。每組的邊界以二分搜尋時間索引取得，
+    只處理有讀數的組；由新到舊時從範圍尾端往回找，因此只需計算 limit 組。
+    """
+    points = []
+
+    def point(bucket: int, start: int, stop: int) -> Dict[str, Any]:
+        result = {'recorded_at': datetime.fromtimestamp(origin + bucket * step).isoformat(), 'count': stop - start}
+        for field in fields:
+            result[field] = aggregates.aggregate(field, start, stop, agg)
+        return result
+
+    if descending:
+        index = last
+        while index > first and (limit is None or len(points) < limit):
+            bucket = math.floor((epochs[index - 1] - origin) / step)
+            begin = min(index - 1, bisect_left(epochs, origin + bucket * step, first, index))
+            points.append(point(bucket, begin, index))
+            index = begin
+    else:
+        index = first
+        while index < last and (limit is None or len(points) < limit):
+            bucket = math.floor((epochs[index] - origin) / step)
+            stop = max(index + 1, bisect_left(epochs, origin + (bucket + 1) * step, index, last))
+            points.append(point(bucket, index, stop))
+            index = stop
+    return points
+
+
+def get_reading_count(device_id: str = None) -> int:
+    """取得總讀數數量（指定 device_id 時為該裝置的筆數）"""
+    if _store:
+        return _store.count(device_id)
+
+    if device_id is None:
+        return _current(indexed=False).rows
+    snapshot = _current()
+    index = snapshot.devices.get(device_id)
+    return snapshot.devices.span(index) if index is not None else 0
+
+
+def get_devices() -> List[Dict[str, Any]]:
+    """
+    取得所有裝置的筆數與最新讀數
+
+    JSONL 後端取自各裝置的索引（每個裝置 O(1)），不需讀取日誌。
+
+    Returns:
+        [{'device_id': 名稱, 'count': 筆數, 'latest': 最新讀數}]，依名稱排序
+    """
+    if _store:
+        return _store.devices()
+
+    snapshot = _current()
+    devices = []
+    for name in snapshot.devices.names():
+        index = snapshot.devices.get(name)
+        latest = snapshot.devices.latest(index)
+        if latest is None:
+            continue
+        position, reading = latest
+        if reading is None:
+            reading = _read_rows(snapshot, position, position + 1)[0]
+        devices.append({'device_id': name, 'count': snapshot.devices.span(index), 'latest': dict(reading)})
+    return devices
 
 
 def get_all_readings() -> List[Dict[str, Any]]:
     """取得所有讀數"""
-    data = _load_json()
-    return data['readings']
+    if _store:
+        return list(_store.iter_all())
+
+    return list(_iter_live())
 
 
 def cleanup_old_data(days: int = 30) -> int:
     """
     清理超過 N 天的舊數據
-    
+
+    完全過期的分段檔直接刪除；跨越刪除時間的分段只在中繼資料中記錄刪除範圍。
+    1 分鐘彙總另外只保留 ROLLUP_1M_DAYS 天（重寫彙總檔）；1 小時與 1 天彙總不會被刪除，
+    長期圖表仍可使用。
+
     Args:
         days: 保留的天數
-    
+
     Returns:
         刪除的記錄數
     """
-    data = _load_json()
-    cutoff = datetime.now() - timedelta(days=days)
-    
-    original_count = len(data['readings'])
-    
-    # 過濾保留的數據
-    data['readings'] = [
-        r for r in data['readings']
-        if datetime.fromisoformat(r['recorded_at']) >= cutoff
-    ]
-    
-    deleted = original_count - len(data['readings'])
-    
-    if deleted > 0:
-        _save_json(data)
-        # 重建 CSV
-        _rebuild_csv(data['readings'])
-        print(f"[CLEANUP] Deleted {deleted} records older than {days} days")
-    
-    return deleted
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+
+    with _write_lock:
+        _cleanup_rollups()
+
+        if _store:
+            deleted = _store.delete_before(cutoff)
+            if deleted > 0:
+                print(f"[CLEANUP] Deleted {deleted} records older than {days} days")
+            return deleted
+
+        _load_state()
+
+        # 索引依時間排序，二分搜尋即可得知過期紀錄數
+        global _epochs
+        cutoff_epoch = _to_epoch(cutoff)
+        deleted = bisect_left(_epochs, cutoff_epoch)
+
+        if deleted > 0:
+            meta = _state['meta']
+            meta['deleted_before'] = cutoff
+            _save_meta(meta)
+
+            # 以新的陣列取代，讀取中的快照仍使用刪除前的索引
+            _evict_cache(cutoff_epoch)
+            next_epoch = _epochs[deleted] if deleted < len(_epochs) else None
+            _epochs = _epochs[deleted:]
+            removed = _segments.drop_prefix(deleted, next_epoch)
+            _aggregates.drop_prefix(deleted)
+            _devices.drop_prefix(deleted)
+            _state['cache_base'] = max(0, _state['cache_base'] - deleted)
+            _state['rows'] = len(_epochs)
+            if not _epochs:
+                _state['latest'] = None
+            _publish()
+            print(f"[CLEANUP] Deleted {deleted} records older than {days} days ({removed} segment files removed)")
+            _save_checkpoint()
+
+        return deleted
+
+
+def _cleanup_rollups():
+    """刪除超過 ROLLUP_1M_DAYS 天的 1 分鐘彙總（呼叫端持有寫入鎖）"""
+    _load_rollups()
+    cutoff_epoch = (datetime.now() - timedelta(days=ROLLUP_1M_DAYS)).timestamp()
+    dropped = _rollups.get('1m').drop_before(cutoff_epoch)
+    if dropped > 0:
+        print(f"[CLEANUP] Deleted {dropped} 1-minute rollups older than {ROLLUP_1M_DAYS} days")
 
 
 def clear_all_data() -> int:
     """
     永久清空所有數據
-    
+
     Returns:
         刪除的記錄數
     """
-    data = _load_json()
-    deleted_count = len(data['readings'])
-    
-    # 清空所有數據
-    data['readings'] = []
-    data['metadata']['last_cleared'] = datetime.now().isoformat()
-    _save_json(data)
-    
-    # 重建空的 CSV
-    _rebuild_csv([])
-    
-    print(f"[CLEAR] Permanently deleted {deleted_count} records")
-    return deleted_count
-
-
-def _rebuild_csv(readings: List[Dict]):
-    """重建 CSV 檔案"""
-    with open(CSV_FILE, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.writer(f)
-        writer.writerow(['id', 'temperature', 'humidity', 'heat_index', 'air_quality', 'recorded_at'])
-        for reading in readings:
-            writer.writerow([
-                reading['id'],
-                reading['temperature'],
-                reading['humidity'],
-                reading.get('heat_index', ''),
-                reading.get('air_quality', ''),
-                reading['recorded_at']
-            ])
+    with _write_lock:
+        _rollups.clear()
+
+        if _store:
+            deleted_count = _store.clear()
+            print(f"[CLEAR] Permanently deleted {deleted_count} records")
+            return deleted_count
+
+        _load_state()
+        global _epochs
+        deleted_count = len(_epochs)
+
+        # 刪除所有分段檔
+        _segments.clear()
+
+        meta = _state['meta']
+        meta['deleted_before'] = None
+        meta['next_id'] = _state['next_id']
+        meta['last_cleared'] = datetime.now().isoformat()
+        _save_meta(meta)
 
+        _epochs = array('d')
+        _aggregates.clear()
+        _cache.clear()
+        _devices.clear()
+        _state['cache_base'] = 0
+        _state['rows'] = 0
+        _state['latest'] = None
+        _publish()
+        _save_checkpoint()
 
-def export_to_csv(filepath: str = None) -> str:
+        print(f"[CLEAR] Permanently deleted {deleted_count} records")
+        return deleted_count
+
+
+def save_checkpoint():
     """
-    匯出數據到 CSV 檔案
-    
+    立即寫入檢查點（程式結束前呼叫，下次啟動不需要重新讀取之後附加的紀錄）
+    """
+    with _write_lock:
+        _save_checkpoint()
+
+
+def export_to_csv(filepath: str = None, start: Union[datetime, str] = None,
+                  end: Union[datetime, str] = None) -> str:
+    """
+    以串流方式匯出數據到 CSV 檔案（路徑以 .gz 結尾時壓縮）
+
     Args:
         filepath: 輸出路徑（預設使用標準 CSV 檔案）
-    
+        start: 只匯出此時間（含）之後的讀數
+        end: 只匯出此時間（含）之前的讀數
+
     Returns:
         輸出的檔案路徑
     """
     if filepath is None:
         filepath = CSV_FILE
-    
-    data = _load_json()
-    
-    with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.writer(f)
-        writer.writerow(['id', 'temperature', 'humidity', 'heat_index', 'air_quality', 'recorded_at'])
-        for reading in data['readings']:
-            writer.writerow([
-                reading['id'],
-                reading['temperature'],
-                reading['humidity'],
-                reading.get('heat_index', ''),
-                reading.get('air_quality', ''),
-                reading['recorded_at']
-            ])
-    
-    print(f"[EXPORT] Exported {len(data['readings'])} records to {filepath}")
+
+    started = time.perf_counter()
+    count = csv_stream.write_rows(filepath, iter_readings_between(start, end), CSV_HEADER)
+    elapsed = time.perf_counter() - started
+
+    print(f"[EXPORT] Exported {count} records to {filepath} ({count / max(elapsed, 1e-6):,.0f} rows/s)")
     return str(filepath)
 
 
-def import_from_csv(filepath: str) -> int:
+def export_to_parquet(directory: str = None, overwrite: bool = False) -> int:
     """
-    從 CSV 檔案匯入數據
-    
+    將已結束的每一天匯出為依日期分區的 Parquet 檔（需安裝 pyarrow）
+
+    已存在的分區預設略過，因此可重複呼叫，只會寫入新封存的天數；
+    清理舊數據不會刪除 Parquet 封存。
+
+    Args:
+        directory: 輸出目錄（預設 data/parquet/）
+        overwrite: 重新匯出已存在的分區
+
+    Returns:
+        寫入的記錄數
+    """
+    if not analytics.can_export():
+        print("[WARN] pyarrow not installed, Parquet export skipped")
+        return 0
+
+    directory = Path(directory) if directory else PARQUET_DIR
+    today = datetime.now().date()
+    first = next(iter_readings_between(), None)
+
+    started = time.perf_counter()
+    exported = 0
+    partitions = 0
+    day = datetime.fromisoformat(first['recorded_at']).date() if first else today
+
+    with _export_lock:
+        while day < today:
+            path = analytics.partition_path(directory, day)
+            if overwrite or not path.exists():
+                day_start = datetime.combine(day, datetime.min.time())
+                day_end = day_start + timedelta(days=1) - timedelta(microseconds=1)
+                rows = analytics.write_partition(path, iter_readings_between(day_start, day_end))
+                if rows:
+                    exported += rows
+                    partitions += 1
+            day += timedelta(days=1)
+
+        if directory == PARQUET_DIR:
+            _export_status['exported_through'] = today - timedelta(days=1)
+            _export_status['finished_at'] = datetime.now()
+
+    if partitions:
+        elapsed = time.perf_counter() - started
+        print(f"[EXPORT] {exported} records in {partitions} Parquet partitions -> {directory} "
+              f"({exported / max(elapsed, 1e-9):,.0f} rows/s)")
+    return exported
+
+
+def get_export_status() -> Dict[str, Any]:
+    """
+    取得 Parquet 封存的狀態
+
+    尚未在這次執行中完成匯出時，以 PARQUET_DIR 中最新的分區判斷已匯出到哪一天。
+
+    Returns:
+        exported_through: 已匯出到哪一天（ISO 日期或 None）
+        last_export: 最近一次完成匯出的時間（ISO 字串或 None）
+        stale: 昨天以前的數據是否尚未全部匯出
+    """
+    exported_through = _export_status['exported_through'] or analytics.latest_partition(PARQUET_DIR)
+    finished_at = _export_status['finished_at']
+    yesterday = datetime.now().date() - timedelta(days=1)
+    return {
+        'exported_through': exported_through.isoformat() if exported_through else None,
+        'last_export': finished_at.isoformat() if finished_at else None,
+        'stale': exported_through is None or exported_through < yesterday
+    }
+
+
+def import_from_csv(filepath: str, chunk_size: int = csv_stream.IMPORT_CHUNK_ROWS,
+                    keep_timestamps: bool = False) -> int:
+    """
+    以串流方式從 CSV 檔案匯入數據（路徑以 .gz 結尾時解壓縮）
+
+    每 chunk_size 筆以 insert_readings 提交一次，記憶體用量與檔案大小無關。
+
     Args:
         filepath: CSV 檔案路徑
-    
+        chunk_size: 每批提交的筆數
+        keep_timestamps: 保留檔案中的 recorded_at（預設以匯入時間記錄）；
+                         不晚於現有最新讀數的紀錄視為已存在而略過
+
     Returns:
         匯入的記錄數
     """
+    newest = None
+    if keep_timestamps:
+        latest = get_latest_reading()
+        newest = _to_epoch(latest['recorded_at']) if latest else None
+
+    def readings():
+        for row in csv_stream.read_rows(filepath):
+            reading = {
+                'temperature': float(row['temperature']),
+                'humidity': float(row['humidity']),
+                'heat_index': float(row['heat_index']) if row.get('heat_index') else None,
+                'air_quality': float(row['air_quality']) if row.get('air_quality') else None,
+                'device_id': row.get('device_id') or None
+            }
+            if keep_timestamps:
+                if newest is not None and _to_epoch(row['recorded_at']) <= newest:
+                    continue
+                reading['recorded_at'] = row['recorded_at']
+            yield reading
+
     imported = 0
-    
-    with open(filepath, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            insert_reading(
-                float(row['temperature']),
-                float(row['humidity']),
-                float(row['heat_index']) if row.get('heat_index') else None,
-                float(row['air_quality']) if row.get('air_quality') else None
-            )
-            imported += 1
-    
-    print(f"[IMPORT] Imported {imported} records")
+    started = time.perf_counter()
+    for chunk in csv_stream.chunked(readings(), chunk_size):
+        imported += insert_readings(chunk)
+    elapsed = time.perf_counter() - started
+
+    print(f"[IMPORT] Imported {imported} records ({imported / max(elapsed, 1e-6):,.0f} rows/s)")
     return imported
 
 
+# ========== 非同步 API ==========
+
+def _get_executor() -> ThreadPoolExecutor:
+    """取得非同步 API 的背景執行緒池（單例模式）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, DB_ASYNC_WORKERS),
+                                               thread_name_prefix='db-async')
+    return _executor
+
+
+def _record_latency(name: str, started: float):
+    """記錄一次非同步呼叫的延遲（包含在背景執行緒排隊的時間）"""
+    samples = _async_latency.get(name)
+    if samples is None:
+        samples = _async_latency.setdefault(name, deque(maxlen=ASYNC_LATENCY_SAMPLES))
+    samples.append(time.perf_counter() - started)
+
+
+async def _run(func, *args, **kwargs):
+    """在背景執行緒中執行同步查詢，不阻塞事件迴圈"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+    finally:
+        _record_latency(func.__name__, started)
+
+
+def _snapshot_ready(indexed: bool = False) -> bool:
+    """JSONL 後端已發布快照（最新讀數與筆數可直接取得，不需讀取磁碟；indexed 時還需已載入索引）"""
+    return _store is None and _snapshot is not None and (not indexed or _snapshot.epochs is not None)
+
+
+async def aget_latest_reading(device_id: str = None) -> Optional[Dict[str, Any]]:
+    """get_latest_reading 的非同步版本（JSONL 後端直接取自快照）"""
+    if _snapshot_ready(device_id is not None):
+        started = time.perf_counter()
+        reading = get_latest_reading(device_id)
+        _record_latency('get_latest_reading', started)
+        return reading
+    return await _run(get_latest_reading, device_id)
+
+
+async def aget_reading_count(device_id: str = None) -> int:
+    """get_reading_count 的非同步版本（JSONL 後端直接取自快照）"""
+    if _snapshot_ready(device_id is not None):
+        started = time.perf_counter()
+        count = get_reading_count(device_id)
+        _record_latency('get_reading_count', started)
+        return count
+    return await _run(get_reading_count, device_id)
+
+
+async def aget_recent(n: int = 10, device_id: str = None) -> List[Dict[str, Any]]:
+    """get_recent 的非同步版本（JSONL 後端在最近 n 筆都在記憶體快取內時直接取自快照）"""
+    snapshot = _snapshot
+    if (device_id is None and _snapshot_ready(indexed=n > 1)
+            and (n <= 1 or snapshot.rows - n >= snapshot.cache_base)):
+        started = time.perf_counter()
+        readings = get_recent(n)
+        _record_latency('get_recent', started)
+        return readings
+    return await _run(get_recent, n, device_id)
+
+
+async def aget_devices() -> List[Dict[str, Any]]:
+    """get_devices 的非同步版本"""
+    return await _run(get_devices)
+
+
+async def aget_readings_between(start: Union[datetime, str], end: Union[datetime, str] = None,
+                                device_id: str = None) -> List[Dict[str, Any]]:
+    """get_readings_between 的非同步版本"""
+    return await _run(get_readings_between, start, end, device_id)
+
+
+async def aget_readings_by_hours(hours: int = 24, device_id: str = None) -> List[Dict[str, Any]]:
+    """get_readings_by_hours 的非同步版本"""
+    return await _run(get_readings_by_hours, hours, device_id)
+
+
+async def aget_history(hours: float = 24, points: int = HISTORY_POINTS, device_id: str = None) -> Dict[str, Any]:
+    """get_history 的非同步版本"""
+    return await _run(get_history, hours, points, device_id)
+
+
+async def aget_statistics(hours: int = 24, device_id: str = None) -> Dict[str, Any]:
+    """get_statistics 的非同步版本"""
+    return await _run(get_statistics, hours, device_id)
+
+
+async def aquery(start: Union[datetime, str] = None, end: Union[datetime, str] = None, fields: Iterable[str] = None,
+                 step: float = None, agg: str = 'avg', limit: int = None, order: str = 'asc',
+                 device_id: str = None, by_device: bool = False) -> List[Dict[str, Any]]:
+    """query 的非同步版本"""
+    return await _run(query, start, end, fields, step, agg, limit, order, device_id, by_device)
+
+
+def get_async_stats() -> Dict[str, Dict[str, float]]:
+    """
+    取得非同步 API 最近的呼叫延遲
+
+    Returns:
+        函數名稱對應 {'calls', 'p50_ms', 'p99_ms', 'max_ms'}（最近 ASYNC_LATENCY_SAMPLES 次）
+    """
+    result = {}
+    for name, samples in list(_async_latency.items()):
+        values = sorted(samples)
+        if not values:
+            continue
+        result[name] = {
+            'calls': len(values),
+            'p50_ms': round(values[len(values) // 2] * 1000, 2),
+            'p99_ms': round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2)
+        }
+    return result
+
+
 if __name__ == "__main__":
     # 測試
     print("=== 資料儲存測試 ===")
-    
+
     init_database()
-    
+
     # 插入測試數據
     for i in range(5):
         temp = 20 + i * 2
         humidity = 50 + i * 5
         record_id = insert_reading(temp, humidity, temp + 1)
         print(f"  插入 ID {record_id}: {temp}°C, {humidity}%")
-    
+
     # 查詢
     print(f"\n最新讀數: {get_latest_reading()}")
     print(f"總數量: {get_reading_count()}")
     print(f"統計: {get_statistics(24)}")
-    
+
     print(f"\n[INFO] Data file locations:")
-    print(f"   JSON: {JSON_FILE.absolute()}")
-    print(f"   CSV:  {CSV_FILE.absolute()}")
+    if isinstance(_store, SQLiteStore):
+        print(f"   SQLite: {SQLITE_FILE.absolute()}")
+    elif _store:
+        print(f"   Binary: {BINARY_FILE.absolute()}")
+    else:
+        print(f"   JSONL + CSV: {SEGMENT_DIR.absolute()}")
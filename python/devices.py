@@ -0,0 +1,199 @@
+"""
+裝置索引模組 - 多個感測節點的時間索引、聚合索引與最新讀數
+生物機電工程概論 期末專題
+
+每筆讀數都帶有 device_id（舊數據沒有此欄位時視為 DEFAULT_DEVICE）。
+database.py 的 JSONL 後端除了全域的時間索引外，為每個裝置維護：
+- rows：該裝置每筆紀錄的絕對序號（全域位置 + 已清理的筆數），清理舊數據時不必改寫
+- epochs：對應的時間（遞增，二分搜尋時間範圍）
+- aggregates：與 rows 平行的聚合索引（agg_index.py），裝置的任意範圍統計為 O(log n)
+- latest：最新一筆讀數
+
+新增讀數只需一次 dict 查詢與幾次 array 附加，與裝置數量無關；
+取得快照（view）也只記錄目前的字典與筆數，不會逐一複製裝置。
+新增裝置與清理舊數據時以新的字典取代（copy-on-write），讀取中的快照不受影響。
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Tuple
+
+from agg_index import AggregateIndex
+
+
+# 沒有 device_id 的讀數（單一節點時代的舊數據）所屬的裝置
+DEFAULT_DEVICE = 'default'
+
+
+class DeviceIndex:
+    """單一裝置的索引"""
+
+    __slots__ = ('rows', 'epochs', 'aggregates', 'latest')
+
+    def __init__(self):
+        self.rows = array('q')
+        self.epochs = array('d')
+        self.aggregates = AggregateIndex()
+        self.latest: Optional[Tuple[int, Dict[str, Any]]] = None  # (絕對序號, 讀數)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class DeviceView:
+    """某個快照中的裝置索引（唯讀；只看得到快照範圍內的紀錄）"""
+
+    __slots__ = ('devices', 'dropped', 'bound')
+
+    def __init__(self, devices: Dict[str, DeviceIndex], dropped: int, rows: int):
+        self.devices = devices
+        self.dropped = dropped
+        self.bound = dropped + rows
+
+    def names(self) -> List[str]:
+        """所有裝置名稱（排序）"""
+        return sorted(self.devices)
+
+    def get(self, device_id: str) -> Optional[DeviceIndex]:
+        """取得裝置索引，沒有此裝置時為 None"""
+        return self.devices.get(device_id)
+
+    def span(self, index: DeviceIndex) -> int:
+        """裝置在快照範圍內的筆數（寫入者之後附加的紀錄不計入）"""
+        rows = index.rows
+        count = len(rows)
+        if count and rows[count - 1] >= self.bound:
+            count = bisect_left(rows, self.bound, 0, count)
+        return count
+
+    def range(self, index: DeviceIndex, start: float = None, end: float = None) -> Tuple[int, int]:
+        """
+        裝置索引中時間範圍對應的位置
+
+        Args:
+            start, end: epoch 秒數（含），None 為不限
+
+        Returns:
+            (起始位置, 結束位置)，為裝置索引中的位置（非全域位置）
+        """
+        count = self.span(index)
+        first = bisect_left(index.epochs, start, 0, count) if start is not None else 0
+        last = bisect_right(index.epochs, end, 0, count) if end is not None else count
+        return first, max(first, last)
+
+    def positions(self, index: DeviceIndex, first: int, last: int) -> List[int]:
+        """裝置索引位置 [first, last) 對應的全域位置"""
+        dropped = self.dropped
+        return [row - dropped for row in index.rows[first:last]]
+
+    def latest(self, index: DeviceIndex) -> Optional[Tuple[int, Optional[Dict[str, Any]]]]:
+        """
+        裝置在快照中的最新讀數
+
+        Returns:
+            (全域位置, 讀數)；寫入者剛附加了快照之後的讀數時，讀數為 None（呼叫端改以位置讀取）；
+            快照中沒有此裝置的紀錄時為 None
+        """
+        latest = index.latest
+        if latest is not None and latest[0] < self.bound:
+            return latest[0] - self.dropped, latest[1]
+        count = self.span(index)
+        if count == 0:
+            return None
+        return index.rows[count - 1] - self.dropped, None
+
+
+class DeviceIndexes:
+    """所有裝置的索引（寫入者維護，讀取端使用 view()）"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """清空（以新的字典取代）"""
+        self.devices: Dict[str, DeviceIndex] = {}
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def append(self, device_id: str, position: int, epoch: float, reading: Dict[str, Any]):
+        """
+        加入一筆紀錄
+
+        Args:
+            device_id: 裝置名稱
+            position: 紀錄在全域時間索引中的位置
+            epoch: 時間索引中的時間（已維持遞增）
+            reading: 讀數
+        """
+        index = self.devices.get(device_id)
+        if index is None:
+            index = DeviceIndex()
+            self.devices = {**self.devices, device_id: index}
+        row = self.dropped + position
+        index.rows.append(row)
+        index.epochs.append(epoch)
+        index.aggregates.append(reading)
+        index.latest = (row, reading)
+
+    def view(self, rows: int) -> DeviceView:
+        """目前狀態的唯讀快照（rows 為全域有效紀錄數）"""
+        return DeviceView(self.devices, self.dropped, rows)
+
+    def drop_prefix(self, count: int):
+        """
+        刪除全域最前面 count 筆
+
+        只有含被刪除紀錄的裝置會建立新的索引，其餘沿用原本的物件（序號是絕對的）；
+        所有紀錄都被刪除的裝置會被移除。
+        """
+        self.dropped += count
+        devices = {}
+        for name, index in self.devices.items():
+            cut = bisect_left(index.rows, self.dropped)
+            if cut == 0:
+                devices[name] = index
+                continue
+            if cut >= len(index.rows):
+                continue
+            trimmed = DeviceIndex()
+            trimmed.rows = index.rows[cut:]
+            trimmed.epochs = index.epochs[cut:]
+            trimmed.aggregates = index.aggregates.snapshot()
+            trimmed.aggregates.drop_prefix(cut)
+            trimmed.latest = index.latest
+            devices[name] = trimmed
+        self.devices = devices
+
+    def header(self) -> Dict[str, Any]:
+        """可轉為 JSON 的狀態（寫入檢查點標頭用）"""
+        names = list(self.devices)
+        return {
+            'names': names,
+            'dropped': self.dropped,
+            'latest': [self.devices[name].latest for name in names]
+        }
+
+    def arrays(self) -> Dict[str, array]:
+        """各裝置的陣列（寫入檢查點用，名稱為 <裝置順序>.<陣列>）"""
+        result = {}
+        for i, index in enumerate(self.devices.values()):
+            result[f'{i}.rows'] = index.rows
+            result[f'{i}.epochs'] = index.epochs
+            result.update((f'{i}.agg.{name}', values) for name, values in index.aggregates.arrays().items())
+        return result
+
+    def restore(self, header: Dict[str, Any], arrays: Dict[str, array]):
+        """從 header() 與 arrays() 的結果還原（讀取檢查點用）"""
+        devices = {}
+        keys = list(AggregateIndex().arrays())
+        for i, (name, latest) in enumerate(zip(header['names'], header['latest'])):
+            index = DeviceIndex()
+            index.rows = arrays[f'{i}.rows']
+            index.epochs = arrays[f'{i}.epochs']
+            index.aggregates.restore({key: arrays[f'{i}.agg.{key}'] for key in keys})
+            index.latest = tuple(latest) if latest is not None else None
+            devices[name] = index
+        self.devices = devices
+        self.dropped = header['dropped']
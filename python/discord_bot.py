@@ -6,19 +6,21 @@ Discord Bot 模組 - 互動指令
 import discord
 from discord import app_commands
 from discord.ext import commands
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import asyncio
 import io
+import time
 import matplotlib
 matplotlib.use('Agg')  # 使用非 GUI 後端
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from typing import Optional
+from typing import Optional, Tuple
 
-from config import DISCORD_BOT_TOKEN, BOT_COMMAND_PREFIX
+from config import DISCORD_BOT_TOKEN, BOT_COMMAND_PREFIX, SERIAL_COMMAND_TIMEOUT
 import database as db
 import gemini_ai
+from serial_manager import SerialManager
 
 
 class SensorBot(commands.Bot):
@@ -45,6 +47,30 @@ class SensorBot(commands.Bot):
         """設定 Arduino 讀取器實例"""
         self.arduino_reader = reader
     
+    async def _arduino_command(self, command: str) -> Tuple[int, int, float]:
+        """
+        發送指令並等待 Arduino 確認（不阻塞事件迴圈）
+        
+        Args:
+            command: 指令字串（如 "BUZZ"）
+        
+        Returns:
+            (確認的 Arduino 數, 發送的 Arduino 數, 等待毫秒數)
+        """
+        started = time.perf_counter()
+        replies = await self.arduino_reader.acommand(command)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # SerialManager 回傳各埠的回應
+        replies = list(replies.values()) if isinstance(self.arduino_reader, SerialManager) else [replies]
+        return sum(reply is not None for reply in replies), len(replies), elapsed_ms
+    
+    @staticmethod
+    def _ack_text(acked: int, total: int, elapsed_ms: float) -> str:
+        """確認狀態的說明文字"""
+        if acked == total:
+            return f"✅ Arduino 已確認（{elapsed_ms:.0f} ms）"
+        return f"⚠️ {acked} / {total} 個 Arduino 已確認（{elapsed_ms:.0f} ms）"
+    
     async def setup_hook(self):
         """Bot 啟動時的鉤子，用於同步指令"""
         # 從環境變數讀取 GUILD_ID（用於 guild-specific commands）
@@ -116,7 +142,7 @@ class SensorBot(commands.Bot):
             if ctx.interaction:
                 await ctx.defer()
 
-            reading = db.get_latest_reading()
+            reading = await db.aget_latest_reading()
             
             if not reading:
                 await ctx.send("❌ 目前沒有數據，請確認感測器是否正常運作")
@@ -166,18 +192,22 @@ class SensorBot(commands.Bot):
             elif hours > 168:  # 最多 7 天
                 hours = 168
             
-            readings = db.get_readings_by_hours(hours)
+            # 筆數以單一分組查詢計算，顯示的最近 10 筆直接從尾端讀取，不載入整段歷史
+            since = datetime.now() - timedelta(hours=hours)
+            buckets = await db.aquery(since, fields=['temperature'], step=hours * 3600, agg='count')
+            total = sum(bucket['count'] for bucket in buckets)
             
-            if not readings:
+            if not total:
                 await ctx.send(f"❌ 過去 {hours} 小時沒有數據")
                 return
             
             # 取最近 10 筆顯示
-            recent = readings[-10:]
+            recent = [reading for reading in await db.aget_recent(10)
+                      if datetime.fromisoformat(str(reading['recorded_at'])) >= since]
             
             embed = discord.Embed(
                 title=f"📜 過去 {hours} 小時歷史數據",
-                description=f"共 {len(readings)} 筆記錄，顯示最近 {len(recent)} 筆",
+                description=f"共 {total} 筆記錄，顯示最近 {len(recent)} 筆",
                 color=0x00BFFF
             )
             
@@ -203,7 +233,7 @@ class SensorBot(commands.Bot):
             elif hours > 168:
                 hours = 168
             
-            stats = db.get_statistics(hours)
+            stats = await db.aget_statistics(hours)
             
             if stats['count'] == 0:
                 await ctx.send(f"❌ 過去 {hours} 小時沒有數據")
@@ -218,14 +248,14 @@ class SensorBot(commands.Bot):
             temp = stats['temperature']
             embed.add_field(
                 name="🌡️ 溫度統計",
-                value=f"平均: **{temp['avg']}°C**\n最低: {temp['min']}°C\n最高: {temp['max']}°C",
+                value=f"平均: **{temp['avg']}°C**\n最低: {temp['min']}°C\n最高: {temp['max']}°C\n標準差: {temp['stddev']}°C\nP5 / P50 / P95: {temp['p5']} / {temp['p50']} / {temp['p95']}°C",
                 inline=True
             )
             
             hum = stats['humidity']
             embed.add_field(
                 name="💧 濕度統計",
-                value=f"平均: **{hum['avg']}%**\n最低: {hum['min']}%\n最高: {hum['max']}%",
+                value=f"平均: **{hum['avg']}%**\n最低: {hum['min']}%\n最高: {hum['max']}%\n標準差: {hum['stddev']}%\nP5 / P50 / P95: {hum['p5']} / {hum['p50']} / {hum['p95']}%",
                 inline=True
             )
             
@@ -240,10 +270,11 @@ class SensorBot(commands.Bot):
 
             if hours < 1:
                 hours = 1
-            elif hours > 48:
-                hours = 48
+            elif hours > 720:
+                hours = 720
             
-            readings = db.get_readings_by_hours(hours)
+            # 長時間範圍自動改用 1 分鐘 / 1 小時 / 1 天彙總
+            readings = (await db.aget_history(hours))['data']
             
             if len(readings) < 2:
                 await ctx.send(f"❌ 數據不足，無法生成圖表（需要至少 2 筆數據）")
@@ -278,7 +309,7 @@ class SensorBot(commands.Bot):
             ax2.legend(loc='upper right')
             
             # 格式化 X 軸時間
-            ax2.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            ax2.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M' if hours <= 48 else '%m/%d'))
             ax2.xaxis.set_major_locator(mdates.AutoDateLocator())
             plt.xticks(rotation=45)
             
@@ -308,8 +339,8 @@ class SensorBot(commands.Bot):
             if ctx.interaction:
                 await ctx.defer()
                 
-            total_count = db.get_reading_count()
-            latest = db.get_latest_reading()
+            total_count = await db.aget_reading_count()
+            latest = await db.aget_latest_reading()
             
             embed = discord.Embed(
                 title="⚙️ 系統狀態",
@@ -341,6 +372,18 @@ class SensorBot(commands.Bot):
                     inline=True
                 )
             
+            # 最近的資料庫查詢延遲（p50 / p99）
+            latency = db.get_async_stats()
+            if latency:
+                embed.add_field(
+                    name="⏱️ 查詢延遲 (p50 / p99)",
+                    value="\n".join(
+                        f"`{name}`: {values['p50_ms']} / {values['p99_ms']} ms"
+                        for name, values in sorted(latency.items())
+                    ),
+                    inline=False
+                )
+            
             embed.set_footer(text="DHT 感測器監測系統")
             
             await ctx.send(embed=embed)
@@ -362,13 +405,13 @@ class SensorBot(commands.Bot):
             
             mode_lower = mode.lower()
             if mode_lower in ['on', 'true', 'enable', '1']:
-                success = self.arduino_reader.send_command("SILENT_ON")
+                acked, total, elapsed_ms = await self._arduino_command("SILENT_ON")
                 status_text = "已開啟 (ON)"
             else:
-                success = self.arduino_reader.send_command("SILENT_OFF")
+                acked, total, elapsed_ms = await self._arduino_command("SILENT_OFF")
                 status_text = "已關閉 (OFF)"
             
-            if success:
+            if acked:
                 embed = discord.Embed(
                     title="🔇 靜音模式設定",
                     description=f"靜音模式 {status_text}",
@@ -376,10 +419,11 @@ class SensorBot(commands.Bot):
                 )
                 if mode_lower in ['on', 'true', 'enable', '1']:
                     embed.add_field(name="說明", value="蜂鳴器將停止運作，但在危險狀況下 LED 仍會閃爍。", inline=False)
+                embed.set_footer(text=self._ack_text(acked, total, elapsed_ms))
                 
                 await ctx.send(embed=embed)
             else:
-                await ctx.send("❌ 設定失敗，請稍後再試")
+                await ctx.send(f"❌ 設定失敗：Arduino 在 {SERIAL_COMMAND_TIMEOUT:g} 秒內沒有確認，請稍後再試")
 
         @self.hybrid_command(name='buzz', aliases=['蜂鳴', '警報', 'alarm'], description="手動觸發蜂鳴器警報")
         async def buzz_command(ctx):
@@ -399,12 +443,12 @@ class SensorBot(commands.Bot):
             
             # 發送指令到 Arduino
             try:
-                success = self.arduino_reader.send_command("BUZZ")
+                acked, total, elapsed_ms = await self._arduino_command("BUZZ")
                 
-                if success:
+                if acked:
                     embed = discord.Embed(
                         title="🔔 蜂鳴器已觸發!",
-                        description="已成功獲送指令到 Arduino，蜂鳴器應該正在響起！",
+                        description="Arduino 已收到指令，蜂鳴器正在響起！",
                         color=0xFF6600
                     )
                     embed.add_field(
@@ -412,10 +456,11 @@ class SensorBot(commands.Bot):
                         value="• 溫度 > 35°C 或 < 15°C\n• 濕度 > 85% 或 < 20%",
                         inline=False
                     )
+                    embed.set_footer(text=self._ack_text(acked, total, elapsed_ms))
                 else:
                     embed = discord.Embed(
-                        title="❌ 發送失敗",
-                        description="無法發送指令到 Arduino，請檢查連接狀態。",
+                        title="❌ 沒有回應",
+                        description=f"Arduino 在 {SERIAL_COMMAND_TIMEOUT:g} 秒內沒有確認指令，請檢查連接狀態。",
                         color=0xFF0000
                     )
                 
@@ -491,9 +536,9 @@ class SensorBot(commands.Bot):
             
             # 發送指令到 Arduino
             try:
-                success = self.arduino_reader.send_command(f"SET_COLOR:{r},{g},{b}")
+                acked, total, elapsed_ms = await self._arduino_command(f"SET_COLOR:{r},{g},{b}")
                 
-                if success:
+                if acked:
                     # 計算顏色的 hex 值以顯示
                     color_hex = (r << 16) | (g << 8) | b
                     embed = discord.Embed(
@@ -502,10 +547,11 @@ class SensorBot(commands.Bot):
                         color=color_hex
                     )
                     embed.add_field(name="💡 提示", value="使用 `/autocolor` 可切回自動模式", inline=False)
+                    embed.set_footer(text=self._ack_text(acked, total, elapsed_ms))
                 else:
                     embed = discord.Embed(
-                        title="❌ 發送失敗",
-                        description="無法發送指令到 Arduino。",
+                        title="❌ 沒有回應",
+                        description=f"Arduino 在 {SERIAL_COMMAND_TIMEOUT:g} 秒內沒有確認指令。",
                         color=0xFF0000
                     )
                 
@@ -530,18 +576,19 @@ class SensorBot(commands.Bot):
                 return
             
             try:
-                success = self.arduino_reader.send_command("AUTO_COLOR")
+                acked, total, elapsed_ms = await self._arduino_command("AUTO_COLOR")
                 
-                if success:
+                if acked:
                     embed = discord.Embed(
                         title="🔄 已切回自動模式",
                         description="LED 將根據環境品質自動變色\n🟢 良好 → 🔵 普通 → 🔴 警報",
                         color=0x00FF00
                     )
+                    embed.set_footer(text=self._ack_text(acked, total, elapsed_ms))
                 else:
                     embed = discord.Embed(
-                        title="❌ 發送失敗",
-                        description="無法發送指令到 Arduino。",
+                        title="❌ 沒有回應",
+                        description=f"Arduino 在 {SERIAL_COMMAND_TIMEOUT:g} 秒內沒有確認指令。",
                         color=0xFF0000
                     )
                 
@@ -570,18 +617,19 @@ class SensorBot(commands.Bot):
                 return
             
             try:
-                success = self.arduino_reader.send_command(f"SET_BUZZER:{times}")
+                acked, total, elapsed_ms = await self._arduino_command(f"SET_BUZZER:{times}")
                 
-                if success:
+                if acked:
                     embed = discord.Embed(
                         title="🔔 蜂鳴器已觸發!",
                         description=f"響鈴次數：**{times}** 次",
                         color=0xFF6600
                     )
+                    embed.set_footer(text=self._ack_text(acked, total, elapsed_ms))
                 else:
                     embed = discord.Embed(
-                        title="❌ 發送失敗",
-                        description="無法發送指令到 Arduino。",
+                        title="❌ 沒有回應",
+                        description=f"Arduino 在 {SERIAL_COMMAND_TIMEOUT:g} 秒內沒有確認指令。",
                         color=0xFF0000
                     )
                 
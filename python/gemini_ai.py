@@ -4,11 +4,15 @@ Gemini AI 模組 - 智慧對話功能
 """
 
 import google.generativeai as genai
+from datetime import datetime
 from typing import Optional
 import database as db
 from config import GEMINI_API_KEY
 
 
+# 上下文中附上的最近讀數筆數（讓 AI 看得到短期趨勢）
+RECENT_READINGS = 6
+
 # 系統提示詞
 SYSTEM_PROMPT = """你是一個溫濕度監測系統的 AI 助手。你的任務是：
 1. 回答用戶關於溫度、濕度、環境舒適度的問題
@@ -42,14 +46,21 @@ class GeminiAI:
             print(f"[AI] Failed to initialize Gemini: {e}")
             self.enabled = False
     
-    def _get_sensor_context(self) -> str:
-        """取得感測器數據上下文"""
-        latest = db.get_latest_reading()
-        stats = db.get_statistics(24)
+    async def _get_sensor_context(self) -> str:
+        """取得感測器數據上下文（以非同步 API 查詢，不阻塞 bot 的事件迴圈）"""
+        recent = await db.aget_recent(RECENT_READINGS)
+        stats = await db.aget_statistics(24)
         
-        if not latest:
+        if not recent:
             return "目前沒有感測器數據。"
         
+        latest = recent[-1]
+        trend = "\n".join(
+            f"- {datetime.fromisoformat(str(reading['recorded_at'])).strftime('%H:%M:%S')}："
+            f"{reading['temperature']}°C / {reading['humidity']}%"
+            for reading in recent
+        )
+        
         context = f"""
 目前感測器數據：
 - 溫度：{latest['temperature']}°C
@@ -61,6 +72,9 @@ class GeminiAI:
 - 平均溫度：{stats['temperature']['avg']}°C（最低 {stats['temperature']['min']}°C，最高 {stats['temperature']['max']}°C）
 - 平均濕度：{stats['humidity']['avg']}%（最低 {stats['humidity']['min']}%，最高 {stats['humidity']['max']}%）
 - 總記錄數：{stats['count']} 筆
+
+最近 {len(recent)} 筆讀數（由舊到新）：
+{trend}
 """
         return context
     
@@ -79,7 +93,7 @@ class GeminiAI:
         
         try:
             # 組合完整提示
-            sensor_context = self._get_sensor_context()
+            sensor_context = await self._get_sensor_context()
             full_prompt = f"""{SYSTEM_PROMPT}
 
 {sensor_context}
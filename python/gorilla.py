@@ -0,0 +1,465 @@
+"""
+壓縮時間序列區塊 - 封存歷史數據的儲存格式
+生物機電工程概論 期末專題
+
+參考 Facebook Gorilla 的編碼方式，依欄位分別壓縮每個區塊（最多 BLOCK_ROWS 筆）：
+- 時間：微秒整數的 delta-of-delta（讀數約每 10 秒一筆，差值的差值幾乎都是小數字）
+- 溫度、濕度等：四捨五入到 0.1 的數值轉為整數（×10）後取 delta；
+  無法以少數小數位精確表示的欄位改用前後 float64 位元 XOR
+- ID：delta（通常都是 1）
+- 裝置：區塊內的裝置名稱列表（JSON）加上每筆的名稱代碼（delta），版本 2 起附加在其他欄位之後
+
+差值以能容納的最窄整數寬度（1/2/4/8 bytes）存放，再經 zlib 壓縮。
+為了讓解碼能以 numpy.cumsum 向量化，沒有採用 Gorilla 的逐位元編碼，
+而是以位元組對齊的差值陣列搭配 zlib 取代位元層級的壓縮。
+
+檔案格式：
+    檔頭 '<4sH2x'：magic "DHTG"、版本
+    區塊 '<IIqq'：筆數、壓縮後大小、第一筆/最後一筆時間（微秒），之後是 zlib 資料
+
+編碼與解碼都以串流方式逐區塊處理，記憶體用量與檔案大小無關。
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from operator import xor
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+MAGIC = b'DHTG'
+VERSION = 2
+
+# 可讀取的版本（版本 1 沒有裝置欄位）
+READABLE_VERSIONS = (1, 2)
+
+FILE_HEADER = struct.Struct('<4sH2x')
+BLOCK_HEADER = struct.Struct('<IIqq')
+
+# 裝置名稱列表（JSON）的長度
+NAMES_HEADER = struct.Struct('<I')
+
+# 欄位標頭：編碼方式、旗標、小數位數、差值寬度、有值筆數、第一個值、第一個差值
+COLUMN_HEADER = struct.Struct('<BBBBIqq')
+
+# 每個區塊的最大筆數（每 10 秒一筆時約一天）
+BLOCK_ROWS = 8192
+
+# zlib 壓縮等級（封存數據只寫一次，使用最高等級）
+ZLIB_LEVEL = 9
+
+# 數值欄位（依紀錄欄位順序）
+FIELDS = ['id', 'temperature', 'humidity', 'heat_index', 'air_quality']
+
+# 嘗試的最大小數位數，超過則改用 XOR 編碼
+MAX_DECIMALS = 4
+
+# 轉為整數後的絕對值上限，確保 delta-of-delta 不會超出 int64
+INT_LIMIT = 1 << 61
+
+# 編碼方式
+ENC_EMPTY = 0    # 全部為 None
+ENC_DELTA = 1    # 整數 delta
+ENC_DOD = 2      # 整數 delta-of-delta
+ENC_XOR = 3      # float64 位元 XOR
+
+# 旗標
+FLAG_NULLS = 1   # 有 None，後面接存在位元圖
+FLAG_INT = 2     # 原始值為整數
+
+# 差值寬度對應的 array 型別與 numpy dtype
+_TYPECODES = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+_DTYPES = {1: '<i1', 2: '<i2', 4: '<i4', 8: '<i8'}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(recorded_at: str) -> int:
+    """ISO 時間字串轉為微秒整數（以本地時間計算，可無損轉回相同字串）"""
+    return (datetime.fromisoformat(recorded_at) - _EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> str:
+    """微秒整數轉回 ISO 時間字串"""
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+# ========== 編碼 ==========
+
+def _width(values: List[int]) -> int:
+    """能容納所有值的最窄整數寬度（bytes）"""
+    low = min(values, default=0)
+    high = max(values, default=0)
+    for width in (1, 2, 4):
+        limit = 1 << (width * 8 - 1)
+        if -limit <= low and high < limit:
+            return width
+    return 8
+
+
+def _to_bytes(values: Iterable[int], typecode: str) -> bytes:
+    """整數序列轉為小端序位元組"""
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _decimals(values: List[float]) -> Optional[int]:
+    """找出能精確表示所有值的最少小數位數，沒有則回傳 None"""
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        if all(round(v * scale) / scale == v for v in values):
+            return decimals
+    return None
+
+
+def _encode_column(values: List[Any], dod: bool = False) -> bytes:
+    """
+    編碼一個欄位
+
+    Args:
+        values: 欄位值（可含 None）
+        dod: 整數值使用 delta-of-delta（時間欄位）
+
+    Returns:
+        欄位標頭、存在位元圖（有 None 時）與差值資料
+    """
+    present = [v for v in values if v is not None]
+    flags = 0
+    bitmap = b''
+    if len(present) < len(values):
+        flags |= FLAG_NULLS
+        mask = bytearray((len(values) + 7) // 8)
+        for i, v in enumerate(values):
+            if v is not None:
+                mask[i >> 3] |= 1 << (i & 7)
+        bitmap = bytes(mask)
+
+    if not present:
+        return COLUMN_HEADER.pack(ENC_EMPTY, flags, 0, 0, 0, 0, 0) + bitmap
+
+    decimals = 0
+    if all(type(v) is int for v in present):
+        flags |= FLAG_INT
+        ints = present
+    else:
+        decimals = _decimals(present)
+        if decimals is not None:
+            scale = 10 ** decimals
+            ints = [round(v * scale) for v in present]
+            if max(abs(v) for v in ints) >= INT_LIMIT:
+                decimals = None
+        if decimals is None:
+            # 無法轉為整數：相鄰 float64 位元 XOR，變化小時高位元多為 0
+            bits = struct.unpack(f'<{len(present)}Q', struct.pack(f'<{len(present)}d', *present))
+            residuals = [bits[i] ^ bits[i - 1] for i in range(1, len(bits))]
+            first = struct.unpack('<q', struct.pack('<Q', bits[0]))[0]
+            return (COLUMN_HEADER.pack(ENC_XOR, flags, 0, 8, len(present), first, 0)
+                    + bitmap + _to_bytes(residuals, 'Q'))
+
+    deltas = [ints[i] - ints[i - 1] for i in range(1, len(ints))]
+    first_delta = 0
+    if dod:
+        encoding = ENC_DOD
+        first_delta = deltas[0] if deltas else 0
+        residuals = [deltas[i] - deltas[i - 1] for i in range(1, len(deltas))]
+    else:
+        encoding = ENC_DELTA
+        residuals = deltas
+
+    width = _width(residuals)
+    return (COLUMN_HEADER.pack(encoding, flags, decimals, width, len(ints), ints[0], first_delta)
+            + bitmap + _to_bytes(residuals, _TYPECODES[width]))
+
+
+def encode_block(readings: List[Dict[str, Any]]) -> Tuple[bytes, int, int]:
+    """
+    編碼一個區塊
+
+    Args:
+        readings: 紀錄（依時間排序）
+
+    Returns:
+        (zlib 壓縮後的資料, 第一筆時間, 最後一筆時間)，時間為微秒
+    """
+    micros = [to_micros(r['recorded_at']) for r in readings]
+    payload = [_encode_column(micros, dod=True)]
+    payload.extend(_encode_column([r.get(field) for r in readings]) for field in FIELDS)
+
+    # 裝置：名稱列表只存一次，每筆只存代碼（沒有 device_id 的舊紀錄為 None）
+    codes: Dict[Optional[str], int] = {}
+    column = [codes.setdefault(r.get('device_id'), len(codes)) for r in readings]
+    names = json.dumps(list(codes), ensure_ascii=False).encode('utf-8')
+    payload.append(NAMES_HEADER.pack(len(names)) + names)
+    payload.append(_encode_column(column))
+    return zlib.compress(b''.join(payload), ZLIB_LEVEL), micros[0], micros[-1]
+
+
+class BlockWriter:
+    """串流寫入壓縮區塊：累積 BLOCK_ROWS 筆就寫出一個區塊"""
+
+    def __init__(self, path: Path, block_rows: int = BLOCK_ROWS):
+        """
+        建立檔案並寫入檔頭
+
+        Args:
+            path: 輸出檔案路徑
+            block_rows: 每個區塊的筆數
+        """
+        self.path = Path(path)
+        self.block_rows = block_rows
+        self.rows = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._file = open(self.path, 'wb')
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, reading: Dict[str, Any]):
+        """加入一筆紀錄"""
+        self._pending.append(reading)
+        if len(self._pending) >= self.block_rows:
+            self.flush()
+
+    def write_many(self, readings: Iterable[Dict[str, Any]]):
+        """加入多筆紀錄"""
+        for reading in readings:
+            self.write(reading)
+
+    def flush(self):
+        """將累積的紀錄寫成一個區塊"""
+        if not self._pending:
+            return
+        data, first, last = encode_block(self._pending)
+        self._file.write(BLOCK_HEADER.pack(len(self._pending), len(data), first, last))
+        self._file.write(data)
+        self.rows += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """寫出剩餘的紀錄並確保寫入磁碟"""
+        self.flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def write_file(path: Path, readings: Iterable[Dict[str, Any]], block_rows: int = BLOCK_ROWS) -> int:
+    """
+    將紀錄寫成壓縮區塊檔（先寫暫存檔再取代）
+
+    Returns:
+        寫入的筆數
+    """
+    path = Path(path)
+    tmp_file = path.with_suffix('.tmp')
+    with BlockWriter(tmp_file, block_rows) as writer:
+        writer.write_many(readings)
+    os.replace(tmp_file, path)
+    return writer.rows
+
+
+# ========== 解碼 ==========
+
+def iter_blocks(path: Path) -> Iterator[Tuple[int, int, int, bytes]]:
+    """
+    依序讀取區塊（不解壓縮）
+
+    Yields:
+        (筆數, 第一筆時間, 最後一筆時間, 壓縮資料)
+    """
+    with open(path, 'rb') as f:
+        magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC or version not in READABLE_VERSIONS:
+            raise ValueError(f"{path} is not a compressed block file")
+
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            rows, size, first, last = BLOCK_HEADER.unpack(header)
+            yield rows, first, last, f.read(size)
+
+
+def _read_column(payload: bytes, pos: int, rows: int):
+    """讀取欄位標頭、存在位元圖與差值資料的位置"""
+    encoding, flags, decimals, width, present, first, first_delta = COLUMN_HEADER.unpack_from(payload, pos)
+    pos += COLUMN_HEADER.size
+
+    bitmap = None
+    if flags & FLAG_NULLS:
+        size = (rows + 7) // 8
+        bitmap = payload[pos:pos + size]
+        pos += size
+
+    if encoding == ENC_EMPTY:
+        count = 0
+    elif encoding == ENC_DOD:
+        count = max(present - 2, 0)
+    else:
+        count = present - 1
+    column = (encoding, flags, decimals, width, present, first, first_delta, bitmap, pos, count)
+    return column, pos + count * width
+
+
+def _decode_column(payload: bytes, column, rows: int) -> List[Any]:
+    """以純 Python 解碼欄位（None 保留為 None）"""
+    encoding, flags, decimals, width, present, first, first_delta, bitmap, pos, count = column
+    if encoding == ENC_EMPTY:
+        return [None] * rows
+
+    typecode = 'Q' if encoding == ENC_XOR else _TYPECODES[width]
+    residuals = array(typecode)
+    residuals.frombytes(payload[pos:pos + count * width])
+    if sys.byteorder == 'big':
+        residuals.byteswap()
+
+    if encoding == ENC_XOR:
+        bits = array('Q', accumulate(residuals, xor, initial=first & 0xFFFFFFFFFFFFFFFF))
+        values = array('d', bits.tobytes()).tolist()
+    else:
+        if encoding == ENC_DOD:
+            residuals = accumulate(residuals, initial=first_delta) if present > 1 else ()
+        values = list(accumulate(residuals, initial=first))
+        if flags & FLAG_INT:
+            pass
+        elif decimals:
+            scale = 10 ** decimals
+            values = [v / scale for v in values]
+        else:
+            values = [float(v) for v in values]
+
+    if bitmap is None:
+        return values
+    it = iter(values)
+    return [next(it) if bitmap[i >> 3] >> (i & 7) & 1 else None for i in range(rows)]
+
+
+def _decode_column_numpy(payload: bytes, column, rows: int):
+    """以 NumPy 向量化解碼欄位（None 為 NaN，整數欄位無 None 時為 int64）"""
+    encoding, flags, decimals, width, present, first, first_delta, bitmap, pos, count = column
+    if encoding == ENC_EMPTY:
+        return np.full(rows, np.nan)
+
+    if encoding == ENC_XOR:
+        values = np.empty(present, dtype=np.uint64)
+        values[0] = first & 0xFFFFFFFFFFFFFFFF
+        values[1:] = np.frombuffer(payload, dtype='<u8', count=count, offset=pos)
+        values = np.bitwise_xor.accumulate(values).view(np.float64)
+    else:
+        residuals = np.frombuffer(payload, dtype=_DTYPES[width], count=count, offset=pos)
+        values = np.empty(present, dtype=np.int64)
+        values[0] = first
+        if encoding == ENC_DOD:
+            if present > 1:
+                deltas = np.empty(present - 1, dtype=np.int64)
+                deltas[0] = first_delta
+                np.cumsum(residuals, dtype=np.int64, out=deltas[1:])
+                deltas[1:] += first_delta
+                np.cumsum(deltas, out=values[1:])
+                values[1:] += first
+        else:
+            np.cumsum(residuals, dtype=np.int64, out=values[1:])
+            values[1:] += first
+        if decimals:
+            values = values / 10 ** decimals
+        elif not flags & FLAG_INT or bitmap is not None:
+            values = values.astype(np.float64)
+
+    if bitmap is None:
+        return values
+    mask = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), bitorder='little')[:rows].astype(bool)
+    full = np.full(rows, np.nan)
+    full[mask] = values
+    return full
+
+
+def decode_block(data: bytes, rows: int, use_numpy: bool = False) -> Dict[str, Any]:
+    """
+    解碼一個區塊為欄位
+
+    Args:
+        data: zlib 壓縮資料
+        rows: 區塊筆數
+        use_numpy: 使用 NumPy（需已安裝）回傳陣列，否則回傳列表
+
+    Returns:
+        {'micros': 時間（微秒）, 'id': ..., 'temperature': ..., ..., 'device_id': 裝置名稱列表}；
+        版本 1 的區塊沒有 'device_id'，名稱為 None 表示該筆沒有 device_id
+    """
+    payload = zlib.decompress(data)
+    decode = _decode_column_numpy if use_numpy else _decode_column
+
+    columns = {}
+    pos = 0
+    for name in ['micros'] + FIELDS:
+        column, pos = _read_column(payload, pos, rows)
+        columns[name] = decode(payload, column, rows)
+
+    if pos < len(payload):
+        size, = NAMES_HEADER.unpack_from(payload, pos)
+        pos += NAMES_HEADER.size
+        names = json.loads(payload[pos:pos + size].decode('utf-8'))
+        column, _ = _read_column(payload, pos + size, rows)
+        columns['device_id'] = [names[code] for code in _decode_column(payload, column, rows)]
+    return columns
+
+
+def iter_columns(path: Path, use_numpy: bool = None) -> Iterator[Dict[str, Any]]:
+    """
+    逐區塊解碼為欄位
+
+    Args:
+        path: 壓縮區塊檔
+        use_numpy: 預設在已安裝 NumPy 時使用
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    for rows, _, _, data in iter_blocks(path):
+        yield decode_block(data, rows, use_numpy)
+
+
+def iter_readings(path: Path, start: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    依序產生紀錄字典（與 JSONL 日誌中的格式相同）
+
+    Args:
+        path: 壓縮區塊檔
+        start: 從第幾筆開始（之前的區塊不解壓縮）
+    """
+    for rows, _, _, data in iter_blocks(path):
+        if start >= rows:
+            start -= rows
+            continue
+
+        columns = decode_block(data, rows)
+        timestamps = columns['micros']
+        fields = [columns[field] for field in FIELDS]
+        devices = columns.get('device_id')
+        for i in range(start, rows):
+            reading = {field: values[i] for field, values in zip(FIELDS, fields)}
+            reading['recorded_at'] = from_micros(timestamps[i])
+            if devices is not None and devices[i] is not None:
+                reading['device_id'] = devices[i]
+            yield reading
+        start = 0
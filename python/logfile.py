@@ -0,0 +1,113 @@
+"""
+JSON Lines 日誌檔工具
+生物機電工程概論 期末專題
+
+database.py 的讀數日誌與 rollups.py 的彙總檔都是「每行一筆 JSON、只附加到檔尾」的格式，
+共用這裡的讀取、附加與損毀修復函數。
+"""
+
+import os
+import json
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+
+def scan(path: Path, start: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """
+    從指定位元組位置開始依序讀取日誌，產生 (位置, 紀錄)
+
+    無法解析的行（例如當機時寫到一半的最後一行）會被略過。
+    """
+    if not path.exists():
+        return
+
+    with open(path, 'rb') as f:
+        yield from scan_file(f, start, path.name)
+
+
+def scan_file(f: BinaryIO, start: int = 0, name: str = '') -> Iterator[Tuple[int, Dict]]:
+    """
+    與 scan 相同，但讀取已開啟的檔案（呼叫端負責關閉）
+
+    讓讀取端在取得索引的同時開啟檔案，之後檔案被重寫取代也仍讀取與索引相符的舊檔。
+    """
+    f.seek(start)
+    offset = start
+    for line in f:
+        line_offset = offset
+        offset += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_offset, json.loads(line)
+        except ValueError:
+            print(f"[WARN] Skipping corrupted line in {name}: {line[:60]}")
+
+
+def append(path: Path, record: Dict) -> int:
+    """附加一筆紀錄到檔尾，回傳該行的位元組位置"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'ab') as f:
+        offset = f.tell()
+        f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+    return offset
+
+
+def append_many(path: Path, records: List[Dict]) -> List[int]:
+    """
+    以單次寫入附加多筆紀錄並 fsync，回傳各行的位元組位置
+
+    全部紀錄在同一次 write 後才同步到磁碟，作為一次持久化的批次提交。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    offsets = []
+    lines = []
+    with open(path, 'ab') as f:
+        offset = f.tell()
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+            offsets.append(offset)
+            lines.append(line)
+            offset += len(line)
+        f.write(b''.join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    return offsets
+
+
+def repair_tail(path: Path) -> bool:
+    """
+    截斷當機時寫到一半的最後一行，避免之後附加的紀錄與其黏在一起
+
+    Returns:
+        是否有截斷內容
+    """
+    if not path.exists():
+        return False
+
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return False
+
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return False
+
+        # 往回找到最後一個換行符號
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            index = f.read(step).rfind(b'\n')
+            if index >= 0:
+                f.truncate(position + index + 1)
+                break
+        else:
+            f.truncate(0)
+
+    print(f"[WARN] Truncated incomplete last line in {path.name}")
+    return True
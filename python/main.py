@@ -4,7 +4,7 @@
 
 功能：
 - 從 Arduino 讀取 DHT 感測器數據
-- 儲存到 SQLite 資料庫
+- 儲存到本地資料庫（JSON Lines、SQLite 或二進位紀錄檔）
 - 發送到 Discord Webhook
 - 執行 Discord Bot
 - 提供 Web API 與儀表板
@@ -19,12 +19,14 @@ from datetime import datetime
 
 # 匯入模組
 from config import (
-    SERIAL_PORT, WEBHOOK_INTERVAL,
+    SERIAL_PORT, SERIAL_PORTS, WEBHOOK_INTERVAL,
     DISCORD_WEBHOOK_URL, DISCORD_BOT_TOKEN,
-    CLOUD_SYNC_ENABLED, SIMULATE_MODE
+    CLOUD_SYNC_ENABLED, SIMULATE_MODE, DB_WRITE_BEHIND
 )
 import database as db
+from write_behind import WriteBehindBuffer
 from serial_reader import ArduinoReader, find_arduino_port
+from serial_manager import SerialManager, parse_ports
 from discord_webhook import DiscordWebhook
 from discord_bot import SensorBot
 import web_server
@@ -34,15 +36,18 @@ from cloud_sync import get_cloud_sync
 class DHT_Monitor:
     """DHT 溫濕度監測系統主類別"""
     
-    def __init__(self, port: str = None):
+    def __init__(self, port: str = None, ports: str = None):
         self.is_running = False
         self.override_port = port  # 命令列指定的 Port
+        self.override_ports = ports  # 命令列指定的多個 Port（SERIAL_PORTS 格式）
         
         # 初始化各模組
         self.arduino: ArduinoReader = None
+        self.serial_manager: SerialManager = None  # 多個 Arduino 時使用
         self.webhook = DiscordWebhook()
         self.bot: SensorBot = None
         self.cloud_sync = get_cloud_sync()  # 雲端同步
+        self.write_buffer = WriteBehindBuffer() if DB_WRITE_BEHIND else None  # 延遲寫入
         
         # 計時器
         self.last_webhook_time = 0
@@ -61,6 +66,9 @@ class DHT_Monitor:
         # 初始化資料庫
         print("\n[DB] Initializing database...")
         db.init_database()
+        if self.write_buffer:
+            self.write_buffer.start()
+            print(f"[DB] Write-behind enabled ({self.write_buffer.flush_interval * 1000:.0f} ms / {self.write_buffer.flush_rows} rows)")
         
         # 連接 Arduino
         print("\n[SERIAL] Connecting to Arduino...")
@@ -105,7 +113,14 @@ class DHT_Monitor:
     
     def _connect_arduino(self):
         """連接 Arduino"""
+        # 多個 Arduino：命令列 --ports 或 SERIAL_PORTS（命令列指定單一 --port 時不使用）
+        ports = self.override_ports or (SERIAL_PORTS if not self.override_port else None)
+        if ports:
+            self._connect_arduinos(ports)
+            return
+        
         # 優先使用命令列指定的 Port
+        detected = False
         if self.override_port:
             port = self.override_port
             print(f"[CLI] Using specified port: {port}")
@@ -113,12 +128,14 @@ class DHT_Monitor:
             # 嘗試自動偵測
             port = find_arduino_port()
             if port:
+                detected = True
                 print(f"[DETECT] Found Arduino: {port}")
             else:
                 port = SERIAL_PORT
                 print(f"[CONFIG] Using configured port: {port}")
         
-        self.arduino = ArduinoReader(port=port)
+        # 自動偵測到的埠：重新插上後埠號改變（例如 ttyACM0 → ttyACM1）時也能找到
+        self.arduino = ArduinoReader(port=port, rescan=detected)
         
         # 嘗試連接
         if not self.arduino.connect():
@@ -129,12 +146,29 @@ class DHT_Monitor:
             # 設定回呼函數
             self.arduino.start_continuous_read(self._on_data_received)
     
+    def _connect_arduinos(self, ports: str):
+        """連接多個 Arduino（ports 為 SERIAL_PORTS 格式）"""
+        manager = SerialManager(parse_ports(ports))
+        print(f"[SERIAL] Ports: {', '.join(manager.readers) or '(none found)'}")
+        
+        connected = manager.connect()
+        if connected == 0:
+            print("\n[WARN] Cannot connect to any Arduino, entering simulation mode")
+            print("       Program will continue with random data")
+            return
+        
+        print(f"[OK] {connected} / {len(manager.readers)} Arduino(s) connected")
+        self.serial_manager = manager
+        manager.start(self._on_data_received)
+    
     def _start_discord_bot(self):
         """在背景執行緒啟動 Discord Bot"""
         self.bot = SensorBot()
         
-        # 傳遞 Arduino Reader 給 Bot（讓 /buzz 指令可用）
-        if self.arduino:
+        # 傳遞 Arduino Reader 給 Bot（讓 /buzz 指令可用；多個 Arduino 時指令會送到每一個）
+        if self.serial_manager:
+            self.bot.set_arduino_reader(self.serial_manager)
+        elif self.arduino:
             self.bot.set_arduino_reader(self.arduino)
         
         def run_bot():
@@ -153,6 +187,7 @@ class DHT_Monitor:
             humidity = data.get('humidity')
             heat_index = data.get('heat_index')
             air_quality = data.get('air_quality')  # PPM 數據
+            device_id = data.get('device_id')  # 多個感測節點時區分來源（預設為 DEVICE_ID）
             
             if temperature is None or humidity is None:
                 return
@@ -162,20 +197,25 @@ class DHT_Monitor:
             # 顯示數據
             timestamp = datetime.now().strftime("%H:%M:%S")
             ppm_str = f"  PPM: {air_quality:.0f}" if air_quality is not None else ""
-            print(f"[{timestamp}] Temp: {temperature:.1f}C  Hum: {humidity:.1f}%{ppm_str}  (#{self.total_readings})")
+            source_str = f"  [{device_id} @ {data.get('port')}]" if self.serial_manager else ""
+            print(f"[{timestamp}] Temp: {temperature:.1f}C  Hum: {humidity:.1f}%{ppm_str}  (#{self.total_readings}){source_str}")
             
-            # 儲存到本地資料庫
-            db.insert_reading(temperature, humidity, heat_index, air_quality)
+            # 儲存到本地資料庫（延遲寫入時由背景執行緒批次提交）
+            if self.write_buffer:
+                self.write_buffer.add(temperature, humidity, heat_index, air_quality, device_id)
+            else:
+                db.insert_reading(temperature, humidity, heat_index, air_quality, device_id)
             
             # 更新本地 Web API
-            web_server.update_current_reading(temperature, humidity, heat_index, air_quality)
+            web_server.update_current_reading(temperature, humidity, heat_index, air_quality, device_id)
             
             # 同步到雲端（非同步，不阻塞）
             if self.cloud_sync.enabled:
                 self.cloud_sync.push_reading(
                     temperature, humidity, heat_index,
                     air_quality=air_quality,
-                    send_discord=False  # 本地已發送 Discord
+                    send_discord=False,  # 本地已發送 Discord
+                    device_id=device_id
                 )
             
             # 檢查是否需要發送 Webhook
@@ -208,7 +248,7 @@ class DHT_Monitor:
         try:
             while self.is_running:
                 # 如果沒有 Arduino，產生模擬數據
-                if self.arduino is None:
+                if self.arduino is None and self.serial_manager is None:
                     self._simulate_data()
                 
                 time.sleep(1)
@@ -245,10 +285,17 @@ class DHT_Monitor:
         print("\nShutting down...")
         
         # 停止 Arduino 連線
+        if self.serial_manager:
+            self.serial_manager.stop()
         if self.arduino:
             self.arduino.stop_continuous_read()
             self.arduino.disconnect()
         
+        # 寫入緩衝中剩餘的讀數，並保存檢查點讓下次啟動更快
+        if self.write_buffer:
+            self.write_buffer.stop()
+        db.save_checkpoint()
+        
         # 發送關閉通知
         if DISCORD_WEBHOOK_URL != "YOUR_WEBHOOK_URL_HERE":
             self.webhook.send_shutdown_message()
@@ -272,6 +319,7 @@ def main():
     # 解析命令列參數
     parser = argparse.ArgumentParser(description='DHT 溫濕度監測系統')
     parser.add_argument('--port', '-p', type=str, help='Arduino 串列埠 (例如: COM4)')
+    parser.add_argument('--ports', type=str, help='多個 Arduino 串列埠，以逗號分隔，auto 為自動偵測 (例如: COM3,COM4)')
     parser.add_argument('--simulate', '-s', action='store_true', help='使用模擬數據')
     args = parser.parse_args()
     
@@ -279,7 +327,8 @@ def main():
     is_simulating = args.simulate or SIMULATE_MODE
     
     # 建立監測實例
-    monitor = DHT_Monitor(port=args.port if not is_simulating else None)
+    monitor = DHT_Monitor(port=args.port if not is_simulating else None,
+                          ports=args.ports if not is_simulating else None)
     
     # 設定信號處理
     def signal_handler(sig, frame):
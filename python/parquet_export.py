@@ -0,0 +1,70 @@
+"""
+Parquet 背景匯出模組
+生物機電工程概論 期末專題
+
+Web 伺服器啟動時由背景執行緒呼叫 database.export_to_parquet()：
+啟動時先匯出一次，之後每 PARQUET_EXPORT_INTERVAL 秒與每天午夜後各匯出一次，
+/api/analytics 只查詢已存在的分區，不會在請求中寫入 Parquet。
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+import analytics
+import database as db
+from config import PARQUET_EXPORT_INTERVAL
+
+# 午夜後延遲幾秒再匯出（讓前一天最後的讀數先寫入）
+MIDNIGHT_DELAY = 5
+
+
+class ParquetExporter:
+    """定期匯出 Parquet 封存的背景執行緒"""
+
+    def __init__(self, interval: int = None):
+        """
+        初始化匯出器
+
+        Args:
+            interval: 匯出間隔（秒），預設為 PARQUET_EXPORT_INTERVAL
+        """
+        self.interval = interval if interval is not None else PARQUET_EXPORT_INTERVAL
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """
+        啟動背景匯出執行緒
+
+        Returns:
+            是否已啟動（未安裝 pyarrow 或間隔為 0 時不啟動）
+        """
+        if self._thread or self.interval <= 0 or not analytics.can_export():
+            return False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._export_loop, daemon=True)
+        self._thread.start()
+        return True
+
+    def _next_wait(self) -> float:
+        """距離下一次匯出的秒數（間隔與午夜後取較早者）"""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return min(self.interval, (midnight - now).total_seconds() + MIDNIGHT_DELAY)
+
+    def _export_loop(self):
+        """背景迴圈：匯出後等待到下一次匯出時間"""
+        while not self._stop_event.is_set():
+            try:
+                db.export_to_parquet()
+            except Exception as e:
+                print(f"[ERROR] Parquet export failed: {e}")
+            self._stop_event.wait(self._next_wait())
+
+    def stop(self):
+        """停止背景執行緒（進行中的匯出會先完成）"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
@@ -0,0 +1,419 @@
+"""
+多解析度彙總模組 - 1 分鐘 / 1 小時 / 1 天
+生物機電工程概論 期末專題
+
+每筆讀數新增時同步累加到三種解析度的「目前時段」，時段結束時把該時段的
+筆數、總和、最小值、最大值附加到 data/rollups_<解析度>.jsonl。
+1 小時與 1 天的時段另外保存分位數摘要（sketches.py 的 t-digest），
+供 database.py 計算分位數；1 分鐘時段數量最多且不參與分位數，不保存摘要。
+
+彙總檔與原始讀數分開保存：cleanup_old_data 刪除原始數據時，1 分鐘彙總只保留
+ROLLUP_1M_DAYS 天（只用於約 100 小時以內的圖表），1 小時與 1 天彙總永久保存，
+長期圖表仍可使用。
+
+寫入者（database.py 的寫入鎖持有者）累加目前時段時持有每個序列的短暫鎖；
+讀取端只在鎖內取得索引、目前時段的複本並開啟彙總檔，讀取檔案時不持有鎖。
+刪除舊時段只替換索引，彙總檔等到沒有讀取端開啟時才重寫（Windows 無法取代開啟中的檔案）。
+"""
+
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+import logfile
+from sketches import TDigest
+
+
+# 彙總的指標
+METRICS = ('temperature', 'humidity', 'heat_index', 'air_quality')
+
+# 解析度名稱與秒數（由細到粗）
+RESOLUTIONS = (('1m', 60), ('1h', 3600), ('1d', 86400))
+
+# 保存分位數摘要的解析度（database.py 的分位數只合併這兩種）
+SKETCH_RESOLUTIONS = ('1h', '1d')
+
+# 已刪除時段佔彙總檔比例超過此值時重寫檔案
+COMPACT_DEAD_RATIO = 0.5
+
+
+def _bucket_start(epoch: float, seconds: int) -> float:
+    """取得時間所在時段的起點（以本地時間對齊整分、整點、午夜）"""
+    moment = datetime.fromtimestamp(epoch)
+    if seconds == 60:
+        moment = moment.replace(second=0, microsecond=0)
+    elif seconds == 3600:
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+    else:
+        moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.timestamp()
+
+
+def _new_bucket(start: float, sketches: bool) -> Dict[str, Any]:
+    """建立空的時段；每個指標為 [筆數, 總和, 最小值, 最大值]，sketches 為真時另有各指標的分位數摘要"""
+    bucket: Dict[str, Any] = {'start': start, 'count': 0}
+    for metric in METRICS:
+        bucket[metric] = [0, 0.0, None, None]
+    if sketches:
+        bucket['sketches'] = {metric: TDigest() for metric in METRICS}
+    return bucket
+
+
+def _to_point(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    將時段轉為與原始讀數相同欄位的資料點
+
+    指標欄位為平均值，另附 <指標>_min / <指標>_max。
+    """
+    point: Dict[str, Any] = {
+        'recorded_at': datetime.fromtimestamp(bucket['start']).isoformat(),
+        'count': bucket['count']
+    }
+    for metric in METRICS:
+        count, total, low, high = bucket[metric]
+        point[metric] = round(total / count, 1) if count else None
+        point[f'{metric}_min'] = low
+        point[f'{metric}_max'] = high
+    return point
+
+
+class RollupSeries:
+    """單一解析度的彙總序列"""
+
+    def __init__(self, name: str, seconds: int, path: Path, sketches: bool = False):
+        """
+        初始化序列
+
+        Args:
+            name: 解析度名稱（如 "1h"）
+            seconds: 每個時段的秒數
+            path: 已結束時段的儲存檔案
+            sketches: 是否為每個時段保存分位數摘要
+        """
+        self.name = name
+        self.seconds = seconds
+        self.path = path
+        self.sketches = sketches
+
+        # 已結束時段的起點與在檔案中的位置（平行陣列）
+        self.starts = array('d')
+        self.offsets = array('q')
+
+        # 目前尚未結束的時段與其結束時間
+        self.current: Optional[Dict[str, Any]] = None
+        self.current_end = float('-inf')
+
+        # 保護目前時段與索引的替換（讀取端只在複製時持有）
+        self._lock = threading.Lock()
+
+        # 開啟彙總檔讀取中的讀取端數（不為 0 時不重寫檔案）
+        self._readers = 0
+
+    def load(self):
+        """載入已結束時段的索引"""
+        logfile.repair_tail(self.path)
+        starts = array('d')
+        offsets = array('q')
+        for offset, bucket in logfile.scan(self.path):
+            starts.append(bucket['start'])
+            offsets.append(offset)
+
+        with self._lock:
+            self.starts = starts
+            self.offsets = offsets
+            self.current = None
+            self.current_end = float('-inf')
+
+    def _view(self, sketches: bool = False):
+        """
+        取得已結束時段的索引與目前時段的複本（讀取端使用）
+
+        彙總檔在鎖內開啟並計入讀取端數，讀完之前 drop_before 不會重寫檔案。
+
+        Args:
+            sketches: 是否一併複製目前時段的分位數摘要
+
+        Returns:
+            (起點陣列, 位置陣列, 已結束時段數, 目前時段的複本或 None, 開啟的彙總檔或 None)
+        """
+        with self._lock:
+            current = self.current
+            if current is not None:
+                copied = {'start': current['start'], 'count': current['count']}
+                for metric in METRICS:
+                    copied[metric] = list(current[metric])
+                if sketches:
+                    copied['sketches'] = {metric: sketch.copy() for metric, sketch in current.get('sketches', {}).items()}
+                current = copied
+            handle = None
+            if self.starts:
+                handle = open(self.path, 'rb')
+                self._readers += 1
+            return self.starts, self.offsets, len(self.starts), current, handle
+
+    def _read(self, handle, offsets, first: int, last: int):
+        """從 _view 開啟的彙總檔依序讀取第 first 到 last（不含）個已結束時段，讀完後關閉檔案"""
+        if handle is None:
+            return
+        try:
+            with handle:
+                if first >= last:
+                    return
+                count = 0
+                for _, bucket in logfile.scan_file(handle, offsets[first], self.path.name):
+                    yield bucket
+                    count += 1
+                    if count >= last - first:
+                        break
+        finally:
+            with self._lock:
+                self._readers -= 1
+
+    def closed_until(self) -> float:
+        """最後一個已結束時段的結束時間（之後的讀數尚未彙總到檔案）"""
+        if not self.starts:
+            return float('-inf')
+        return self.starts[-1] + self.seconds
+
+    def add(self, epoch: float, reading: Dict[str, Any]):
+        """將一筆讀數累加到所屬時段"""
+        # 大多數讀數落在目前時段內，不需重新計算時段起點
+        if epoch >= self.current_end or self.current is None:
+            start = _bucket_start(epoch, self.seconds)
+
+            # 進入新的時段：把目前時段寫入檔案
+            # （系統時間被往回調整時，讀數仍計入目前時段）
+            if self.current is not None and start > self.current['start']:
+                self._close_current()
+
+            if self.current is None:
+                bucket = _new_bucket(start, self.sketches)
+                with self._lock:
+                    self.current = bucket
+                # 下一個時段的起點（以 1.5 倍長度取整，日光節約時間的 23/25 小時日也適用）
+                self.current_end = _bucket_start(start + self.seconds * 1.5, self.seconds)
+
+        with self._lock:
+            bucket = self.current
+            sketches = bucket.get('sketches')
+            bucket['count'] += 1
+            for metric in METRICS:
+                value = reading.get(metric)
+                if value is None:
+                    continue
+                stats = bucket[metric]
+                stats[0] += 1
+                stats[1] += value
+                stats[2] = value if stats[2] is None or value < stats[2] else stats[2]
+                stats[3] = value if stats[3] is None or value > stats[3] else stats[3]
+                if sketches is not None:
+                    sketches[metric].add(value)
+
+    def _close_current(self):
+        """結束目前時段並附加到檔案"""
+        with self._lock:
+            current = self.current
+            bucket = {'start': current['start'], 'count': current['count']}
+            for metric in METRICS:
+                count, total, low, high = current[metric]
+                bucket[metric] = [count, round(total, 2), low, high]
+            if 'sketches' in current:
+                bucket['sketches'] = {metric: sketch.to_list() for metric, sketch in current['sketches'].items()}
+
+        # 寫入檔案時不持有鎖；寫入完成前讀取端仍把它當作目前時段
+        offset = logfile.append(self.path, bucket)
+        with self._lock:
+            self.starts.append(bucket['start'])
+            self.offsets.append(offset)
+            self.current = None
+            self.current_end = float('-inf')
+
+    def points_between(self, start: float, end: float = None) -> List[Dict[str, Any]]:
+        """
+        取得指定時間範圍內的資料點（包含涵蓋起點的第一個時段）
+
+        Args:
+            start: 起始時間（epoch 秒數）
+            end: 結束時間（epoch 秒數），預設為目前時段
+
+        Returns:
+            依時間排序的資料點
+        """
+        starts, offsets, closed, current, handle = self._view()
+        first_start = _bucket_start(start, self.seconds)
+        first = bisect_left(starts, first_start, 0, closed)
+        last = bisect_left(starts, end, 0, closed) if end is not None else closed
+        if end is not None and last < closed and starts[last] <= end:
+            last += 1
+
+        points = [_to_point(bucket) for bucket in self._read(handle, offsets, first, last)]
+
+        if current is not None and current['start'] >= first_start and (end is None or current['start'] <= end):
+            points.append(_to_point(current))
+        return points
+
+    def bucket_start(self, epoch: float) -> float:
+        """取得時間所在時段的起點"""
+        return _bucket_start(epoch, self.seconds)
+
+    def next_start(self, epoch: float) -> float:
+        """不早於指定時間的第一個時段起點"""
+        start = _bucket_start(epoch, self.seconds)
+        if start >= epoch:
+            return start
+        return _bucket_start(start + self.seconds * 1.5, self.seconds)
+
+    def merge_sketches(self, sketches: Dict[str, TDigest], start: float, end: float = None):
+        """
+        將起點在 [start, end) 內的時段（含目前時段）的分位數摘要合併到 sketches
+
+        Args:
+            sketches: 指標對應 TDigest 的字典
+            start: 最早的時段起點（epoch 秒數）
+            end: 時段起點上限（不含），預設為不限
+        """
+        starts, offsets, closed, current, handle = self._view(sketches=True)
+        first = bisect_left(starts, start, 0, closed)
+        last = bisect_left(starts, end, 0, closed) if end is not None else closed
+
+        for bucket in self._read(handle, offsets, first, last):
+            # 舊版彙總檔與未保存摘要的序列沒有摘要，這些時段不計入分位數
+            for metric, centroids in bucket.get('sketches', {}).items():
+                sketches[metric].add_centroids(centroids, bucket[metric][2], bucket[metric][3])
+
+        if current is not None and current['start'] >= start and (end is None or current['start'] < end):
+            for metric, sketch in current.get('sketches', {}).items():
+                sketches[metric].merge(sketch)
+
+    def drop_before(self, epoch: float) -> int:
+        """
+        刪除起點早於 epoch 的已結束時段（寫入者呼叫，不可與 add 同時執行）
+
+        只以新的陣列取代索引（讀取中的查詢仍使用舊索引與原檔的位置），
+        已刪除的時段累積超過 COMPACT_DEAD_RATIO 時再由 _compact 重寫檔案。
+
+        Args:
+            epoch: 刪除時間（epoch 秒數）
+
+        Returns:
+            刪除的時段數
+        """
+        dropped = bisect_left(self.starts, epoch)
+        if dropped:
+            with self._lock:
+                self.starts = self.starts[dropped:]
+                self.offsets = self.offsets[dropped:]
+        self._compact()
+        return dropped
+
+    def _compact(self) -> bool:
+        """
+        重寫彙總檔，移除索引第一個時段之前的內容（先寫暫存檔再取代）
+
+        有讀取端開啟檔案時不重寫；Windows 上檔案仍被其他程式開啟而無法取代時也保留原檔，
+        下次清理時再試。重啟後尚未重寫的已刪除時段會重新載入，下次清理時再刪除。
+
+        Returns:
+            是否已重寫
+        """
+        if self._readers or not self.path.exists():
+            return False
+        size = self.path.stat().st_size
+        dead = self.offsets[0] if self.offsets else size
+        if dead == 0 or dead < size * COMPACT_DEAD_RATIO:
+            return False
+
+        tmp_file = self.path.with_suffix('.tmp')
+        with open(self.path, 'rb') as src, open(tmp_file, 'wb') as f:
+            src.seek(dead)
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            if not self._readers:
+                try:
+                    os.replace(tmp_file, self.path)
+                except PermissionError:
+                    print(f"[WARN] {self.path.name} is open elsewhere, rollup compaction deferred")
+                else:
+                    self.offsets = array('q', (offset - dead for offset in self.offsets))
+                    return True
+        tmp_file.unlink()
+        return False
+
+    def clear(self):
+        """刪除所有彙總"""
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        with self._lock:
+            self.starts = array('d')
+            self.offsets = array('q')
+            self.current = None
+            self.current_end = float('-inf')
+
+
+class Rollups:
+    """1 分鐘 / 1 小時 / 1 天三種解析度的彙總"""
+
+    def __init__(self, data_dir: Path):
+        self.series = [
+            RollupSeries(name, seconds, data_dir / f"rollups_{name}.jsonl", name in SKETCH_RESOLUTIONS)
+            for name, seconds in RESOLUTIONS
+        ]
+        self.loaded = False
+
+    def load(self) -> float:
+        """
+        載入所有序列
+
+        Returns:
+            需要重新累加的原始讀數起點（epoch 秒數）；從沒有彙總過時為 -inf
+        """
+        for series in self.series:
+            series.load()
+        self.loaded = True
+        return min(series.closed_until() for series in self.series)
+
+    def replay(self, epoch: float, reading: Dict[str, Any]):
+        """重新累加啟動前的原始讀數（已寫入檔案的時段會被略過）"""
+        for series in self.series:
+            if epoch >= series.closed_until():
+                series.add(epoch, reading)
+
+    def add(self, epoch: float, reading: Dict[str, Any]):
+        """累加一筆新讀數"""
+        for series in self.series:
+            series.add(epoch, reading)
+
+    def select(self, hours: float, points: int) -> Optional[RollupSeries]:
+        """
+        選擇仍能提供至少 points 個資料點的最粗解析度
+
+        Returns:
+            彙總序列；連 1 分鐘解析度的點數都不足時回傳 None（應使用原始讀數）
+        """
+        for series in reversed(self.series):
+            if hours * 3600 / series.seconds >= points:
+                return series
+        return None
+
+    def get(self, name: str) -> RollupSeries:
+        """依名稱取得序列"""
+        for series in self.series:
+            if series.name == name:
+                return series
+        raise ValueError(f"Unknown resolution: {name}")
+
+    def clear(self):
+        """刪除所有彙總"""
+        for series in self.series:
+            series.clear()
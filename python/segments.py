@@ -0,0 +1,445 @@
+"""
+時間分段日誌 - 每天（或每小時）一個 JSONL 分段檔
+生物機電工程概論 期末專題
+
+database.py 的 JSONL 後端把讀數依記錄時間寫入 data/segments/ 下的分段檔：
+- <日期>.jsonl：目前時段的讀數，只附加到檔尾
+- <日期>.blk：已結束（封存）的時段，以 gorilla.py 的壓縮區塊格式保存
+- <日期>.csv：同內容的試算表格式，可用 Excel 開啟
+- manifest.json：每個分段的最早/最晚時間、筆數與是否已封存
+
+開始寫入新的分段時，前一個分段會轉為壓縮區塊（DB_COMPRESS_SEALED）。
+
+範圍查詢只開啟與範圍重疊的分段；清理舊數據時整個過期分段直接刪除檔案，
+不需要過濾或重寫其他分段。
+
+並行讀取：snapshot() 回傳索引的唯讀快照。寫入時只在尾端附加，刪除與封存以新的陣列
+取代舊的（copy-on-write）；被封存或過期的分段檔先列入 take_retired()，
+由 database.py 等到沒有快照仍在使用時才刪除，讀取中的快照不會讀到消失的檔案。
+"""
+
+import copy
+import csv
+import json
+import os
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import gorilla
+import logfile
+
+
+# 分段時間格式（名稱依字典順序排列即為時間順序）
+PARTITION_FORMATS = {
+    'day': '%Y-%m-%d',
+    'hour': '%Y-%m-%d_%H'
+}
+
+# 已封存分段的副檔名
+SEALED_SUFFIX = '.blk'
+
+CSV_HEADER = ['id', 'temperature', 'humidity', 'heat_index', 'air_quality', 'recorded_at', 'device_id']
+
+
+def _csv_row(reading: Dict) -> List:
+    """將一筆紀錄轉為 CSV 欄位"""
+    return [
+        reading['id'],
+        reading['temperature'],
+        reading['humidity'],
+        reading.get('heat_index', ''),
+        reading.get('air_quality', ''),
+        reading['recorded_at'],
+        reading.get('device_id', '')
+    ]
+
+
+class SegmentLog:
+    """依時間分段的 JSONL 日誌與其位置索引"""
+
+    def __init__(self, directory: Path, partition: str = 'day', compress: bool = True):
+        """
+        初始化分段日誌
+
+        Args:
+            directory: 分段檔所在目錄
+            partition: 分段單位，"day" 或 "hour"
+            compress: 開始新的分段時將前一個分段轉為壓縮區塊
+        """
+        self.directory = Path(directory)
+        self.manifest_file = self.directory / "manifest.json"
+        self.format = PARTITION_FORMATS.get(partition, PARTITION_FORMATS['day'])
+        self.partition = partition if partition in PARTITION_FORMATS else 'day'
+        self.compress = compress
+
+        # 分段名稱、第一筆的全域索引位置、最早/最晚時間（平行列表，依時間排序）
+        self.names: List[str] = []
+        self.firsts = array('q')
+        self.mins = array('d')
+        self.maxs = array('d')
+
+        # 各分段是否已封存（與 names 平行）
+        self.sealed: List[bool] = []
+
+        # 每筆有效紀錄在其分段檔中的位置（JSONL 為位元組位置，壓縮區塊為第幾筆）
+        self.offsets = array('q')
+
+        # 已不在索引中、等待刪除的分段檔（可能仍被快照讀取）
+        self.retired: set = set()
+        self._retiring: List[Path] = []
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def segment_name(self, epoch: float) -> str:
+        """取得時間所屬的分段名稱（本地時間）"""
+        return datetime.fromtimestamp(epoch).strftime(self.format)
+
+    def path(self, name: str, suffix: str = '.jsonl') -> Path:
+        """分段檔路徑"""
+        return self.directory / f"{name}{suffix}"
+
+    def is_sealed(self, name: str) -> bool:
+        """分段是否已轉為壓縮區塊"""
+        return self.path(name, SEALED_SUFFIX).exists()
+
+    def files(self) -> List[Path]:
+        """所有分段檔（JSONL 與壓縮區塊，不含等待刪除的檔案），依時間排序"""
+        if not self.directory.exists():
+            return []
+        sealed = set(path.stem for path in self.directory.glob(f'*{SEALED_SUFFIX}'))
+        paths = [path for path in self.directory.glob('*.jsonl') if path.stem not in sealed]
+        paths += [self.path(name, SEALED_SUFFIX) for name in sealed]
+        return sorted((path for path in paths if path not in self.retired), key=lambda path: path.stem)
+
+    def listing(self) -> List[List[Any]]:
+        """所有分段檔的 [名稱, 是否已封存]（檢查點用來比對分段是否有變動）"""
+        return [[path.stem, path.suffix == SEALED_SUFFIX] for path in self.files()]
+
+    def exists(self) -> bool:
+        """是否已有任何分段檔"""
+        return bool(self.files())
+
+    def read(self, name: str, start: int = 0) -> Iterator[Dict[str, Any]]:
+        """從分段內的位置 start 開始依序產生紀錄"""
+        if self.is_sealed(name):
+            return gorilla.iter_readings(self.path(name, SEALED_SUFFIX), start)
+        return (reading for _, reading in logfile.scan(self.path(name), start))
+
+    # ========== 載入 ==========
+
+    def load(self, deleted_before: Optional[float] = None) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """
+        依時間順序掃描所有分段並重建位置索引，逐筆產生有效紀錄的 (epoch, 紀錄)
+
+        早於 deleted_before 的紀錄不會進入索引（清理時只刪除部分內容的分段）。
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._reset()
+
+        # 封存完成但未刪除原檔（寫入途中中斷），壓縮區塊已完整寫入
+        for path in self.directory.glob(f'*{SEALED_SUFFIX}'):
+            leftover = self.path(path.stem)
+            if leftover.exists() and leftover not in self.retired:
+                leftover.unlink()
+
+        for path in self.files():
+            yield from self.replay(path.stem, 0, deleted_before)
+
+        self.save_manifest()
+
+    def replay(self, name: str, start: int = 0,
+               deleted_before: Optional[float] = None) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """
+        從分段內的位置 start 開始讀取並加入位置索引，逐筆產生有效紀錄的 (epoch, 紀錄)
+
+        用於載入全部分段，以及從檢查點還原後讀取之後才附加的紀錄。
+        """
+        sealed = self.is_sealed(name)
+        if sealed:
+            rows = enumerate(gorilla.iter_readings(self.path(name, SEALED_SUFFIX), start), start)
+        else:
+            logfile.repair_tail(self.path(name))
+            rows = logfile.scan(self.path(name), start)
+
+        for offset, reading in rows:
+            epoch = datetime.fromisoformat(reading['recorded_at']).timestamp()
+            if deleted_before is not None and epoch < deleted_before:
+                continue
+            self._index(name, epoch, offset, sealed)
+            yield epoch, reading
+
+    def _reset(self):
+        """清空位置索引（以新的陣列取代，快照仍保有舊的）"""
+        self.names = []
+        self.sealed = []
+        self.firsts = array('q')
+        self.mins = array('d')
+        self.maxs = array('d')
+        self.offsets = array('q')
+
+    def _index(self, name: str, epoch: float, offset: int, sealed: bool = False):
+        """將一筆紀錄加入位置索引"""
+        if not self.names or self.names[-1] != name:
+            self.names.append(name)
+            self.sealed.append(sealed)
+            self.firsts.append(len(self.offsets))
+            self.mins.append(epoch)
+            self.maxs.append(epoch)
+        else:
+            self.mins[-1] = min(self.mins[-1], epoch)
+            self.maxs[-1] = max(self.maxs[-1], epoch)
+        self.offsets.append(offset)
+
+    # ========== 檢查點 ==========
+
+    def arrays(self) -> Dict[str, array]:
+        """位置索引的陣列（寫入檢查點用，分段名稱另外保存）"""
+        return {'firsts': self.firsts, 'mins': self.mins, 'maxs': self.maxs, 'offsets': self.offsets}
+
+    def restore(self, names: List[str], arrays: Dict[str, array]):
+        """從分段名稱與 arrays() 的結果還原位置索引"""
+        self.names = list(names)
+        self.sealed = [self.is_sealed(name) for name in self.names]
+        self.firsts = arrays['firsts']
+        self.mins = arrays['mins']
+        self.maxs = arrays['maxs']
+        self.offsets = arrays['offsets']
+
+    # ========== 寫入 ==========
+
+    def append(self, records: List[Dict[str, Any]], epochs: List[float]):
+        """
+        附加紀錄到所屬分段（記錄時間不遞增時寫入目前最後一個分段）
+
+        多筆紀錄時每個分段以單次寫入加 fsync 提交；單筆時直接附加。
+
+        Args:
+            records: 已指定 ID 的紀錄
+            epochs: 各紀錄的 epoch 時間
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        new_segment = False
+
+        start = 0
+        while start < len(records):
+            name = self.segment_name(epochs[start])
+            if self.names and name < self.names[-1]:
+                name = self.names[-1]
+
+            # 開始新的分段時封存前一個分段
+            if self.compress and self.names and name != self.names[-1]:
+                self.seal(len(self.names) - 1)
+            if self.retired:
+                self._reclaim(name)
+
+            # 同一分段的連續紀錄一起寫入
+            stop = start + 1
+            while stop < len(records) and max(self.segment_name(epochs[stop]), name) == name:
+                stop += 1
+            group = records[start:stop]
+
+            path = self.path(name)
+            if len(group) == 1:
+                offsets = [logfile.append(path, group[0])]
+            else:
+                offsets = logfile.append_many(path, group)
+
+            csv_path = self.path(name, '.csv')
+            write_header = not csv_path.exists()
+            with open(csv_path, 'a', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(CSV_HEADER)
+                writer.writerows(_csv_row(reading) for reading in group)
+
+            new_segment = new_segment or not self.names or self.names[-1] != name
+            for epoch, offset in zip(epochs[start:stop], offsets):
+                self._index(name, epoch, offset)
+            start = stop
+
+        if new_segment:
+            self.save_manifest()
+
+    def seal(self, k: int):
+        """
+        將第 k 個分段轉為壓縮區塊並刪除原本的 JSONL 檔
+
+        索引中該分段的位置由位元組位置改為第幾筆。
+        """
+        name = self.names[k]
+        path = self.path(name)
+        if not path.exists() or self.is_sealed(name):
+            return
+
+        rows = {}
+        readings = []
+        for offset, reading in logfile.scan(path):
+            rows[offset] = len(readings)
+            readings.append(reading)
+
+        gorilla.write_file(self.path(name, SEALED_SUFFIX), readings)
+        self._retire(path)
+
+        # 快照仍以位元組位置讀取原本的 JSONL 檔，索引改寫在新的陣列上
+        offsets = array('q', self.offsets)
+        for i in range(self.firsts[k], self._stop(k)):
+            offsets[i] = rows[offsets[i]]
+        sealed = list(self.sealed)
+        sealed[k] = True
+        self.offsets = offsets
+        self.sealed = sealed
+        self.save_manifest()
+
+    # ========== 讀取 ==========
+
+    def snapshot(self) -> 'SegmentLog':
+        """
+        目前位置索引的唯讀快照
+
+        位置陣列與原物件共用：之後的附加只會在快照範圍之後，
+        刪除與封存則以新的陣列取代，因此快照看到的內容不會改變。
+        """
+        frozen = copy.copy(self)
+        frozen.names = list(self.names)
+        frozen.sealed = list(self.sealed)
+        frozen._retiring = []
+        return frozen
+
+    def iter_from(self, index: int) -> Iterator[Dict[str, Any]]:
+        """
+        從第 index 筆有效紀錄開始依序產生紀錄，直到最後一個分段結束
+
+        只開啟 index 所在及之後的分段；呼叫端取得足夠筆數後停止迭代即可。
+        分段依索引中的封存狀態讀取；分段檔已被清空時停止。
+        """
+        if index >= len(self.offsets):
+            return
+
+        segment = bisect_right(self.firsts, index) - 1
+        for k in range(segment, len(self.names)):
+            start = self.offsets[index] if k == segment else self.offsets[self.firsts[k]]
+            name = self.names[k]
+            if self.sealed[k]:
+                path = self.path(name, SEALED_SUFFIX)
+                if not path.exists():
+                    return
+                yield from gorilla.iter_readings(path, start)
+            else:
+                path = self.path(name)
+                if not path.exists():
+                    return
+                yield from (reading for _, reading in logfile.scan(path, start))
+
+    def _stop(self, k: int) -> int:
+        """第 k 個分段最後一筆之後的全域索引位置"""
+        return self.firsts[k + 1] if k + 1 < len(self.firsts) else len(self.offsets)
+
+    # ========== 刪除 ==========
+
+    def drop_prefix(self, count: int, next_epoch: Optional[float] = None) -> int:
+        """
+        從索引刪除最前面 count 筆，並刪除其中已完全過期的分段檔
+
+        Args:
+            count: 刪除的筆數
+            next_epoch: 刪除後第一筆有效紀錄的時間（更新該分段的最早時間）
+
+        Returns:
+            刪除的分段檔數量
+        """
+        count = min(count, len(self.offsets))
+
+        # 所有紀錄都在刪除範圍內的分段
+        expired = 0
+        while expired < len(self.names) and self._stop(expired) <= count:
+            expired += 1
+
+        for name in self.names[:expired]:
+            self._retire(self.path(name))
+            self._retire(self.path(name, SEALED_SUFFIX))
+            csv_path = self.path(name, '.csv')
+            if csv_path.exists():
+                csv_path.unlink()
+
+        # 以新的陣列取代（copy-on-write），快照仍保有刪除前的索引
+        self.names = self.names[expired:]
+        self.sealed = self.sealed[expired:]
+        self.firsts = array('q', (max(0, first - count) for first in self.firsts[expired:]))
+        self.mins = self.mins[expired:]
+        self.maxs = self.maxs[expired:]
+        self.offsets = self.offsets[count:]
+        if self.mins and next_epoch is not None:
+            self.mins[0] = next_epoch
+
+        self.save_manifest()
+        return expired
+
+    def clear(self):
+        """刪除所有分段檔（立即刪除，之後新的分段可能沿用相同名稱）"""
+        self.drop_prefix(len(self.offsets))
+        self.take_retired()
+        self.remove_retired(list(self.retired))
+        for path in self.files() + list(self.directory.glob('*.csv')):
+            path.unlink()
+        self.save_manifest()
+
+    def _retire(self, path: Path):
+        """把不再需要的分段檔列入等待刪除"""
+        if path.exists():
+            self.retired.add(path)
+            self._retiring.append(path)
+
+    def _reclaim(self, name: str):
+        """
+        重新使用等待刪除的分段名稱（例如清理刪除了目前分段後又收到同一時段的讀數）
+
+        JSONL 檔保留並繼續附加，其中已過期的紀錄載入時由 deleted_before 略過；
+        同名的壓縮區塊立即刪除。
+        """
+        path = self.path(name)
+        if path in self.retired:
+            self.retired.discard(path)
+        sealed = self.path(name, SEALED_SUFFIX)
+        if sealed in self.retired:
+            self.remove_retired([sealed])
+
+    def take_retired(self) -> List[Path]:
+        """取得上次呼叫之後列入等待刪除的分段檔"""
+        paths, self._retiring = self._retiring, []
+        return paths
+
+    def remove_retired(self, paths: List[Path]):
+        """刪除等待刪除的分段檔（沒有快照仍在使用時呼叫；已被 clear() 刪除的略過）"""
+        for path in paths:
+            if path not in self.retired:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.retired.discard(path)
+
+    # ========== Manifest ==========
+
+    def save_manifest(self):
+        """寫入各分段的最早/最晚時間與筆數（先寫暫存檔再取代）"""
+        segments = [
+            {
+                'name': name,
+                'min': datetime.fromtimestamp(self.mins[k]).isoformat(),
+                'max': datetime.fromtimestamp(self.maxs[k]).isoformat(),
+                'count': self._stop(k) - self.firsts[k],
+                'sealed': self.is_sealed(name)
+            }
+            for k, name in enumerate(self.names)
+        ]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'partition': self.partition, 'segments': segments}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.manifest_file)
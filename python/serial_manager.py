@@ -0,0 +1,285 @@
+"""
+多埠 Serial 管理模組 - 同時讀取多個 Arduino
+生物機電工程概論 期末專題
+
+一台電腦連接多個 Arduino 時，為每個埠建立一個 ArduinoReader（serial_reader.py），
+每筆讀數帶有來源埠號（port）與裝置名稱（device_id）：
+- POSIX（Linux / macOS）：所有埠由同一個執行緒以 selectors 等待，任一埠有資料時才醒來整批讀取，
+  停止時以 pipe 喚醒；埠數增加不會增加執行緒，閒置時也不會醒來
+- Windows：Serial handle 無法 select，改為每個埠一個事件驅動的讀取執行緒
+  （阻塞在驅動程式中等待資料，不輪詢）
+
+某個埠中斷（例如 Arduino 被拔除）時只停止該埠，其餘的埠繼續讀取；
+啟用 SERIAL_RECONNECT 時由一個短暫的執行緒等待該埠重新出現並重新連接（啟動時未連接的埠也是），
+成功後交回原本的讀取方式，執行緒隨即結束。
+指令可廣播到所有埠（send_command 不等待、acommand 等待各埠的回應）。
+
+設定方式見 config.py 的 SERIAL_PORTS，或使用 python main.py --ports COM3,COM4
+"""
+
+import asyncio
+import os
+import selectors
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable, Tuple, Set
+
+import serial
+
+from config import SERIAL_PORTS, DEVICE_ID
+from serial_reader import ArduinoReader, find_arduino_ports
+
+
+def parse_ports(spec: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    解析 SERIAL_PORTS 格式的設定
+
+    Args:
+        spec: 以逗號分隔的埠號，可用 = 指定裝置名稱（例如 "COM3=greenhouse,COM4"）；
+              "auto" 為自動偵測所有 Arduino
+
+    Returns:
+        [(埠號, 裝置名稱)]，未指定名稱時為 None
+    """
+    spec = spec.strip()
+    if spec.lower() == 'auto':
+        return [(port, None) for port in find_arduino_ports()]
+
+    ports = []
+    for item in spec.split(','):
+        port, _, name = item.partition('=')
+        if port.strip():
+            ports.append((port.strip(), name.strip() or None))
+    return ports
+
+
+def port_device_id(port: str) -> str:
+    """未指定名稱的埠所使用的裝置名稱（DEVICE_ID 加上埠名稱，例如 default-COM4、default-ttyUSB0）"""
+    return f"{DEVICE_ID}-{os.path.basename(port)}"
+
+
+class SerialManager:
+    """多個 Arduino 的讀取管理器"""
+
+    def __init__(self, ports: List[Tuple[str, Optional[str]]] = None, baud_rate: int = None,
+                 use_selector: bool = None):
+        """
+        初始化管理器
+
+        Args:
+            ports: [(埠號, 裝置名稱)]，名稱為 None 時使用 port_device_id()（預設使用 SERIAL_PORTS）
+            baud_rate: 通訊速率（預設使用 config.py 設定）
+            use_selector: 是否由單一執行緒 select 所有埠（預設只在 POSIX 啟用）
+        """
+        if ports is None:
+            ports = parse_ports(SERIAL_PORTS)
+
+        self.readers: Dict[str, ArduinoReader] = {}
+        for port, name in ports:
+            if port not in self.readers:
+                self.readers[port] = ArduinoReader(port=port, baud_rate=baud_rate,
+                                                   device_id=name or port_device_id(port), read_mode='event')
+
+        self.use_selector = os.name == 'posix' if use_selector is None else use_selector
+        self.connected: Dict[str, ArduinoReader] = {}
+        self.on_error_callback: Optional[Callable[[str, str], None]] = None
+        self.is_running = False
+        self._callback: Optional[Callable[[Dict], None]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._reconnect_threads: Set[threading.Thread] = set()
+        self._reconnected: deque = deque()  # 已重新連接、等待 select 執行緒登記的讀取器
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._wake_read: Optional[int] = None
+        self._wake_write: Optional[int] = None
+
+    @property
+    def primary(self) -> Optional[ArduinoReader]:
+        """第一個已連接的讀取器"""
+        return next(iter(self.connected.values()), None)
+
+    def connect(self, ready_timeout: float = None) -> int:
+        """
+        同時連接所有埠（各埠等待 Arduino 就緒的時間互相重疊）
+
+        Args:
+            ready_timeout: 等待就緒訊息的最長秒數（預設使用 config.py 的 SERIAL_READY_TIMEOUT）
+
+        Returns:
+            連接成功的埠數
+        """
+        if not self.readers:
+            return 0
+
+        readers = list(self.readers.values())
+        with ThreadPoolExecutor(max_workers=len(readers)) as executor:
+            results = list(executor.map(lambda reader: reader.connect(ready_timeout), readers))
+
+        self.connected = {reader.port: reader for reader, ok in zip(readers, results) if ok}
+        return len(self.connected)
+
+    def start(self, callback: Callable[[Dict], None]):
+        """
+        開始讀取所有已連接的埠
+
+        Args:
+            callback: 每次收到數據時呼叫的函數（數據帶有 port 與 device_id）
+        """
+        self.is_running = True
+        self._callback = callback
+
+        if self.use_selector:
+            self._selector = selectors.DefaultSelector()
+            self._wake_read, self._wake_write = os.pipe()
+            self._selector.register(self._wake_read, selectors.EVENT_READ, None)
+            for reader in self.connected.values():
+                self._listen(reader)
+
+            self._thread = threading.Thread(target=self._select_loop, daemon=True)
+            self._thread.start()
+            print(f"[OK] Listening to {len(self.connected)} Arduino(s) on one thread: {', '.join(self.connected)}")
+        else:
+            for reader in self.connected.values():
+                reader.start_continuous_read(callback)
+
+        # 啟動時沒有連接的埠：等待插上
+        for reader in self.readers.values():
+            if reader.port not in self.connected and reader.auto_reconnect:
+                self._supervise(reader)
+
+    def _listen(self, reader: ArduinoReader):
+        """把讀取器交給 select 執行緒"""
+        reader.on_data_callback = self._callback
+        reader.is_running = True
+        reader.listening = True
+        self._selector.register(reader.serial.fileno(), selectors.EVENT_READ, reader)
+        self.connected[reader.port] = reader
+
+    def _select_loop(self):
+        """等待任一埠有資料，整批讀取後處理完整的行（在背景執行緒中運行）"""
+        while self.is_running:
+            for key, _ in self._selector.select():
+                reader = key.data
+                if reader is None:
+                    # stop() 或重新連接完成時喚醒
+                    os.read(self._wake_read, 64)
+                    if not self.is_running:
+                        return
+                    while self._reconnected:
+                        self._listen(self._reconnected.popleft())
+                    continue
+                try:
+                    reader.drain()
+                except (serial.SerialException, OSError) as e:
+                    self._drop(reader, e)
+                except Exception as e:
+                    print(f"[ERROR] Read loop error ({reader.port}): {e}")
+
+    def _drop(self, reader: ArduinoReader, error: Exception):
+        """停止讀取中斷的埠（其餘的埠不受影響），視設定開始重新連接"""
+        print(f"[ERROR] Arduino on {reader.port} disconnected: {error}")
+        self._selector.unregister(reader.serial.fileno())
+        self.connected.pop(reader.port, None)
+        reader.listening = False
+        if self.on_error_callback:
+            self.on_error_callback(reader.port, str(error))
+
+        if reader.auto_reconnect and self.is_running:
+            self._supervise(reader)
+        else:
+            reader.is_running = False
+            reader.disconnect()
+
+    def _supervise(self, reader: ArduinoReader):
+        """以短暫的執行緒重新連接 reader，成功後交回讀取（select 執行緒或讀取器本身的執行緒）"""
+        def run():
+            try:
+                if not reader.reconnect() or not self.is_running:
+                    return
+                if self.use_selector:
+                    self._reconnected.append(reader)
+                    os.write(self._wake_write, b'\1')
+                else:
+                    self.connected[reader.port] = reader
+                    reader.start_continuous_read(self._callback)
+            finally:
+                self._reconnect_threads.discard(threading.current_thread())
+
+        thread = threading.Thread(target=run, daemon=True)
+        self._reconnect_threads.add(thread)
+        thread.start()
+
+    def stop(self):
+        """停止讀取並中斷所有連接（包括重新連接中的埠）"""
+        self.is_running = False
+
+        if self._wake_write is not None:
+            os.write(self._wake_write, b'\0')
+        if self._thread:
+            self._thread.join(timeout=2)
+
+        for reader in self.readers.values():
+            if reader.read_thread:
+                reader.stop_continuous_read()
+            reader.is_running = False
+            reader.listening = False
+            reader.disconnect()
+        for thread in list(self._reconnect_threads):
+            thread.join(timeout=2)
+        self.connected = {}
+        self._reconnected.clear()
+
+        if self._selector:
+            self._selector.close()
+            for fd in (self._wake_read, self._wake_write):
+                os.close(fd)
+            self._selector = self._wake_read = self._wake_write = None
+
+    def send_command(self, command: str, port: str = None) -> bool:
+        """
+        發送指令到 Arduino
+
+        Args:
+            command: 指令字串（如 "BUZZ"）
+            port: 只發送到此埠，None 為所有已連接的埠
+
+        Returns:
+            是否至少有一個埠發送成功
+        """
+        readers = [self.connected[port]] if port in self.connected else (
+            [] if port is not None else list(self.connected.values()))
+        results = [reader.send_command(command) for reader in readers]
+        return any(results)
+
+    async def acommand(self, command: str, port: str = None,
+                       timeout: float = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        發送指令並等待各個 Arduino 的回應（同時等待，總時間約為最慢的一個）
+
+        Args:
+            command: 指令字串（serial_reader.COMMAND_REPLIES 中的指令）
+            port: 只發送到此埠，None 為所有已連接的埠
+            timeout: 等待回應的秒數（預設 SERIAL_COMMAND_TIMEOUT）
+
+        Returns:
+            {埠號: 回應的數據字典，逾時或發送失敗為 None}
+        """
+        readers = [self.connected[port]] if port in self.connected else (
+            [] if port is not None else list(self.connected.values()))
+        replies = await asyncio.gather(*(reader.acommand(command, timeout) for reader in readers))
+        return {reader.port: reply for reader, reply in zip(readers, replies)}
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """
+        各埠的狀態
+
+        Returns:
+            [{'port', 'device_id', 'connected', 'reconnects', 'last_data'}]
+        """
+        return [{
+            'port': port,
+            'device_id': reader.device_id,
+            'connected': reader.is_connected,
+            'reconnects': reader.reconnects,
+            'last_data': reader.get_last_data()
+        } for port, reader in self.readers.items()]
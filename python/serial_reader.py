@@ -1,37 +1,338 @@
 """
 Serial 讀取模組 - 與 Arduino 通訊
 生物機電工程概論 期末專題
+
+連續讀取有兩種模式（SERIAL_READ_MODE）：
+- event（預設）：阻塞等待 Serial 資料（POSIX 以 select，Windows 以 overlapped I/O），
+  一有資料就一次讀完所有已到達的位元組，再由行緩衝區（LineBuffer）重組出完整的行。
+  收到數據的延遲只取決於傳輸時間，閒置時每 SERIAL_TIMEOUT 秒才醒來一次
+- poll：舊版做法，每 0.1 秒檢查一次並讀取一行（每秒最多 10 行）
+
+傳輸格式有兩種（SERIAL_PROTOCOL）：
+- json（預設）：每行一個 JSON 物件
+- binary：連線後以 PROTOCOL:BINARY 指令要求 Arduino 改送二進位框架（每筆讀數 18 bytes，JSON 約 100 bytes），
+  並可再以 BAUD:<速率> 提高通訊速率（SERIAL_FAST_BAUD）。框架格式：
+      [0xA5][LEN][TYPE][PAYLOAD（LEN bytes）][CRC16 低位元組][CRC16 高位元組]
+  CRC16 為 CRC-16/CCITT-FALSE，涵蓋 LEN、TYPE 與 PAYLOAD。FrameDecoder 同時解讀框架與 JSON 行，
+  CRC 錯誤或資料遺失時跳到下一個同步位元組重新對齊；舊版 sketch 不回應協商指令時維持 JSON
+
+連線與重新連接：
+開啟埠後等待 Arduino 的就緒訊息 {"status": "ready"}（Arduino 沒有重置而直接送出讀數時也視為就緒），
+取代固定等待 2 秒。event 模式下埠中斷（例如 Arduino 被拔除）時由原本的讀取執行緒重新連接：
+每 HOTPLUG_INTERVAL 秒檢查埠是否重新出現（rescan 時也尋找其他 Arduino 埠），出現後立即開啟，
+開啟失敗時間隔加倍（最長 SERIAL_RECONNECT_MAX_DELAY 秒）；不會建立新的執行緒，停止時立即結束
+
+指令與回應（send_request / request / acommand）：
+Arduino 依序處理指令，每個指令的回應含有固定的鍵（COMMAND_REPLIES，例如 PING → pong、SET_COLOR → led）。
+發送時登記一個 Future，讀取端收到含有該鍵的回應時完成它，逾時（SERIAL_COMMAND_TIMEOUT）則以 TimeoutError 結束。
+回應由原本的讀取迴圈處理，讀數照常交給回呼函數，指令不需要等待或搶讀下一行
+
+測試與效能比較（使用 pty 模擬 Arduino，僅限 Linux / macOS）：
+    python bench_serial.py
 """
 
 import serial
 import serial.tools.list_ports
+import asyncio
+import binascii
 import json
+import os
+import struct
 import time
-from typing import Optional, Dict, Any, Callable
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, CancelledError, InvalidStateError
+from typing import Optional, Dict, Any, Callable, List, Union, Tuple
 import threading
 
-from config import SERIAL_PORT, SERIAL_BAUD_RATE, SERIAL_TIMEOUT
+from config import (SERIAL_PORT, SERIAL_BAUD_RATE, SERIAL_TIMEOUT, SERIAL_READ_MODE,
+                    SERIAL_PROTOCOL, SERIAL_FAST_BAUD, SERIAL_COMMAND_TIMEOUT, SERIAL_READY_TIMEOUT,
+                    SERIAL_RECONNECT, SERIAL_RECONNECT_MAX_DELAY, DEVICE_ID)
+
+
+# 單行最長位元組數（超過仍沒有換行時視為雜訊丟棄，避免緩衝區無限增長）
+MAX_LINE_BYTES = 4096
+
+# 協商指令（PROTOCOL / BAUD / PING）等待回應的秒數（Arduino 剛重置時需先完成 setup）
+NEGOTIATE_TIMEOUT = 5.0
+
+# 中斷後檢查埠是否重新出現的間隔（秒）；開啟失敗時的重試間隔從這裡開始加倍
+HOTPLUG_INTERVAL = 0.25
+
+# 各指令（":" 之前的部分）的回應所含的鍵；READ 的回應是一筆讀數（或讀取失敗）
+COMMAND_REPLIES = {
+    'PING': ('pong',),
+    'STATUS': ('status',),
+    'READ': ('temp', 'error'),
+    'TEST_LED': ('led',),
+    'SET_COLOR': ('led',),
+    'AUTO_COLOR': ('led',),
+    'BUZZ': ('buzzer',),
+    'SET_BUZZER': ('buzzer',),
+    'BUZZER_OFF': ('buzzer',),
+    'SILENT_ON': ('silent',),
+    'SILENT_OFF': ('silent',),
+    'PROTOCOL': ('protocol',),
+    'BAUD': ('baud',),
+}
+
+# ========== 二進位框架 ==========
+
+FRAME_SYNC = 0xA5
+FRAME_OVERHEAD = 5  # 同步位元組、LEN、TYPE 與 CRC16
+
+# 框架類型
+FRAME_READING = 0x01   # 感測器讀數
+FRAME_ERROR = 0x02     # 感測器讀取失敗
+FRAME_TEXT = 0x03      # JSON 文字（指令回應、狀態）
+
+# 讀數：溫度 ×10、濕度 ×10、體感溫度 ×10（int16 / uint16）、PPM（uint16）、品質等級（uint8）、讀取次數（uint32）
+READING_PAYLOAD = struct.Struct('<hHhHBI')
+ERROR_PAYLOAD = struct.Struct('<I')
+
+# 各類型 PAYLOAD 的長度（None 為不固定）；標頭不符時立即重新對齊，不等待損毀的 LEN 所宣稱的長度
+FRAME_LENGTHS = {FRAME_READING: READING_PAYLOAD.size, FRAME_ERROR: ERROR_PAYLOAD.size, FRAME_TEXT: None}
+
+HEAT_INDEX_MISSING = -32768
+AIR_QUALITY_MISSING = 0xFFFF
+QUALITY_NAMES = ('good', 'normal', 'bad')
+
+
+def frame_crc(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE（多項式 0x1021，初始值 0xFFFF）"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(frame_type: int, payload: bytes) -> bytes:
+    """組成一個框架（與 Arduino 的 sendFrame() 相同）"""
+    body = bytes((len(payload), frame_type)) + payload
+    return bytes((FRAME_SYNC,)) + body + struct.pack('<H', frame_crc(body))
+
+
+def encode_reading(temperature: float, humidity: float, heat_index: float = None, air_quality: float = None,
+                   quality: str = 'normal', count: int = 0) -> bytes:
+    """組成讀數框架（測試與模擬 Arduino 用）"""
+    return encode_frame(FRAME_READING, READING_PAYLOAD.pack(
+        round(temperature * 10),
+        round(humidity * 10),
+        HEAT_INDEX_MISSING if heat_index is None else round(heat_index * 10),
+        AIR_QUALITY_MISSING if air_quality is None else round(air_quality),
+        QUALITY_NAMES.index(quality),
+        count
+    ))
+
+
+def decode_frame(frame_type: int, payload: bytes) -> Union[Dict[str, Any], str, None]:
+    """
+    解開框架內容
+
+    Returns:
+        讀數與讀取失敗為與 JSON 格式相同的 dict，文字框架為 JSON 字串，未知類型為 None
+    """
+    if frame_type == FRAME_READING:
+        temperature, humidity, heat_index, air_quality, quality, count = READING_PAYLOAD.unpack(payload)
+        return {
+            'temp': temperature / 10,
+            'humidity': humidity / 10,
+            'heat_index': None if heat_index == HEAT_INDEX_MISSING else heat_index / 10,
+            'air_quality': None if air_quality == AIR_QUALITY_MISSING else air_quality,
+            'quality': QUALITY_NAMES[quality] if quality < len(QUALITY_NAMES) else None,
+            'count': count
+        }
+    if frame_type == FRAME_ERROR:
+        return {'error': 'Failed to read from DHT sensor', 'count': ERROR_PAYLOAD.unpack(payload)[0]}
+    if frame_type == FRAME_TEXT:
+        return payload.decode('utf-8', errors='replace')
+    return None
+
+
+class LineBuffer:
+    """把任意切割的位元組串流重組為完整的行"""
+
+    def __init__(self, max_line: int = MAX_LINE_BYTES):
+        self.max_line = max_line
+        self.dropped = 0
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        加入讀到的位元組
+
+        Args:
+            chunk: 任意長度的位元組（可能在一行的中間切斷）
+
+        Returns:
+            這次湊齊的完整行（已解碼並去除空白，空行不回傳）
+        """
+        self._buffer += chunk
+        if b'\n' not in chunk:
+            if len(self._buffer) > self.max_line:
+                self._buffer.clear()
+                self.dropped += 1
+            return []
+
+        *lines, rest = self._buffer.split(b'\n')
+        self._buffer = bytearray(rest)
+        result = []
+        for line in lines:
+            text = line.decode('utf-8', errors='replace').strip()
+            if text:
+                result.append(text)
+        return result
+
+    def clear(self):
+        """丟棄尚未完整的行"""
+        self._buffer.clear()
+
+
+class FrameDecoder:
+    """
+    二進位框架與 JSON 行混合串流的解碼器（binary 協定使用）
+
+    協商前後 Arduino 送出的 JSON 行（以 { 開頭）也能解讀，切換格式時不會遺失數據。
+    框架 CRC 錯誤、標頭不合法或其他無法辨識的位元組會被略過，
+    從下一個同步位元組或 { 重新對齊。
+    """
+
+    def __init__(self, max_line: int = MAX_LINE_BYTES):
+        self.max_line = max_line
+        self.frames = 0        # 解出的框架數
+        self.crc_errors = 0    # CRC 錯誤的框架數
+        self.dropped = 0       # 重新對齊時略過的位元組數（不含換行與空白）
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> List[Union[Dict[str, Any], str]]:
+        """
+        加入讀到的位元組
+
+        Args:
+            chunk: 任意長度的位元組（可能在框架或行的中間切斷）
+
+        Returns:
+            這次湊齊的項目：讀數框架為 dict，文字框架與 JSON 行為字串
+        """
+        buffer = self._buffer
+        buffer += chunk
+        items = []
+        position, size = 0, len(buffer)
+
+        while position < size:
+            byte = buffer[position]
+            if byte == FRAME_SYNC:
+                if size - position < 3:
+                    break
+                length, frame_type = buffer[position + 1], buffer[position + 2]
+                expected = FRAME_LENGTHS.get(frame_type, -1)
+                if expected == -1 or (expected is not None and length != expected):
+                    position = self._resync(position + 1, 1)
+                    continue
+                end = position + length + FRAME_OVERHEAD
+                if end > size:
+                    break
+                body = bytes(buffer[position + 1:end - 2])
+                if frame_crc(body) != buffer[end - 2] | buffer[end - 1] << 8:
+                    self.crc_errors += 1
+                    position = self._resync(position + 1, 1)
+                    continue
+                item = decode_frame(frame_type, body[2:])
+                if item is not None:
+                    items.append(item)
+                    self.frames += 1
+                position = end
+
+            elif byte == 0x7B:  # {
+                newline = buffer.find(b'\n', position)
+                sync = buffer.find(FRAME_SYNC, position, newline if newline != -1 else size)
+                if sync != -1:
+                    # 行還沒結束就出現框架：行已損毀，從框架繼續
+                    self.dropped += sync - position
+                    position = sync
+                elif newline != -1:
+                    text = buffer[position:newline].decode('utf-8', errors='replace').strip()
+                    items.append(text)
+                    position = newline + 1
+                else:
+                    if size - position > self.max_line:
+                        self.dropped += size - position
+                        position = size
+                    break
+
+            else:
+                position = self._resync(position)
+
+        del buffer[:position]
+        return items
+
+    def _resync(self, start: int, skipped: int = 0) -> int:
+        """
+        從 start 找到下一個同步位元組或 {
+
+        Args:
+            start: 開始尋找的位置
+            skipped: start 之前已放棄的位元組數（損毀框架的同步位元組）
+
+        Returns:
+            找到的位置，沒有時為緩衝區結尾（略過的位元組計入 dropped）
+        """
+        buffer = self._buffer
+        candidates = [index for index in (buffer.find(FRAME_SYNC, start), buffer.find(b'{', start)) if index != -1]
+        stop = min(candidates) if candidates else len(buffer)
+        self.dropped += skipped + len(buffer[start:stop].strip())
+        return stop
+
+    def clear(self):
+        """丟棄尚未完整的框架或行"""
+        self._buffer.clear()
 
 
 class ArduinoReader:
     """Arduino Serial 讀取器"""
     
-    def __init__(self, port: str = None, baud_rate: int = None):
+    def __init__(self, port: str = None, baud_rate: int = None, device_id: str = None,
+                 read_mode: str = None, protocol: str = None, reconnect: bool = None, rescan: bool = False):
         """
         初始化讀取器
         
         Args:
             port: Serial 埠號（預設使用 config.py 設定）
             baud_rate: 通訊速率（預設使用 config.py 設定）
+            device_id: 此 Arduino 的裝置名稱（預設使用 config.py 的 DEVICE_ID；
+                       Arduino 送出的 JSON 已有 device_id 時以其為準）
+            read_mode: 連續讀取模式 'event' 或 'poll'（預設使用 config.py 的 SERIAL_READ_MODE）
+            protocol: 傳輸格式 'json' 或 'binary'（預設使用 config.py 的 SERIAL_PROTOCOL）
+            reconnect: 中斷後是否自動重新連接（預設使用 config.py 的 SERIAL_RECONNECT）
+            rescan: 重新連接時原本的埠沒有出現，是否改用其他偵測到的 Arduino 埠（自動偵測埠號時使用）
         """
         self.port = port or SERIAL_PORT
         self.baud_rate = baud_rate or SERIAL_BAUD_RATE
+        self._initial_baud = self.baud_rate  # Arduino 重置後回到此速率
+        self.device_id = device_id or DEVICE_ID
+        self.read_mode = read_mode or SERIAL_READ_MODE
+        if self.read_mode not in ('event', 'poll'):
+            raise ValueError(f"read_mode must be 'event' or 'poll', got {self.read_mode!r}")
+        self.protocol = protocol or SERIAL_PROTOCOL
+        if self.protocol not in ('json', 'binary'):
+            raise ValueError(f"protocol must be 'json' or 'binary', got {self.protocol!r}")
+        self.binary_active = False  # Arduino 已確認改用二進位框架
         self.serial: Optional[serial.Serial] = None
+        self._buffer = FrameDecoder() if self.protocol == 'binary' else LineBuffer()
+        self._lines: deque = deque()  # 已湊齊、尚未處理的行（binary 協定時也包含已解開的讀數 dict）
         self.is_running = False
         self.read_thread: Optional[threading.Thread] = None
         self.on_data_callback: Optional[Callable[[Dict], None]] = None
         self.on_error_callback: Optional[Callable[[str], None]] = None
         self.last_data: Optional[Dict[str, Any]] = None
+        # 等待回應的指令 [(回應的鍵, Future, 期限)]，依發送順序
+        self._pending: deque = deque()
+        self._pending_lock = threading.Lock()
+        
+        self.auto_reconnect = SERIAL_RECONNECT if reconnect is None else reconnect
+        self.rescan = rescan
+        self.listening = False      # 有讀取迴圈（本身的執行緒或 SerialManager）正在處理此埠的資料
+        self.reconnecting = False
+        self.reconnects = 0
+        self._reconnect_ident: Optional[int] = None
+        self._stop_event = threading.Event()  # stop / disconnect 時設定，中斷重新連接的等待
+        self._open_lock = threading.Lock()     # 開啟與關閉埠互斥，停止時不會留下剛開啟的埠
     
     @staticmethod
     def list_available_ports() -> list:
@@ -39,46 +340,176 @@ class ArduinoReader:
         ports = serial.tools.list_ports.comports()
         return [(port.device, port.description) for port in ports]
     
-    def connect(self) -> bool:
+    @property
+    def is_connected(self) -> bool:
+        """埠已開啟且不在重新連接中"""
+        return self.serial is not None and self.serial.is_open and not self.reconnecting
+    
+    def connect(self, ready_timeout: float = None) -> bool:
         """
         連接到 Arduino
         
+        Args:
+            ready_timeout: 等待就緒訊息的最長秒數（預設使用 config.py 的 SERIAL_READY_TIMEOUT，0 為不等待）
+        
         Returns:
             是否連接成功
         """
+        self._stop_event.clear()
         try:
-            self.serial = serial.Serial(
-                port=self.port,
-                baudrate=self.baud_rate,
-                timeout=SERIAL_TIMEOUT
-            )
-            
-            # 等待 Arduino 重置
-            time.sleep(2)
-            
-            # 清空緩衝區
-            self.serial.reset_input_buffer()
-            
+            self._open()
             print(f"[OK] Connected to Arduino: {self.port}")
+            self._handshake(ready_timeout)
             return True
             
-        except serial.SerialException as e:
+        except (serial.SerialException, OSError) as e:
+            self._close()
             print(f"[ERROR] Connection failed: {e}")
             if self.on_error_callback:
                 self.on_error_callback(str(e))
             return False
     
+    def _open(self):
+        """開啟埠並清空緩衝區（Arduino 會因此重置，回到初始的通訊速率與 JSON 格式）"""
+        self.baud_rate = self._initial_baud
+        port = serial.Serial(port=self.port, baudrate=self.baud_rate, timeout=SERIAL_TIMEOUT)
+        with self._open_lock:
+            if self._stop_event.is_set():
+                port.close()
+                raise serial.SerialException("stopped")
+            self.serial = port
+        
+        self.serial.reset_input_buffer()
+        self._buffer.clear()
+        self._lines.clear()
+        self.binary_active = False
+    
+    def _handshake(self, ready_timeout: float = None):
+        """等待就緒訊息，並視設定要求改用二進位框架（舊版 sketch 不回應時維持 JSON）"""
+        self.wait_ready(ready_timeout)
+        if self.protocol == 'binary':
+            self.negotiate()
+    
+    def wait_ready(self, timeout: float = None) -> bool:
+        """
+        等待 Arduino 的就緒訊息 {"status": "ready"}
+        
+        收到其他數據（例如讀數）表示 Arduino 沒有重置，也視為就緒（數據留給之後的讀取）。
+        
+        Args:
+            timeout: 最長秒數（預設使用 config.py 的 SERIAL_READY_TIMEOUT，0 為不等待）
+        
+        Returns:
+            是否在時間內就緒
+        
+        Raises:
+            serial.SerialException: 等待期間埠中斷
+        """
+        timeout = SERIAL_READY_TIMEOUT if timeout is None else timeout
+        if timeout <= 0:
+            return True
+        
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            data = self._next_data()
+            if isinstance(data, dict):
+                if data.get('status') != 'ready':
+                    self._lines.appendleft(data)
+                print(f"[OK] Arduino ready on {self.port} ({time.monotonic() - started:.2f} s)")
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                print(f"[WARN] No ready message from {self.port} within {timeout:g} s")
+                return False
+            self._fill(block=True, timeout=remaining)
+    
+    def _close(self):
+        """關閉埠（喚醒阻塞在 read() 中的讀取執行緒），等待中的指令以 SerialException 結束"""
+        with self._open_lock:
+            port = self.serial
+            if port and port.is_open:
+                try:
+                    port.cancel_read()
+                    port.close()
+                except (serial.SerialException, OSError):
+                    pass
+        
+        # 等待中的指令不會再收到回應
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        for _, future, _ in pending:
+            _settle(future, exception=serial.SerialException("Arduino disconnected"))
+    
     def disconnect(self):
-        """中斷連接"""
+        """中斷連接（也結束進行中的重新連接）"""
         self.is_running = False
+        self._stop_event.set()
         
-        if self.serial and self.serial.is_open:
-            self.serial.close()
+        was_open = self.serial is not None and self.serial.is_open
+        self._close()
+        if was_open:
             print("[OK] Arduino disconnected")
     
+    def reconnect(self) -> bool:
+        """
+        埠中斷後重新連接（阻塞直到成功，或 stop / disconnect）
+        
+        每 HOTPLUG_INTERVAL 秒檢查埠是否出現，出現後立即開啟並等待就緒訊息；
+        開啟失敗時間隔加倍，最長 SERIAL_RECONNECT_MAX_DELAY 秒。
+        
+        Returns:
+            是否已重新連接
+        """
+        self._close()
+        listening, self.listening = self.listening, False
+        self._reconnect_ident = threading.get_ident()
+        self.reconnecting = True
+        started = time.monotonic()
+        delay = HOTPLUG_INTERVAL
+        try:
+            while not self._stop_event.is_set():
+                port = self._find_port()
+                wait = HOTPLUG_INTERVAL
+                if port is not None:
+                    try:
+                        self.port = port
+                        self._open()
+                        self._handshake()
+                        if self._stop_event.is_set():
+                            break
+                        self.reconnects += 1
+                        print(f"[OK] Reconnected to Arduino: {self.port} ({time.monotonic() - started:.1f} s)")
+                        return True
+                    except (serial.SerialException, OSError) as e:
+                        self._close()
+                        if self._stop_event.is_set():
+                            break
+                        print(f"[WARN] Reconnect to {port} failed: {e} (retry in {delay:g} s)")
+                        wait = delay
+                        delay = min(delay * 2, SERIAL_RECONNECT_MAX_DELAY)
+                self._stop_event.wait(wait)
+            
+            self._close()
+            return False
+        finally:
+            self.reconnecting = False
+            self._reconnect_ident = None
+            self.listening = listening
+    
+    def _find_port(self) -> Optional[str]:
+        """重新連接時要開啟的埠：原本的埠，或 rescan 時其他偵測到的 Arduino 埠；都沒有時為 None"""
+        if _port_present(self.port):
+            return self.port
+        if self.rescan:
+            ports = _arduino_ports()
+            if ports:
+                return ports[0][0]
+        return None
+    
     def send_command(self, command: str) -> bool:
         """
-        發送指令到 Arduino
+        發送指令到 Arduino（不等待回應）
         
         Args:
             command: 指令字串（如 "READ", "STATUS", "PING"）
@@ -86,19 +517,267 @@ class ArduinoReader:
         Returns:
             是否發送成功
         """
+        return self._write(command)
+    
+    def _write(self, command: str, pending: Tuple = None) -> bool:
+        """寫入一行指令；pending 在寫入前登記（回應可能在 write() 返回前就到達），登記順序與發送順序相同"""
         if not self.serial or not self.serial.is_open:
             return False
+        if self.reconnecting and threading.get_ident() != self._reconnect_ident:
+            return False  # 重新連接中，只有協商指令可以發送
         
-        try:
-            self.serial.write(f"{command}\n".encode())
+        with self._pending_lock:
+            if pending:
+                self._pending.append(pending)
+            try:
+                self.serial.write(f"{command}\n".encode())
+            except Exception as e:
+                print(f"[ERROR] Send command failed: {e}")
+                if pending:
+                    self._pending.remove(pending)
+                return False
             return True
-        except Exception as e:
-            print(f"[ERROR] Send command failed: {e}")
+    
+    def send_request(self, command: str, timeout: float = None) -> Optional[Future]:
+        """
+        發送指令並登記等待回應的 Future
+        
+        回應由讀取端（連續讀取的執行緒或 request()）收到時完成，讀數照常交給回呼函數。
+        
+        Args:
+            command: 指令字串（COMMAND_REPLIES 中的指令，可帶 ":" 參數）
+            timeout: 等待回應的秒數（預設 SERIAL_COMMAND_TIMEOUT）
+        
+        Returns:
+            完成時的結果為回應的數據字典，逾時為 concurrent.futures.TimeoutError；發送失敗為 None
+        """
+        keys = COMMAND_REPLIES.get(command.split(':', 1)[0])
+        if keys is None:
+            raise ValueError(f"no reply is defined for command {command!r}")
+        
+        timeout = SERIAL_COMMAND_TIMEOUT if timeout is None else timeout
+        future: Future = Future()
+        if not self._write(command, (keys, future, time.monotonic() + timeout)):
+            return None
+        return future
+    
+    def request(self, command: str, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """
+        發送指令並等待回應
+        
+        有讀取迴圈時只等待 Future；沒有時（例如連線時的協商）由呼叫端讀取 Serial，
+        其間收到的其他數據放回佇列，之後的讀取仍會取得。
+        
+        Args:
+            command: 指令字串
+            timeout: 等待回應的秒數（預設 SERIAL_COMMAND_TIMEOUT）
+        
+        Returns:
+            回應的數據字典，逾時或發送失敗為 None
+        """
+        timeout = SERIAL_COMMAND_TIMEOUT if timeout is None else timeout
+        future = self.send_request(command, timeout)
+        if future is None:
+            return None
+        
+        deadline = time.monotonic() + timeout
+        if not self.listening:
+            others = []
+            try:
+                while not future.done():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    data = self.read_blocking(timeout=remaining)
+                    if data is not None:
+                        others.append(data)
+            finally:
+                self._lines.extendleft(reversed(others))
+        
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except (FutureTimeoutError, CancelledError, serial.SerialException):
+            self._forget(future)
+            return None
+    
+    async def acommand(self, command: str, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """
+        request() 的非同步版本（不阻塞事件迴圈）
+        
+        Returns:
+            回應的數據字典，逾時或發送失敗為 None
+        """
+        timeout = SERIAL_COMMAND_TIMEOUT if timeout is None else timeout
+        if not self.listening:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.request, command, timeout)
+        
+        future = self.send_request(command, timeout)
+        if future is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, FutureTimeoutError, serial.SerialException):
+            self._forget(future)
+            return None
+    
+    def _resolve(self, data: Dict[str, Any]) -> bool:
+        """
+        以收到的數據完成第一個等待其回應鍵的指令，並讓逾時的指令結束
+        
+        Returns:
+            數據是否為指令回應（讀數不算，仍會交給回呼函數）
+        """
+        if not self._pending:
+            return False
+        
+        now = time.monotonic()
+        with self._pending_lock:
+            matched = None
+            for entry in list(self._pending):
+                keys, future, deadline = entry
+                if future.done() or deadline < now:
+                    self._pending.remove(entry)
+                    _settle(future, exception=FutureTimeoutError(f"no reply within timeout ({keys[0]})"))
+                elif matched is None and any(key in data for key in keys) and \
+                        (keys == ('status',) or 'status' not in data):
+                    # 狀態回報也含有 protocol 與 baud，只視為 STATUS 的回應
+                    self._pending.remove(entry)
+                    matched = future
+        if matched is None:
+            return False
+        _settle(matched, result=data)
+        return not ('temp' in data or 'error' in data)
+    
+    def _forget(self, future: Future):
+        """移除已放棄等待的指令"""
+        with self._pending_lock:
+            for entry in list(self._pending):
+                if entry[1] is future:
+                    self._pending.remove(entry)
+    
+    def _fill(self, block: bool, timeout: float = None) -> int:
+        """
+        把 Serial 中已到達的位元組一次全部讀入行緩衝區
+        
+        Args:
+            block: 沒有資料時是否等待第一個位元組（由 Serial 驅動程式喚醒，不輪詢）
+            timeout: 等待的最長秒數（預設為 SERIAL_TIMEOUT）
+        
+        Returns:
+            讀到的位元組數
+        """
+        waiting = self.serial.in_waiting
+        if waiting:
+            chunk = self.serial.read(waiting)
+        elif not block:
+            return 0
+        elif timeout is None or timeout >= SERIAL_TIMEOUT:
+            chunk = self.serial.read(1)
+        else:
+            self.serial.timeout = max(0.0, timeout)
+            try:
+                chunk = self.serial.read(1)
+            finally:
+                self.serial.timeout = SERIAL_TIMEOUT
+        
+        if chunk:
+            self._lines.extend(self._buffer.feed(chunk))
+        return len(chunk)
+    
+    def _parse_line(self, line: Union[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """解析一行 JSON 或已解開的框架（加上預設的 device_id 與來源埠），無法解析時回傳 None"""
+        if isinstance(line, str):
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[WARN] Cannot parse JSON: {line}")
+                return None
+        else:
+            data = line
+        
+        if isinstance(data, dict):
+            data.setdefault('device_id', self.device_id)
+            data['port'] = self.port
+        self.last_data = data
+        return data
+    
+    def _next_data(self) -> Optional[Dict[str, Any]]:
+        """從已湊齊的行中取出下一筆可解析的數據（指令回應交給等待中的 Future，不回傳）"""
+        while self._lines:
+            data = self._parse_line(self._lines.popleft())
+            if data is None:
+                continue
+            if isinstance(data, dict) and self._resolve(data):
+                continue
+            return data
+        return None
+    
+    def negotiate(self, fast_baud: int = None, timeout: float = NEGOTIATE_TIMEOUT) -> bool:
+        """
+        要求 Arduino 改用二進位框架，並視設定提高通訊速率
+        
+        Args:
+            fast_baud: 改用的通訊速率（預設使用 config.py 的 SERIAL_FAST_BAUD，0 為不變）
+            timeout: 每個指令等待回應的秒數
+        
+        Returns:
+            是否已改用二進位框架（舊版 sketch 不回應時為 False，維持 JSON）
+        """
+        reply = self.request("PROTOCOL:BINARY", timeout)
+        if not reply or reply.get('protocol') != 'binary':
+            print("[WARN] Arduino did not acknowledge binary protocol, using JSON")
             return False
+        self.binary_active = True
+        print("[OK] Binary frame protocol enabled")
+        
+        fast_baud = SERIAL_FAST_BAUD if fast_baud is None else fast_baud
+        if fast_baud and fast_baud != self.baud_rate:
+            self._switch_baud(fast_baud, timeout)
+        return True
+    
+    def _switch_baud(self, baud_rate: int, timeout: float) -> bool:
+        """
+        要求 Arduino 改用 baud_rate，收到確認後本機也切換，並以 PING 確認
+        
+        Returns:
+            是否已切換（Arduino 不支援該速率或確認失敗時維持原本的速率）
+        """
+        reply = self.request(f"BAUD:{baud_rate}", timeout)
+        if not reply or reply.get('baud') != baud_rate:
+            print(f"[WARN] Arduino did not accept {baud_rate} baud, staying at {self.baud_rate}")
+            return False
+        
+        self.serial.baudrate = baud_rate
+        if self.request("PING", timeout):
+            print(f"[OK] Baud rate: {self.baud_rate} -> {baud_rate}")
+            self.baud_rate = baud_rate
+            return True
+        
+        self.serial.baudrate = self.baud_rate
+        print(f"[WARN] No response at {baud_rate} baud, staying at {self.baud_rate}")
+        return False
+    
+    def get_link_stats(self) -> Dict[str, Any]:
+        """
+        傳輸狀態
+        
+        Returns:
+            {'protocol', 'baud_rate', 'frames', 'crc_errors', 'dropped_bytes'}（JSON 協定時框架統計為 0）
+        """
+        decoder = self._buffer
+        binary = isinstance(decoder, FrameDecoder)
+        return {
+            'protocol': 'binary' if self.binary_active else 'json',
+            'baud_rate': self.baud_rate,
+            'frames': decoder.frames if binary else 0,
+            'crc_errors': decoder.crc_errors if binary else 0,
+            'dropped_bytes': decoder.dropped
+        }
     
     def read_line(self) -> Optional[Dict[str, Any]]:
         """
-        讀取一行數據並解析 JSON
+        讀取一行數據並解析 JSON（不等待）
         
         Returns:
             解析後的數據字典，或 None
@@ -107,17 +786,9 @@ class ArduinoReader:
             return None
         
         try:
-            if self.serial.in_waiting > 0:
-                line = self.serial.readline().decode('utf-8').strip()
-                
-                if line:
-                    try:
-                        data = json.loads(line)
-                        self.last_data = data
-                        return data
-                    except json.JSONDecodeError:
-                        print(f"[WARN] Cannot parse JSON: {line}")
-                        return None
+            if not self._lines:
+                self._fill(block=False)
+            return self._next_data()
         
         except Exception as e:
             print(f"[ERROR] Read error: {e}")
@@ -128,7 +799,7 @@ class ArduinoReader:
     
     def read_blocking(self, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
         """
-        等待並讀取一行數據
+        等待並讀取一行數據（阻塞在 Serial 上，資料一到就回傳）
         
         Args:
             timeout: 等待逾時（秒）
@@ -136,13 +807,25 @@ class ArduinoReader:
         Returns:
             解析後的數據字典，或 None
         """
-        start_time = time.time()
+        if not self.serial or not self.serial.is_open:
+            return None
         
-        while time.time() - start_time < timeout:
-            data = self.read_line()
-            if data:
-                return data
-            time.sleep(0.1)
+        deadline = time.monotonic() + timeout
+        
+        try:
+            while True:
+                data = self._next_data()
+                if data:
+                    return data
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._fill(block=True, timeout=remaining)
+        
+        except Exception as e:
+            print(f"[ERROR] Read error: {e}")
+            if self.on_error_callback:
+                self.on_error_callback(str(e))
         
         return None
     
@@ -155,22 +838,81 @@ class ArduinoReader:
         """
         self.on_data_callback = callback
         self.is_running = True
+        self.listening = True
+        self._stop_event.clear()
         
         self.read_thread = threading.Thread(target=self._continuous_read_loop, daemon=True)
         self.read_thread.start()
         
-        print("[OK] Started listening to Arduino data...")
+        print(f"[OK] Started listening to Arduino data ({self.read_mode} mode)...")
+    
+    def drain(self) -> int:
+        """
+        讀取所有已到達的位元組並處理每一個完整的行（供外部的事件迴圈在埠可讀時呼叫）
+        
+        Returns:
+            讀到的位元組數
+        
+        Raises:
+            serial.SerialException: 埠已中斷（例如 Arduino 被拔除）
+        """
+        count = self._fill(block=True)
+        while self._lines:
+            self._dispatch(self._next_data())
+        return count
+    
+    def _dispatch(self, data: Optional[Dict[str, Any]]):
+        """把數據交給回呼函數（只處理包含溫濕度的數據）"""
+        if data and self.on_data_callback:
+            if 'temp' in data and 'humidity' in data:
+                self.on_data_callback(data)
     
     def _continuous_read_loop(self):
         """連續讀取迴圈（在背景執行緒中運行）"""
+        if self.read_mode == 'poll':
+            self._poll_read_loop()
+        else:
+            self._event_read_loop()
+    
+    def _event_read_loop(self):
+        """事件驅動讀取：阻塞等待資料，一次讀完所有已到達的位元組後處理每一個完整的行；埠中斷時重新連接"""
         while self.is_running:
             try:
-                data = self.read_line()
+                self.drain()
+                
+            except (serial.SerialException, OSError) as e:
+                if not self.is_running:
+                    break
+                if not self.handle_disconnect(e):
+                    break
                 
-                if data and self.on_data_callback:
-                    # 只處理包含溫濕度的數據
-                    if 'temp' in data and 'humidity' in data:
-                        self.on_data_callback(data)
+            except Exception as e:
+                if not self.is_running:
+                    break
+                print(f"[ERROR] Read loop error: {e}")
+                time.sleep(1)
+        self.listening = False
+    
+    def handle_disconnect(self, error: Exception) -> bool:
+        """
+        埠中斷時回報錯誤，並視設定重新連接（在讀取迴圈的執行緒中呼叫）
+        
+        Returns:
+            是否已重新連接（未啟用自動重新連接或已停止時為 False，埠已關閉）
+        """
+        print(f"[ERROR] Arduino on {self.port} disconnected: {error}")
+        if self.on_error_callback:
+            self.on_error_callback(str(error))
+        if not self.auto_reconnect:
+            self._close()
+            return False
+        return self.reconnect()
+    
+    def _poll_read_loop(self):
+        """輪詢讀取：每 0.1 秒讀取一行（舊版做法）"""
+        while self.is_running:
+            try:
+                self._dispatch(self.read_line())
                 
                 time.sleep(0.1)
                 
@@ -179,8 +921,11 @@ class ArduinoReader:
                 time.sleep(1)
     
     def stop_continuous_read(self):
-        """停止連續讀取"""
+        """停止連續讀取（也結束進行中的重新連接）"""
         self.is_running = False
+        self._stop_event.set()
+        if self.serial and self.serial.is_open:
+            self.serial.cancel_read()
         if self.read_thread:
             self.read_thread.join(timeout=2)
         print("[STOP] Stopped listening")
@@ -194,11 +939,9 @@ class ArduinoReader:
         請求立即讀取數據
         
         Returns:
-            讀取的數據，或 None
+            讀取的數據（感測器讀取失敗時為含有 error 的字典），或 None
         """
-        if self.send_command("READ"):
-            return self.read_blocking(timeout=5.0)
-        return None
+        return self.request("READ", timeout=5.0)
     
     def ping(self) -> bool:
         """
@@ -207,10 +950,50 @@ class ArduinoReader:
         Returns:
             是否連接正常
         """
-        if self.send_command("PING"):
-            response = self.read_blocking(timeout=2.0)
-            return response is not None and response.get('pong') == True
-        return False
+        response = self.request("PING", timeout=2.0)
+        return response is not None and response.get('pong') == True
+
+
+def _settle(future: Future, result: Any = None, exception: BaseException = None):
+    """完成 Future（已被取消或已完成時略過）"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+# 常見的 Arduino（與 USB 轉 Serial 晶片）描述
+ARDUINO_KEYWORDS = ('arduino', 'ch340', 'usb serial', 'usb-serial')
+
+
+def _arduino_ports() -> List[Tuple[str, str]]:
+    """描述符合 ARDUINO_KEYWORDS 的埠 [(埠號, 描述)]"""
+    return [(port, description) for port, description in ArduinoReader.list_available_ports()
+            if any(keyword in description.lower() for keyword in ARDUINO_KEYWORDS)]
+
+
+def _port_present(port: str) -> bool:
+    """埠是否存在（POSIX 檢查裝置檔，只需一次 stat；Windows 查詢系統的埠列表）"""
+    if os.name == 'posix':
+        return os.path.exists(port)
+    return any(device == port for device, _ in ArduinoReader.list_available_ports())
+
+
+def find_arduino_ports() -> List[str]:
+    """
+    自動尋找所有 Arduino 連接的埠號
+    
+    Returns:
+        找到的埠號列表（依系統列出的順序）
+    """
+    found = []
+    for port, description in _arduino_ports():
+        print(f"[DETECT] Found possible Arduino: {port} - {description}")
+        found.append(port)
+    return found
 
 
 def find_arduino_port() -> Optional[str]:
@@ -218,17 +1001,10 @@ def find_arduino_port() -> Optional[str]:
     自動尋找 Arduino 連接的埠號
     
     Returns:
-        找到的埠號，或 None
+        找到的第一個埠號，或 None
     """
-    ports = ArduinoReader.list_available_ports()
-    
-    for port, description in ports:
-        # 常見的 Arduino 描述
-        if any(keyword in description.lower() for keyword in ['arduino', 'ch340', 'usb serial', 'usb-serial']):
-            print(f"[DETECT] Found possible Arduino: {port} - {description}")
-            return port
-    
-    return None
+    ports = find_arduino_ports()
+    return ports[0] if ports else None
 
 
 if __name__ == "__main__":
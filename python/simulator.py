@@ -197,6 +197,9 @@ class SensorSimulator:
         self.is_running = False
         
         print("\n正在關閉模擬器...")
+
+        # 保存檢查點讓下次啟動更快
+        db.save_checkpoint()
         
         # 發送關閉通知
         if DISCORD_WEBHOOK_URL != "YOUR_WEBHOOK_URL_HERE":
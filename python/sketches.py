@@ -0,0 +1,171 @@
+"""
+分位數摘要模組 - 可合併的 t-digest
+生物機電工程概論 期末專題
+
+t-digest 以少量「質心」（平均值與權重）近似整個數值分布：
+- 分布兩端的質心很小，p5 / p95 等尾端分位數誤差很低
+- 兩個摘要可以直接合併，因此每個彙總時段各保存一份，
+  任意時間範圍的分位數只需合併範圍內的時段，不必排序原始讀數
+- 大小受 compression 限制（約 compression 個質心），與讀數筆數無關
+
+rollups.py 為每個時段、每個指標維護一份摘要，database.get_statistics 合併後
+回傳 p5 / p50 / p95 / p99。
+"""
+
+import math
+from typing import List, Optional, Iterable, Dict
+
+
+# 壓縮參數（質心數量上限約為此值）
+COMPRESSION = 100
+
+# 暫存多少筆新數值後才合併進質心
+BUFFER_FACTOR = 5
+
+# get_statistics 回傳的分位數
+PERCENTILES = (('p5', 0.05), ('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+class TDigest:
+    """合併式 t-digest（k1 尺度函數）"""
+
+    def __init__(self, compression: int = COMPRESSION):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[tuple] = []
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def add(self, value: float, weight: float = 1):
+        """加入一個數值"""
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= BUFFER_FACTOR * self.compression:
+            self._compress()
+
+    def copy(self) -> 'TDigest':
+        """複製摘要（讀取端合併時使用，不修改寫入中的摘要）"""
+        other = TDigest(self.compression)
+        other.means = list(self.means)
+        other.weights = list(self.weights)
+        other.count = self.count
+        other.min = self.min
+        other.max = self.max
+        other._buffer = list(self._buffer)
+        return other
+
+    def add_centroids(self, centroids: Iterable[List[float]], low: float = None, high: float = None):
+        """
+        加入另一份摘要的質心
+
+        Args:
+            centroids: to_list() 格式的 [[平均值, 權重], ...]
+            low, high: 該摘要的最小值與最大值（質心只保存平均值，提供時尾端估計較準確）
+        """
+        for mean, weight in centroids:
+            self.add(mean, weight)
+        if low is not None and low < self.min:
+            self.min = low
+        if high is not None and high > self.max:
+            self.max = high
+
+    def merge(self, other: 'TDigest'):
+        """合併另一份摘要"""
+        other._compress()
+        if other.count:
+            self.add_centroids(zip(other.means, other.weights), other.min, other.max)
+
+    def _k_limit(self, q: float) -> float:
+        """目前累計比例為 q 時，下一個質心最多可涵蓋到的累計比例（k1 尺度函數）"""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self):
+        """把暫存的數值與既有質心依平均值排序後重新合併"""
+        if not self._buffer:
+            return
+
+        items = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = self.count
+
+        means: List[float] = []
+        weights: List[float] = []
+        mean, weight = items[0]
+        so_far = 0.0
+        limit = total * self._k_limit(0)
+
+        for value, value_weight in items[1:]:
+            if so_far + weight + value_weight <= limit:
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                so_far += weight
+                limit = total * self._k_limit(so_far / total)
+                mean, weight = value, value_weight
+
+        means.append(mean)
+        weights.append(weight)
+        self.means = means
+        self.weights = weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估計分位數
+
+        Args:
+            q: 0 到 1 之間的比例
+
+        Returns:
+            估計值，沒有任何數值時為 None
+        """
+        self._compress()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+
+        means, weights = self.means, self.weights
+        index = q * self.count
+
+        # 第一個質心中心之前：在最小值與第一個質心之間內插
+        if index < weights[0] / 2:
+            return self.min + (means[0] - self.min) * index / (weights[0] / 2)
+
+        cumulative = weights[0] / 2
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i + 1]) / 2
+            if cumulative + step > index:
+                return means[i] + (means[i + 1] - means[i]) * (index - cumulative) / step
+            cumulative += step
+
+        # 最後一個質心中心之後：在最後一個質心與最大值之間內插
+        remaining = weights[-1] / 2
+        fraction = min(1.0, (index - cumulative) / remaining) if remaining else 1.0
+        return means[-1] + (self.max - means[-1]) * fraction
+
+    def percentiles(self, digits: int = 1) -> Dict[str, Optional[float]]:
+        """取得 PERCENTILES 中的各分位數（四捨五入）"""
+        result = {}
+        for name, q in PERCENTILES:
+            value = self.quantile(q)
+            result[name] = round(value, digits) if value is not None else None
+        return result
+
+    def to_list(self) -> List[List[float]]:
+        """轉為 [[平均值, 權重], ...]（寫入彙總檔用）"""
+        self._compress()
+        return [[round(mean, 3), weight] for mean, weight in zip(self.means, self.weights)]
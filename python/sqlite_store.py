@@ -0,0 +1,428 @@
+"""
+SQLite 儲存後端 - WAL 模式
+生物機電工程概論 期末專題
+
+在 config.py 設定 STORAGE_BACKEND = "sqlite" 後，database.py 會改用這個後端。
+- WAL 模式：讀取不會被寫入阻擋
+- recorded_at 索引：時間範圍查詢與統計直接在 SQL 中完成
+- (device_id, recorded_at) 索引：單一裝置的查詢與最新讀數只掃描該裝置的紀錄
+- 每個執行緒各自一條連線（sqlite3 連線不可跨執行緒共用）
+
+一次性遷移既有 JSON/JSONL 數據：
+    python sqlite_store.py --migrate data/sensor_data.json
+"""
+
+import json
+import math
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Iterator
+
+from devices import DEFAULT_DEVICE
+
+# ========== SQL 語句 ==========
+# 固定的參數化語句，sqlite3 會在每條連線上快取已編譯的 statement
+
+SQL_CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS sensor_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        temperature REAL NOT NULL,
+        humidity REAL NOT NULL,
+        heat_index REAL,
+        air_quality INTEGER,
+        recorded_at TEXT NOT NULL,
+        device_id TEXT NOT NULL DEFAULT 'default'
+    )
+'''
+
+SQL_CREATE_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_recorded_at
+    ON sensor_readings(recorded_at)
+'''
+
+SQL_CREATE_DEVICE_INDEX = '''
+    CREATE INDEX IF NOT EXISTS idx_device_recorded_at
+    ON sensor_readings(device_id, recorded_at)
+'''
+
+# 舊版資料表沒有 device_id 欄位時加入（既有紀錄為預設裝置）
+SQL_ADD_DEVICE_COLUMN = "ALTER TABLE sensor_readings ADD COLUMN device_id TEXT NOT NULL DEFAULT 'default'"
+
+SQL_INSERT = '''
+    INSERT INTO sensor_readings (temperature, humidity, heat_index, air_quality, recorded_at, device_id)
+    VALUES (:temperature, :humidity, :heat_index, :air_quality, :recorded_at, :device_id)
+'''
+
+SQL_INSERT_WITH_ID = '''
+    INSERT OR IGNORE INTO sensor_readings (id, temperature, humidity, heat_index, air_quality, recorded_at, device_id)
+    VALUES (:id, :temperature, :humidity, :heat_index, :air_quality, :recorded_at, :device_id)
+'''
+
+SQL_SELECT_COLUMNS = ('SELECT id, temperature, humidity, heat_index, air_quality, recorded_at, device_id '
+                      'FROM sensor_readings')
+
+SQL_LATEST = SQL_SELECT_COLUMNS + ' ORDER BY recorded_at DESC, id DESC LIMIT 1'
+
+SQL_LATEST_DEVICE = SQL_SELECT_COLUMNS + ' WHERE device_id = ? ORDER BY recorded_at DESC, id DESC LIMIT 1'
+
+SQL_RECENT = SQL_SELECT_COLUMNS + ' ORDER BY recorded_at DESC, id DESC LIMIT ?'
+
+SQL_RECENT_DEVICE = SQL_SELECT_COLUMNS + ' WHERE device_id = ? ORDER BY recorded_at DESC, id DESC LIMIT ?'
+
+SQL_SINCE = SQL_SELECT_COLUMNS + ' WHERE recorded_at >= ? ORDER BY recorded_at ASC, id ASC'
+
+SQL_BETWEEN = SQL_SELECT_COLUMNS + ' WHERE recorded_at >= ? AND recorded_at <= ? ORDER BY recorded_at ASC, id ASC'
+
+SQL_ALL = SQL_SELECT_COLUMNS + ' ORDER BY recorded_at ASC, id ASC'
+
+# 統計的指標；SQLite 沒有內建標準差，以 AVG(x*x) - AVG(x)^2 計算
+STAT_METRICS = ('temperature', 'humidity', 'heat_index', 'air_quality')
+
+SQL_STATS_SINCE = 'SELECT COUNT(*) AS count, ' + ', '.join(
+    f'AVG({m}) AS {m}_avg, MIN({m}) AS {m}_min, MAX({m}) AS {m}_max, AVG({m} * {m}) AS {m}_sq'
+    for m in STAT_METRICS
+) + ' FROM sensor_readings WHERE recorded_at >= :start'
+
+SQL_COUNT = 'SELECT COUNT(*) FROM sensor_readings'
+
+# 各裝置的筆數與最新一筆（SQLite 的 MAX() 聚合會讓其他欄位取自最大值所在的列）
+SQL_DEVICES = ('SELECT device_id, COUNT(*) AS count, MAX(recorded_at) AS recorded_at, '
+               'id, temperature, humidity, heat_index, air_quality '
+               'FROM sensor_readings GROUP BY device_id ORDER BY device_id')
+
+# query() 的聚合函數（avg 與 sum 四捨五入到一位小數，count 只計算非空值）
+SQL_AGGREGATES = {
+    'avg': 'ROUND(AVG({0}), 1)',
+    'min': 'MIN({0})',
+    'max': 'MAX({0})',
+    'sum': 'ROUND(SUM({0}), 1)',
+    'count': 'COUNT({0})'
+}
+
+# query() 分組時各讀數所在的時段編號：與起點相差的秒數（四捨五入到毫秒，避免 julianday 的誤差）除以間隔
+SQL_BUCKET = 'CAST(ROUND((julianday(recorded_at) - julianday(:origin)) * 86400, 3) / :step AS INTEGER)'
+
+SQL_DELETE_BEFORE = 'DELETE FROM sensor_readings WHERE recorded_at < ?'
+
+SQL_DELETE_ALL = 'DELETE FROM sensor_readings'
+
+
+class SQLiteStore:
+    """SQLite 感測器數據儲存"""
+
+    def __init__(self, db_path: Path):
+        """
+        初始化儲存
+
+        Args:
+            db_path: 資料庫檔案路徑
+        """
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒專用的連線（第一次使用時建立）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=10, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        """建立資料表與索引"""
+        conn = self._connection()
+        with conn:
+            conn.execute(SQL_CREATE_TABLE)
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(sensor_readings)')]
+            if 'device_id' not in columns:
+                conn.execute(SQL_ADD_DEVICE_COLUMN)
+            conn.execute(SQL_CREATE_INDEX)
+            conn.execute(SQL_CREATE_DEVICE_INDEX)
+
+    def close(self):
+        """關閉目前執行緒的連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def insert(self, reading: Dict[str, Any]) -> int:
+        """
+        新增一筆讀數
+
+        Args:
+            reading: 讀數字典（不含 id）
+
+        Returns:
+            新增的記錄 ID
+        """
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(SQL_INSERT, reading)
+        return cursor.lastrowid
+
+    def insert_many(self, readings: Iterable[Dict[str, Any]], keep_ids: bool = False) -> int:
+        """
+        在單一交易中新增多筆讀數
+
+        Args:
+            readings: 讀數字典
+            keep_ids: 是否保留原本的 id（遷移用，重複的 id 會被略過）
+
+        Returns:
+            新增的記錄數
+        """
+        conn = self._connection()
+        with conn:
+            cursor = conn.executemany(SQL_INSERT_WITH_ID if keep_ids else SQL_INSERT, readings)
+        return cursor.rowcount
+
+    def latest(self, device_id: str = None) -> Optional[Dict[str, Any]]:
+        """取得最新一筆讀數（指定 device_id 時為該裝置的最新讀數）"""
+        if device_id is None:
+            row = self._connection().execute(SQL_LATEST).fetchone()
+        else:
+            row = self._connection().execute(SQL_LATEST_DEVICE, (device_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, n: int, device_id: str = None) -> List[Dict[str, Any]]:
+        """取得最近 n 筆讀數（依時間排序；從 recorded_at 索引的尾端反向讀取 n 筆）"""
+        if device_id is None:
+            rows = self._connection().execute(SQL_RECENT, (n,)).fetchall()
+        else:
+            rows = self._connection().execute(SQL_RECENT_DEVICE, (device_id, n)).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def between(self, start: str, end: str = None, device_id: str = None) -> List[Dict[str, Any]]:
+        """取得指定時間範圍內的讀數（使用 recorded_at 或 (device_id, recorded_at) 索引）"""
+        return list(self.iter_between(start, end, device_id))
+
+    def iter_between(self, start: str = None, end: str = None, device_id: str = None) -> Iterator[Dict[str, Any]]:
+        """依時間順序逐筆讀取指定範圍內的讀數（不會一次載入整個結果）"""
+        conn = self._connection()
+        if device_id is not None:
+            where, params = _where(start, end, device_id)
+            cursor = conn.execute(f"{SQL_SELECT_COLUMNS} {where} ORDER BY recorded_at ASC, id ASC", params)
+        elif start is None and end is None:
+            cursor = conn.execute(SQL_ALL)
+        elif end is None:
+            cursor = conn.execute(SQL_SINCE, (start,))
+        else:
+            # 空字串排在所有 ISO 時間之前
+            cursor = conn.execute(SQL_BETWEEN, (start or '', end))
+        for row in cursor:
+            yield dict(row)
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """依時間順序逐筆讀取所有讀數"""
+        return self.iter_between()
+
+    def statistics(self, since: str, device_id: str = None) -> Dict[str, Any]:
+        """以 SQL 聚合計算指定時間之後的統計（可只統計單一裝置）"""
+        sql, params = SQL_STATS_SINCE, {'start': since}
+        if device_id is not None:
+            sql += ' AND device_id = :device_id'
+            params['device_id'] = device_id
+        row = self._connection().execute(sql, params).fetchone()
+
+        result: Dict[str, Any] = {'count': row['count']}
+        for metric in STAT_METRICS:
+            avg = row[f'{metric}_avg']
+            if avg is None:
+                result[metric] = {'avg': None, 'min': None, 'max': None, 'stddev': None}
+                continue
+
+            variance = max(0.0, row[f'{metric}_sq'] - avg * avg)
+            result[metric] = {
+                'avg': round(avg, 1),
+                'min': row[f'{metric}_min'],
+                'max': row[f'{metric}_max'],
+                'stddev': round(math.sqrt(variance), 2)
+            }
+        return result
+
+    def query(self, start: Optional[str], end: Optional[str], fields: List[str], step: Optional[float] = None,
+              agg: str = 'avg', limit: Optional[int] = None, descending: bool = False,
+              device_id: str = None) -> List[Dict[str, Any]]:
+        """
+        以單一 SQL 完成時間範圍、欄位選擇、分組與筆數限制（database.query 使用）
+
+        Args:
+            start, end: 時間範圍（含），None 為不限
+            fields: 要回傳的指標欄位（呼叫端已驗證）
+            step: 分組間隔秒數，從 start（未指定時為第一筆）起每 step 秒一組；None 為回傳原始讀數
+            agg: SQL_AGGREGATES 中的聚合函數
+            limit: 最多回傳幾筆（或幾組）
+            descending: 由新到舊排序
+            device_id: 只查詢此裝置，None 為所有裝置
+
+        Returns:
+            原始讀數為 id、recorded_at 與 fields；分組為時段起點 recorded_at、筆數 count 與 fields 的聚合值
+        """
+        direction = 'DESC' if descending else 'ASC'
+        where, params = _where(start or '', end, device_id)
+        params['limit'] = -1 if limit is None else limit
+
+        if step is None:
+            sql = (f"SELECT id, recorded_at, {', '.join(fields)} FROM sensor_readings {where} "
+                   f"ORDER BY recorded_at {direction}, id {direction} LIMIT :limit")
+            return [dict(row) for row in self._connection().execute(sql, params)]
+
+        # 未指定起點時從第一筆開始分組
+        params['origin'] = start if start is not None else self._connection().execute(
+            f'SELECT MIN(recorded_at) FROM sensor_readings {where}', params).fetchone()[0]
+        params['step'] = step
+        if params['origin'] is None:
+            return []
+
+        columns = ', '.join(f"{SQL_AGGREGATES[agg].format(field)} AS {field}" for field in fields)
+        sql = (f"SELECT {SQL_BUCKET} AS bucket, COUNT(*) AS count, {columns} FROM sensor_readings {where} "
+               f"GROUP BY bucket ORDER BY bucket {direction} LIMIT :limit")
+        origin = datetime.fromisoformat(params['origin'])
+
+        result = []
+        for row in self._connection().execute(sql, params):
+            point = {'recorded_at': (origin + timedelta(seconds=row['bucket'] * step)).isoformat()}
+            point.update((field, row[field]) for field in ('count', *fields))
+            result.append(point)
+        return result
+
+    def count(self, device_id: str = None) -> int:
+        """取得總讀數數量（指定 device_id 時為該裝置的筆數）"""
+        if device_id is None:
+            return self._connection().execute(SQL_COUNT).fetchone()[0]
+        return self._connection().execute(SQL_COUNT + ' WHERE device_id = ?', (device_id,)).fetchone()[0]
+
+    def devices(self) -> List[Dict[str, Any]]:
+        """
+        各裝置的筆數與最新讀數
+
+        Returns:
+            [{'device_id', 'count', 'latest'}]，依 device_id 排序
+        """
+        result = []
+        for row in self._connection().execute(SQL_DEVICES):
+            latest = {key: row[key] for key in ('id', 'temperature', 'humidity', 'heat_index', 'air_quality',
+                                                'recorded_at', 'device_id')}
+            result.append({'device_id': row['device_id'], 'count': row['count'], 'latest': latest})
+        return result
+
+    def delete_before(self, cutoff: str) -> int:
+        """刪除早於指定時間的讀數"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(SQL_DELETE_BEFORE, (cutoff,))
+        return cursor.rowcount
+
+    def clear(self) -> int:
+        """刪除所有讀數"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(SQL_DELETE_ALL)
+        return cursor.rowcount
+
+
+def _where(start: Optional[str], end: Optional[str], device_id: Optional[str]):
+    """
+    時間範圍與裝置的 WHERE 子句
+
+    Returns:
+        (子句, 具名參數)；沒有任何條件時子句為空字串
+    """
+    conditions = []
+    params: Dict[str, Any] = {}
+    if device_id is not None:
+        conditions.append('device_id = :device_id')
+        params['device_id'] = device_id
+    if start is not None:
+        conditions.append('recorded_at >= :start')
+        params['start'] = start
+    if end is not None:
+        conditions.append('recorded_at <= :end')
+        params['end'] = end
+    return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+
+def _iter_json_readings(source: Path) -> Iterator[Dict[str, Any]]:
+    """讀取舊版 JSON（整包）、JSONL（每行一筆）檔案或分段目錄中的讀數"""
+    if source.is_dir():
+        from segments import SegmentLog
+        segments = SegmentLog(source)
+        for path in segments.files():
+            yield from segments.read(path.stem)
+        return
+
+    if source.suffix == '.jsonl':
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[WARN] Skipping corrupted line: {line[:60]}")
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from json.load(f).get('readings', [])
+
+
+def migrate_from_json(source: Path, store: SQLiteStore) -> int:
+    """
+    將既有的 JSON/JSONL 數據一次性匯入 SQLite
+
+    原本的 id 會被保留，重複執行不會產生重複紀錄。
+
+    Args:
+        source: sensor_data.json、sensor_data.jsonl 或分段目錄路徑
+        store: 目標 SQLite 儲存
+
+    Returns:
+        匯入的記錄數
+    """
+    source = Path(source)
+    store.init()
+
+    readings = (
+        {
+            'id': r['id'],
+            'temperature': r['temperature'],
+            'humidity': r['humidity'],
+            'heat_index': r.get('heat_index'),
+            'air_quality': r.get('air_quality'),
+            'recorded_at': r['recorded_at'],
+            'device_id': r.get('device_id') or DEFAULT_DEVICE
+        }
+        for r in _iter_json_readings(source)
+    )
+    imported = store.insert_many(readings, keep_ids=True)
+
+    print(f"[MIGRATE] Imported {imported} records from {source} into {store.db_path}")
+    return imported
+
+
+if __name__ == "__main__":
+    import argparse
+    import database as db
+
+    parser = argparse.ArgumentParser(description='SQLite 儲存後端工具')
+    parser.add_argument('--migrate', metavar='JSON_FILE', nargs='?', const=str(db.JSON_FILE),
+                        help='從 JSON/JSONL 檔案或分段目錄匯入數據（預設 data/sensor_data.json）')
+    args = parser.parse_args()
+
+    store = SQLiteStore(db.SQLITE_FILE)
+
+    if args.migrate:
+        source = Path(args.migrate)
+        if not source.exists() and source == db.JSON_FILE and db.SEGMENT_DIR.exists():
+            source = db.SEGMENT_DIR
+        migrate_from_json(source, store)
+    else:
+        store.init()
+        print(f"[OK] {store.db_path}: {store.count()} records")
@@ -0,0 +1,339 @@
+"""
+並行存取壓力測試
+生物機電工程概論 期末專題
+
+模擬實際執行時的情況：一個寫入執行緒（序列埠讀取）持續新增讀數，
+同時多個讀取執行緒（Flask、Gemini）查詢最新讀數、時間範圍、統計、歷史與通用查詢，
+一個事件迴圈執行緒模擬 Discord bot 以非同步 API（aget_*）並行處理指令，
+另有維護執行緒定期清理舊數據與寫入檢查點。
+開始前先建立 --days 天的歷史（每分鐘一筆），寫入者從一天前開始每 10 秒新增一筆，
+清理則逐步縮短保留天數，讀取途中會有分段被封存與刪除。
+
+每個讀取結果都會檢查一致性：
+- 範圍查詢與串流讀取的 ID 連續、時間遞增（不會讀到寫到一半或已刪除的紀錄）
+- 最新讀數的 ID 不會倒退
+- 統計的最小值 ≤ 平均 ≤ 最大值、p5 ≤ p50 ≤ p95
+
+結束時列出各操作次數、寫入延遲（寫入者不應等待讀取端）、bot 指令延遲、
+事件迴圈延遲（心跳計時器實際醒來的時間與預期的差距，查詢阻塞迴圈時會升高）與錯誤。
+加上 --sync-bot 時 bot 改為在事件迴圈中直接呼叫同步函數，可比較兩者的迴圈延遲。
+使用暫存目錄，不影響 data/ 中的數據；分段改為每小時一個，以便頻繁觸發封存。
+
+使用方式:
+    python stress_storage.py                    # JSONL 後端，10 秒，4 個讀取執行緒
+    python stress_storage.py --seconds 30 --readers 8
+    python stress_storage.py --backend sqlite
+    python stress_storage.py --commands 8 --sync-bot
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """排序後取分位數（values 不可為空）"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _check_sequence(readings: List[Dict[str, Any]], where: str):
+    """檢查 ID 連續且時間遞增"""
+    for before, after in zip(readings, readings[1:]):
+        if after['id'] != before['id'] + 1 or after['recorded_at'] < before['recorded_at']:
+            raise AssertionError(f"{where}: {before['id']} @ {before['recorded_at']} -> "
+                                 f"{after['id']} @ {after['recorded_at']}")
+
+
+class StressTest:
+    """寫入、讀取與維護執行緒"""
+
+    def __init__(self, db, seconds: float, readers: int, history_days: int,
+                 commands: int = 4, sync_bot: bool = False):
+        self.db = db
+        self.seconds = seconds
+        self.readers = readers
+        self.history_days = history_days
+        self.commands = commands
+        self.sync_bot = sync_bot
+        self.stop = threading.Event()
+        self.errors: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self.write_latency: List[float] = []
+        self.read_latency: List[float] = []
+        self.command_latency: List[float] = []
+        self.loop_lag: List[float] = []
+        self._counts_lock = threading.Lock()
+
+    def _record(self, name: str, elapsed: float = None):
+        with self._counts_lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if elapsed is not None:
+                self.read_latency.append(elapsed)
+
+    def _guard(self, target):
+        """執行緒主體：記錄例外並停止測試"""
+        def run():
+            try:
+                target()
+            except Exception:
+                self.errors.append(traceback.format_exc())
+                self.stop.set()
+        return run
+
+    # ========== 寫入者 ==========
+
+    @staticmethod
+    def _readings(moment: datetime, step: timedelta, count: int):
+        """產生從 moment 開始、每 step 一筆的模擬讀數"""
+        temperature = 25.0
+        for _ in range(count):
+            temperature = min(40.0, max(10.0, temperature + random.gauss(0, 0.2)))
+            yield {
+                'temperature': temperature,
+                'humidity': random.uniform(40, 80),
+                'heat_index': temperature + 1,
+                'air_quality': random.choice([None, 300, 400]),
+                'recorded_at': moment
+            }
+            moment += step
+
+    def prepare(self):
+        """建立 history_days 天前到一天前、每分鐘一筆的歷史"""
+        start = datetime.now() - timedelta(days=self.history_days)
+        self.db.insert_readings(self._readings(start, timedelta(minutes=1), (self.history_days - 1) * 1440))
+
+    def writer(self):
+        """以 1～20 筆的批次新增每 10 秒一筆的模擬讀數（從一天前開始）"""
+        moment = datetime.now() - timedelta(days=1)
+        step = timedelta(seconds=10)
+        while not self.stop.is_set():
+            batch = list(self._readings(moment, step, random.randint(1, 20)))
+            moment += step * len(batch)
+
+            started = time.perf_counter()
+            self.db.insert_readings(batch)
+            self.write_latency.append(time.perf_counter() - started)
+            self._record('insert')
+
+    # ========== 讀取者 ==========
+
+    def reader(self):
+        """隨機執行各種查詢並檢查結果"""
+        db = self.db
+        last_id = 0
+        while not self.stop.is_set():
+            operation = random.choice(('latest', 'recent', 'between', 'stream', 'statistics', 'history', 'query',
+                                       'count'))
+            started = time.perf_counter()
+
+            if operation == 'latest':
+                latest = db.get_latest_reading()
+                if latest is not None:
+                    if latest['id'] < last_id:
+                        raise AssertionError(f"latest id went backwards: {last_id} -> {latest['id']}")
+                    last_id = latest['id']
+
+            elif operation == 'recent':
+                recent = db.get_recent(random.randint(2, 500))
+                _check_sequence(recent, 'get_recent')
+
+            elif operation == 'between':
+                hours = random.uniform(0.1, 24 * self.history_days)
+                start = datetime.now() - timedelta(hours=hours)
+                readings = db.get_readings_between(start, start + timedelta(hours=random.uniform(0.1, 48)))
+                _check_sequence(readings, 'get_readings_between')
+
+            elif operation == 'stream':
+                # 逐筆讀取全部讀數，期間寫入者持續新增、封存與清理
+                previous = None
+                for reading in db.iter_readings_between():
+                    if previous is not None:
+                        _check_sequence([previous, reading], 'iter_readings_between')
+                    previous = reading
+
+            elif operation == 'statistics':
+                stats = db.get_statistics(random.choice((1, 6, 24, 168)))
+                for metric in ('temperature', 'humidity'):
+                    values = stats[metric]
+                    if values['avg'] is None:
+                        continue
+                    if not values['min'] <= values['avg'] <= values['max']:
+                        raise AssertionError(f"statistics {metric}: {values}")
+                    # SQLite / 二進位後端的分位數與其他統計分開查詢，範圍內讀數剛被清理時可能為 None
+                    if values['p50'] is not None and not values['p5'] <= values['p50'] <= values['p95']:
+                        raise AssertionError(f"percentiles {metric}: {values}")
+
+            elif operation == 'history':
+                db.get_history(random.choice((1, 24, 168)))
+
+            elif operation == 'query':
+                # 最近 N 筆（由新到舊）與分組彙總
+                recent = db.query(fields=['temperature'], limit=random.randint(1, 500), order='desc')
+                _check_sequence(recent[::-1], 'query')
+                for point in db.query(step=random.choice((60, 3600)), agg='avg', limit=100, order='desc'):
+                    if point['count'] <= 0:
+                        raise AssertionError(f"query bucket: {point}")
+
+            else:
+                if db.get_reading_count() < 0:
+                    raise AssertionError("negative reading count")
+
+            self._record(operation, time.perf_counter() - started)
+
+    # ========== Discord bot ==========
+
+    async def _command(self):
+        """模擬 bot 指令（now / history / stats / chart / status），指令間隔 0～50 毫秒"""
+        db = self.db
+        while not self.stop.is_set():
+            operation = random.choice(('now', 'history', 'stats', 'chart', 'status'))
+            started = time.perf_counter()
+
+            if self.sync_bot:
+                # 舊版做法：在事件迴圈中直接呼叫同步函數
+                if operation == 'now':
+                    db.get_latest_reading()
+                elif operation == 'history':
+                    db.get_readings_by_hours(random.choice((1, 6, 24)))
+                elif operation == 'stats':
+                    db.get_statistics(random.choice((1, 24, 168)))
+                elif operation == 'chart':
+                    db.get_history(random.choice((6, 24, 168)))
+                else:
+                    db.get_reading_count()
+                    db.get_latest_reading()
+            else:
+                if operation == 'now':
+                    await db.aget_latest_reading()
+                elif operation == 'history':
+                    hours = random.choice((1, 6, 24))
+                    await db.aquery(datetime.now() - timedelta(hours=hours), fields=['temperature'],
+                                    step=hours * 3600, agg='count')
+                    await db.aget_recent(10)
+                elif operation == 'stats':
+                    await db.aget_statistics(random.choice((1, 24, 168)))
+                elif operation == 'chart':
+                    await db.aget_history(random.choice((6, 24, 168)))
+                else:
+                    await db.aget_reading_count()
+                    await db.aget_latest_reading()
+
+            self.command_latency.append(time.perf_counter() - started)
+            self._record(f"bot-{operation}")
+            await asyncio.sleep(random.uniform(0, 0.05))
+
+    async def _heartbeat(self):
+        """每 10 毫秒醒來一次，記錄比預期晚了多久（事件迴圈被阻塞的時間）"""
+        interval = 0.01
+        while not self.stop.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - expected))
+
+    def bot(self):
+        """在自己的事件迴圈中並行執行 commands 個指令與心跳計時器"""
+        async def main():
+            await asyncio.gather(self._heartbeat(), *(self._command() for _ in range(self.commands)))
+        asyncio.run(main())
+
+    # ========== 維護 ==========
+
+    def maintenance(self):
+        """每 0.5 秒逐步縮短保留天數（最少 2 天）清理舊數據，並寫入檢查點"""
+        days = self.history_days
+        while not self.stop.wait(0.5):
+            days = max(2, days - 1)
+            self.db.cleanup_old_data(days)
+            self.db.save_checkpoint()
+            self._record('cleanup')
+
+    # ========== 執行 ==========
+
+    def run(self) -> bool:
+        """執行測試並列出結果，回傳是否沒有錯誤"""
+        self.prepare()
+        threads = [threading.Thread(target=self._guard(self.writer), name='writer')]
+        threads += [threading.Thread(target=self._guard(self.reader), name=f'reader-{i}')
+                    for i in range(self.readers)]
+        threads.append(threading.Thread(target=self._guard(self.maintenance), name='maintenance'))
+        if self.commands:
+            threads.append(threading.Thread(target=self._guard(self.bot), name='bot'))
+
+        for thread in threads:
+            thread.start()
+        self.stop.wait(self.seconds)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+
+        # 停止後完整讀取一次：筆數與串流結果一致
+        readings = list(self.db.iter_readings_between())
+        try:
+            _check_sequence(readings, 'final scan')
+            if len(readings) != self.db.get_reading_count():
+                raise AssertionError(f"final count {self.db.get_reading_count()} != scanned {len(readings)}")
+        except AssertionError:
+            self.errors.append(traceback.format_exc())
+
+        print(f"\n=== {self.seconds:g} 秒，{self.readers} 個讀取執行緒 ===")
+        for name, count in sorted(self.counts.items()):
+            print(f"{name:>12}: {count:>8,}  ({count / self.seconds:,.0f}/s)")
+        if self.write_latency:
+            print(f"\n寫入延遲  p50 {_percentile(self.write_latency, 0.5) * 1000:.2f} ms   "
+                  f"p99 {_percentile(self.write_latency, 0.99) * 1000:.2f} ms   "
+                  f"max {max(self.write_latency) * 1000:.2f} ms")
+        if self.read_latency:
+            print(f"讀取延遲  p50 {_percentile(self.read_latency, 0.5) * 1000:.2f} ms   "
+                  f"p99 {_percentile(self.read_latency, 0.99) * 1000:.2f} ms")
+        if self.command_latency:
+            mode = '同步' if self.sync_bot else '非同步'
+            print(f"bot 指令  p50 {_percentile(self.command_latency, 0.5) * 1000:.2f} ms   "
+                  f"p99 {_percentile(self.command_latency, 0.99) * 1000:.2f} ms   ({mode}，{self.commands} 個並行)")
+        if self.loop_lag:
+            print(f"迴圈延遲  p50 {_percentile(self.loop_lag, 0.5) * 1000:.2f} ms   "
+                  f"p99 {_percentile(self.loop_lag, 0.99) * 1000:.2f} ms   "
+                  f"max {max(self.loop_lag) * 1000:.2f} ms")
+        print(f"最後筆數  {len(readings):,}")
+
+        for error in self.errors:
+            print(f"\n[ERROR] {error}")
+        print("\n[OK] No consistency errors" if not self.errors else f"\n[FAIL] {len(self.errors)} errors")
+        return not self.errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='並行存取壓力測試')
+    parser.add_argument('--backend', default='jsonl', choices=['jsonl', 'sqlite', 'binary'])
+    parser.add_argument('--seconds', type=float, default=10, help='測試秒數（預設 10）')
+    parser.add_argument('--readers', type=int, default=4, help='讀取執行緒數（預設 4）')
+    parser.add_argument('--days', type=int, default=7, help='預先建立的歷史天數（預設 7，至少 3）')
+    parser.add_argument('--commands', type=int, default=4, help='bot 並行指令數（預設 4，0 為不執行）')
+    parser.add_argument('--sync-bot', action='store_true', help='bot 直接呼叫同步函數（比較事件迴圈延遲）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 設定需在匯入 database 之前完成
+        os.environ['STORAGE_BACKEND'] = args.backend
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'sensor_data.db')
+        os.environ['DB_PARTITION'] = 'hour'
+        os.environ['DB_CHECKPOINT_ROWS'] = '2000'
+        import database as db
+
+        db.init_database()
+        ok = StressTest(db, args.seconds, args.readers, max(3, args.days),
+                        args.commands, args.sync_bot).run()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
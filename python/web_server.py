@@ -5,19 +5,21 @@ Web 伺服器模組 - API 與儀表板
 
 from flask import Flask, jsonify, send_from_directory, request
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import threading
 
-from config import WEB_HOST, WEB_PORT
+from config import WEB_HOST, WEB_PORT, DEVICE_ID
 import database as db
+import analytics
+from parquet_export import ParquetExporter
 
 
 # 建立 Flask 應用
 app = Flask(__name__, static_folder='../web', static_url_path='')
 CORS(app)  # 允許跨域請求
 
-# 儲存最新的即時數據
+# 儲存最新的即時數據（所有裝置中最新的一筆）
 current_reading = {
     'temperature': None,
     'humidity': None,
@@ -26,6 +28,12 @@ current_reading = {
     'timestamp': None
 }
 
+# 各裝置最新的即時數據（新增裝置時以新的字典取代，讀取端不需加鎖）
+current_readings = {}
+
+# Parquet 封存的背景匯出（/api/analytics 只查詢已匯出的分區）
+parquet_exporter = ParquetExporter()
+
 
 # ========== 網頁路由 ==========
 
@@ -45,18 +53,22 @@ def static_files(path):
 
 @app.route('/api/current')
 def api_current():
-    """取得目前數據"""
+    """取得目前數據（?device= 指定裝置，預設為所有裝置中最新的一筆）"""
+    device = request.args.get('device')
+
     # 優先使用即時數據
-    if current_reading['timestamp']:
+    live = current_readings.get(device) if device else current_reading
+    if live and live['timestamp']:
         return jsonify({
             'success': True,
-            'data': current_reading
+            'data': live
         })
     
-    # 否則從資料庫取得最新數據
-    latest = db.get_latest_reading()
+    # 否則從資料庫取得最新數據（只讀取最後一筆）
+    recent = db.get_recent(1, device)
     
-    if latest:
+    if recent:
+        latest = recent[-1]
         return jsonify({
             'success': True,
             'data': {
@@ -64,6 +76,7 @@ def api_current():
                 'humidity': latest['humidity'],
                 'heat_index': latest.get('heat_index'),
                 'air_quality': latest.get('air_quality'),
+                'device_id': latest.get('device_id'),
                 'timestamp': str(latest['recorded_at'])
             }
         })
@@ -76,30 +89,42 @@ def api_current():
 
 @app.route('/api/history')
 def api_history():
-    """取得歷史數據"""
+    """取得歷史數據（?device= 只取單一裝置）"""
     hours = request.args.get('hours', 24, type=int)
+    points = request.args.get('points', db.HISTORY_POINTS, type=int)
+    device = request.args.get('device')
     
     if hours < 1:
         hours = 1
-    elif hours > 168:  # 最多 7 天
-        hours = 168
+    elif hours > 8760:  # 最多 1 年（超過原始數據保留期間的部分來自彙總）
+        hours = 8760
+    points = max(1, points)
     
-    readings = db.get_readings_by_hours(hours)
+    # 依範圍與點數自動選擇原始讀數或 1 分鐘 / 1 小時 / 1 天彙總
+    history = db.get_history(hours, points, device_id=device)
     
     # 格式化數據
     data = []
-    for reading in readings:
-        data.append({
+    for reading in history['data']:
+        point = {
             'temperature': reading['temperature'],
             'humidity': reading['humidity'],
             'heat_index': reading.get('heat_index'),
             'air_quality': reading.get('air_quality'),
             'timestamp': str(reading['recorded_at'])
-        })
+        }
+        if 'count' in reading:
+            point['count'] = reading['count']
+            for metric in ('temperature', 'humidity'):
+                point[f'{metric}_min'] = reading[f'{metric}_min']
+                point[f'{metric}_max'] = reading[f'{metric}_max']
+        data.append(point)
     
     return jsonify({
         'success': True,
         'hours': hours,
+        'device': device,
+        'resolution': history['resolution'],
         'count': len(data),
         'data': data
     })
@@ -107,23 +132,152 @@ def api_history():
 
 @app.route('/api/stats')
 def api_stats():
-    """取得統計數據"""
+    """取得統計數據（?device= 只統計單一裝置）"""
     hours = request.args.get('hours', 24, type=int)
+    device = request.args.get('device')
     
     if hours < 1:
         hours = 1
     elif hours > 168:
         hours = 168
     
-    stats = db.get_statistics(hours)
+    stats = db.get_statistics(hours, device_id=device)
     
     return jsonify({
         'success': True,
         'hours': hours,
+        'device': device,
         'stats': stats
     })
 
 
+@app.route('/api/devices')
+def api_devices():
+    """取得所有裝置的筆數與最新讀數"""
+    devices = db.get_devices()
+    for device in devices:
+        live = current_readings.get(device['device_id'])
+        if live:
+            device['current'] = live
+
+    return jsonify({
+        'success': True,
+        'count': len(devices),
+        'devices': devices
+    })
+
+
+# /api/query 的筆數上限（未指定 limit 時也套用）
+QUERY_MAX_LIMIT = 10000
+
+# /api/query 的 step 單位
+STEP_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _parse_step(value: str) -> float:
+    """解析分組間隔：秒數或加上單位（30s、5m、1h、1d）"""
+    value = value.strip().lower()
+    if value and value[-1] in STEP_UNITS:
+        return float(value[:-1]) * STEP_UNITS[value[-1]]
+    return float(value)
+
+
+@app.route('/api/query')
+def api_query():
+    """
+    通用範圍查詢（時間範圍、欄位選擇、分組與筆數限制在儲存層完成）
+
+    參數：start / end（ISO 時間）或 hours、fields（逗號分隔）、step（秒數或 5m、1h、1d）、
+    agg（avg/min/max/sum/count）、limit、order（asc/desc）、device（只查詢單一裝置）、
+    by_device=1（依裝置分別查詢，每筆加上 device_id，limit 套用在每個裝置）
+    """
+    start = request.args.get('start')
+    end = request.args.get('end')
+    hours = request.args.get('hours', type=float)
+    fields = request.args.get('fields')
+    step = request.args.get('step')
+    agg = request.args.get('agg', 'avg')
+    limit = request.args.get('limit', QUERY_MAX_LIMIT, type=int)
+    order = request.args.get('order', 'asc')
+    device = request.args.get('device')
+    by_device = request.args.get('by_device', '').lower() in ('1', 'true', 'yes')
+
+    if start is None and hours is not None:
+        start = (datetime.now() - timedelta(hours=max(0.0, hours))).isoformat()
+    limit = max(0, min(limit, QUERY_MAX_LIMIT))
+
+    try:
+        data = db.query(
+            start, end,
+            fields=[field.strip() for field in fields.split(',') if field.strip()] if fields else None,
+            step=_parse_step(step) if step else None,
+            agg=agg,
+            limit=limit,
+            order=order,
+            device_id=device,
+            by_device=by_device
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'start': start,
+        'end': end,
+        'step': _parse_step(step) if step else None,
+        'agg': agg if step else None,
+        'device': device,
+        'count': len(data),
+        'data': data
+    })
+
+
+@app.route('/api/analytics')
+def api_analytics():
+    """
+    長期分析查詢（以 DuckDB 查詢 Parquet 封存，需安裝 pyarrow 與 duckdb）
+
+    只查詢背景匯出已寫入的分區；回應中的 stale 表示昨天以前的數據尚未全部匯出。
+    """
+    if not analytics.is_available():
+        return jsonify({
+            'success': False,
+            'error': 'Analytics requires pyarrow and duckdb (pip install pyarrow duckdb)'
+        }), 501
+
+    name = request.args.get('query', 'daily')
+    metric = request.args.get('metric', 'temperature')
+    days = request.args.get('days', 90, type=int)
+
+    if name not in analytics.QUERIES or metric not in analytics.METRICS:
+        return jsonify({
+            'success': False,
+            'error': f'query must be one of {list(analytics.QUERIES)}, metric one of {list(analytics.METRICS)}'
+        }), 400
+
+    if days < 1:
+        days = 1
+    elif days > 3650:
+        days = 3650
+
+    data = analytics.query(db.PARQUET_DIR, name, metric, days)
+    export = db.get_export_status()
+
+    return jsonify({
+        'success': True,
+        'query': name,
+        'metric': metric,
+        'days': days,
+        'exported_through': export['exported_through'],
+        'last_export': export['last_export'],
+        'stale': export['stale'],
+        'data': data
+    })
+
+
 @app.route('/api/status')
 def api_status():
     """取得系統狀態"""
@@ -166,14 +320,7 @@ def api_status():
 @app.route('/api/clear/soft', methods=['POST'])
 def api_clear_soft():
     """暫時清空 - 只重置前端即時數據"""
-    global current_reading
-    current_reading = {
-        'temperature': None,
-        'humidity': None,
-        'heat_index': None,
-        'air_quality': None,
-        'timestamp': None
-    }
+    _reset_current_readings()
     
     return jsonify({
         'success': True,
@@ -198,14 +345,7 @@ def api_clear_hard():
     deleted_count = db.clear_all_data()
     
     # 同時重置即時數據
-    global current_reading
-    current_reading = {
-        'temperature': None,
-        'humidity': None,
-        'heat_index': None,
-        'air_quality': None,
-        'timestamp': None
-    }
+    _reset_current_readings()
     
     return jsonify({
         'success': True,
@@ -251,7 +391,8 @@ def api_push_data():
             data.get('temperature'),
             data.get('humidity'),
             data.get('heat_index'),
-            data.get('air_quality')
+            data.get('air_quality'),
+            data.get('device_id')
         )
         
         # 寫入資料庫（讓歷史圖表能運作）
@@ -260,7 +401,8 @@ def api_push_data():
             data.get('temperature'),
             data.get('humidity'),
             data.get('heat_index'),
-            data.get('air_quality')
+            data.get('air_quality'),
+            data.get('device_id')
         )
         
         return jsonify({
@@ -278,16 +420,36 @@ def api_push_data():
 
 # ========== 供外部呼叫的函數 ==========
 
-def update_current_reading(temperature: float, humidity: float, heat_index: float = None, air_quality: float = None):
-    """更新即時數據（供 main.py 呼叫）"""
-    global current_reading
+def update_current_reading(temperature: float, humidity: float, heat_index: float = None, air_quality: float = None,
+                           device_id: str = None):
+    """更新即時數據（供 main.py 呼叫，device_id 預設為 DEVICE_ID）"""
+    global current_reading, current_readings
+    device_id = device_id or DEVICE_ID
     current_reading = {
         'temperature': temperature,
         'humidity': humidity,
         'heat_index': heat_index,
         'air_quality': air_quality,
+        'device_id': device_id,
         'timestamp': datetime.now().isoformat()
     }
+    if device_id in current_readings:
+        current_readings[device_id] = current_reading
+    else:
+        current_readings = {**current_readings, device_id: current_reading}
+
+
+def _reset_current_readings():
+    """重置所有裝置的即時數據"""
+    global current_reading, current_readings
+    current_reading = {
+        'temperature': None,
+        'humidity': None,
+        'heat_index': None,
+        'air_quality': None,
+        'timestamp': None
+    }
+    current_readings = {}
 
 
 def run_server(host: str = None, port: int = None, debug: bool = False):
@@ -297,6 +459,9 @@ def run_server(host: str = None, port: int = None, debug: bool = False):
     
     print(f"[WEB] Starting web server...")
     print(f"[URL] Dashboard: http://{host}:{port}")
+
+    if parquet_exporter.start():
+        print(f"[EXPORT] Parquet export every {parquet_exporter.interval}s -> {db.PARQUET_DIR}")
     
     app.run(host=host, port=port, debug=debug, use_reloader=False)
 
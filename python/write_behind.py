@@ -0,0 +1,116 @@
+"""
+延遲寫入模組 - 讀數批次提交
+生物機電工程概論 期末專題
+
+啟用 DB_WRITE_BEHIND 後，main.py 收到的讀數先放入記憶體緩衝，
+由背景執行緒每 DB_FLUSH_MS 毫秒或累積 DB_FLUSH_ROWS 筆時以
+database.insert_readings 一次提交；停止時會寫入剩餘的讀數。
+
+讀數的記錄時間在放入緩衝時決定，批次提交不會改變時間。
+"""
+
+import threading
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+import database as db
+from config import DB_FLUSH_MS, DB_FLUSH_ROWS
+
+
+class WriteBehindBuffer:
+    """讀數緩衝與背景批次提交"""
+
+    def __init__(self, flush_ms: int = None, flush_rows: int = None):
+        """
+        初始化緩衝
+
+        Args:
+            flush_ms: 最長等待時間（毫秒）
+            flush_rows: 累積到這麼多筆就立即提交
+        """
+        self.flush_interval = (flush_ms or DB_FLUSH_MS) / 1000
+        self.flush_rows = flush_rows or DB_FLUSH_ROWS
+
+        self._pending: List[Dict[str, Any]] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()   # 確保批次依序寫入
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # 統計
+        self.flushed_rows = 0
+        self.flush_count = 0
+
+    def start(self):
+        """啟動背景提交執行緒"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def add(self, temperature: float, humidity: float, heat_index: float = None, air_quality: float = None,
+            device_id: str = None):
+        """放入一筆讀數（以現在時間記錄，device_id 預設為 DEVICE_ID）"""
+        reading = {
+            'temperature': temperature,
+            'humidity': humidity,
+            'heat_index': heat_index,
+            'air_quality': air_quality,
+            'recorded_at': datetime.now().isoformat(),
+            'device_id': device_id
+        }
+        with self._condition:
+            self._pending.append(reading)
+            if len(self._pending) >= self.flush_rows:
+                self._condition.notify()
+
+    def flush(self) -> int:
+        """
+        立即提交緩衝中的讀數
+
+        Returns:
+            提交的記錄數
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                inserted = db.insert_readings(batch)
+            except Exception as e:
+                # 寫入失敗時放回緩衝，下次再試
+                with self._condition:
+                    self._pending[:0] = batch
+                print(f"[ERROR] Write-behind flush failed: {e}")
+                return 0
+
+            self.flushed_rows += inserted
+            self.flush_count += 1
+            return inserted
+
+    def _flush_loop(self):
+        """背景迴圈：等到逾時或筆數足夠時提交"""
+        while self._running:
+            with self._condition:
+                if len(self._pending) < self.flush_rows:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def stop(self):
+        """停止背景執行緒並寫入剩餘的讀數"""
+        self._running = False
+        with self._condition:
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        """緩衝中尚未提交的筆數"""
+        with self._condition:
+            return len(self._pending)